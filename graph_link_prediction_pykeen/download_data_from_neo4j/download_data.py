@@ -1,5 +1,4 @@
 from neo4j import GraphDatabase
-from neo4j.exceptions import ServiceUnavailable
 
 db_api      = ""
 db_login    = ""
@@ -13,27 +12,75 @@ driver = GraphDatabase.driver(
 driver.verify_connectivity()
 
 
+# Без меток и свойств count(r) берется из count store, без обхода связей
 QUERY_COUNT = """
-    MATCH (e1)-[r]-(e2)
-    RETURN count(DISTINCT apoc.rel.id(r)) AS total
+    MATCH ()-[r]->()
+    RETURN count(r) AS total
+"""
+
+FETCH_SIZE = 10000
+
+QUERY_RID_BOUNDS = """
+    MATCH ()-[r]->()
+    RETURN min(apoc.rel.id(r)) AS min_rid, max(apoc.rel.id(r)) AS max_rid
+"""
+
+QUERY_NODE_COUNT = """
+    MATCH (n)
+    RETURN count(n) AS total
+"""
+
+QUERY_NODE_ID_BOUNDS = """
+    MATCH (n)
+    RETURN min(apoc.node.id(n)) AS min_id, max(apoc.node.id(n)) AS max_id
 """
 
 def get_total_rows():
     with driver.session() as session:
         return session.run(QUERY_COUNT).single()["total"]
 
-def fetch_batch(query: str, last_rid: str, batch_size: int):
-    """Возвращает список записей (batch)."""
-    try:
-        with driver.session() as session:
-            records = session.run(
-                query,
-                last_rid=last_rid,
-                batch=batch_size,
-            )
-            return list(records)
-    except ServiceUnavailable as e:
-        raise e
+def get_rid_bounds():
+    """Минимальный и максимальный id связи (None, None для пустой базы)."""
+    with driver.session() as session:
+        record = session.run(QUERY_RID_BOUNDS).single()
+        return record["min_rid"], record["max_rid"]
+
+def get_total_nodes():
+    with driver.session() as session:
+        return session.run(QUERY_NODE_COUNT).single()["total"]
+
+def get_node_id_bounds():
+    """Минимальный и максимальный id узла (None, None для пустой базы)."""
+    with driver.session() as session:
+        record = session.run(QUERY_NODE_ID_BOUNDS).single()
+        return record["min_id"], record["max_id"]
+
+def split_rid_range(min_rid: int, max_rid: int, parts: int):
+    """
+    Делит [min_rid, max_rid] на `parts` диапазонов (start, end]
+    примерно равной ширины; start первого диапазона - min_rid - 1.
+    """
+    bounds = [min_rid - 1 + (max_rid - min_rid + 1) * i // parts for i in range(parts + 1)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def stream_batches(query: str, last_rid: int, batch_size: int, fetch_size: int = FETCH_SIZE, **params):
+    """
+    Выполняет запрос один раз и отдает записи пачками по `batch_size`.
+    Сервер присылает записи порциями по `fetch_size`, в памяти держится
+    одна пачка. `params` - дополнительные параметры запроса.
+    """
+    with driver.session(fetch_size=fetch_size) as session:
+        result = session.run(query, last_rid=last_rid, **params)
+        while True:
+            records = result.fetch(batch_size)
+            if not records:
+                break
+            yield records
+
+def fetch_records(query: str, **params):
+    """Выполняет запрос и возвращает все записи (для небольших выборок)."""
+    with driver.session() as session:
+        return list(session.run(query, **params))
 
 def close_driver():
     driver.close()
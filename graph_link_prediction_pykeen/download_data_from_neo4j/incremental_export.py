@@ -0,0 +1,338 @@
+# incremental_export.py
+import os
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
+
+from download_data import FETCH_SIZE, stream_batches, fetch_records, get_rid_bounds, split_rid_range, close_driver
+from save_data_to_csv import OUT_DIR, RangeCsvWriter
+from save_data_to_parquet import PartParquetWriter
+from run_download_and_save import BATCH_SIZE, RETRY_DELAY, RANGES_PER_WORKER, MANIFEST_NAME
+from run_download_and_save import main as export_relationships
+
+SNAPSHOT_PATH = OUT_DIR / "snapshot.json"
+LIVE_RIDS_NAME = "live_rids.npy"
+LIVE_KEYS_NAME = "live_keys.npy"
+TOMBSTONES_NAME = "tombstones.npy"
+RECONCILE_NAME = "reconcile.json"
+KEY_COLUMNS = ["entity_1", "predicate", "entity_2"]
+
+# Сверка уже выгруженных id (только с --reconcile): только то, что входит
+# в ключ строки, без меток узлов; поиск связей по id, как в QUERY_RANGE
+QUERY_KEYS = """
+    UNWIND range($last_rid + 1, $end_rid) AS rid
+    MATCH (e1)-[r]->(e2)
+    WHERE id(r) = rid
+    RETURN rid,
+           apoc.node.id(e1) AS entity_1,
+           type(r) AS predicate,
+           apoc.node.id(e2) AS entity_2
+"""
+
+# id(r) = rid планируется как поиск связи по id; apoc.rel.id(r) возвращает
+# тот же id, но по нему поиск не планируется
+QUERY_BY_RID = """
+    UNWIND $rids AS rid
+    MATCH (e1)-[r]->(e2)
+    WHERE id(r) = rid
+    RETURN apoc.rel.id(r) AS rid,
+           apoc.node.id(e1) AS entity_1,
+           type(r) AS predicate,
+           apoc.node.id(e2) AS entity_2,
+           labels(e1)[0] AS label_e1,
+           labels(e2)[0] AS label_e2
+    ORDER BY rid
+"""
+
+
+def save_json(path, data):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def load_json(path):
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    64-битный ключ строки по (entity_1, predicate, entity_2). Neo4j
+    переиспользует id удаленных связей, поэтому совпадение rid без
+    совпадения ключа означает новую связь под старым id.
+    """
+    return pd.util.hash_pandas_object(df[KEY_COLUMNS].astype({"predicate": object}), index=False).to_numpy()
+
+
+def part_files(out_dir, fmt="csv"):
+    return sorted(out_dir.glob(f"export_part_*.{fmt}"))
+
+
+def count_rows(out_dir, fmt="csv") -> int:
+    """Число строк файлов export_part_*: для Parquet из метаданных, для CSV - по переводам строк без заголовка."""
+    if fmt == "parquet":
+        return sum(pq.ParquetFile(file).metadata.num_rows for file in part_files(out_dir, fmt))
+    total = 0
+    for file in part_files(out_dir, fmt):
+        with open(file, "rb") as f:
+            total += sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) - 1
+    return total
+
+
+def iter_parts(out_dir, columns, fmt="csv", chunk_rows=BATCH_SIZE):
+    """Файлы export_part_* формата `fmt` из `out_dir` кусками (группы строк Parquet, куски CSV)."""
+    for file in part_files(out_dir, fmt):
+        if fmt == "parquet":
+            for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(file, usecols=columns, chunksize=chunk_rows)
+
+
+def build_live_index(dirs, fmt, live_rids=None, live_keys=None, tombstones=None):
+    """
+    Отсортированные rid всех живых связей и ключи их строк: текущий индекс
+    без `tombstones` плюс строки из файлов `dirs`. Файлы читаются кусками
+    прямо в заранее выделенные массивы, выгрузка целиком в память не попадает.
+    """
+    keep = None
+    if live_rids is not None:
+        keep = np.ones(len(live_rids), dtype=bool)
+        if tombstones is not None and len(tombstones):
+            keep[np.searchsorted(live_rids, tombstones)] = False
+    total = (int(keep.sum()) if keep is not None else 0) + sum(count_rows(out_dir, fmt) for out_dir in dirs)
+    rids = np.empty(total, dtype=np.int64)
+    keys = np.empty(total, dtype=np.uint64)
+    offset = 0
+    if keep is not None:
+        offset = int(keep.sum())
+        rids[:offset], keys[:offset] = live_rids[keep], live_keys[keep]
+    for out_dir in dirs:
+        for chunk in iter_parts(out_dir, ["rid"] + KEY_COLUMNS, fmt):
+            end = offset + len(chunk)
+            rids[offset:end] = chunk["rid"].to_numpy(np.int64)
+            keys[offset:end] = row_keys(chunk)
+            offset = end
+    if offset != total:
+        raise ValueError(f"Expected {total} rows in {[str(d) for d in dirs]}, read {offset}")
+    order = np.argsort(rids, kind="stable")
+    return rids[order], keys[order]
+
+
+def save_live_index(run_dir, live_rids, live_keys):
+    np.save(run_dir / LIVE_RIDS_NAME, live_rids)
+    np.save(run_dir / LIVE_KEYS_NAME, live_keys)
+
+
+def load_live_index(run_dir):
+    return np.load(run_dir / LIVE_RIDS_NAME), np.load(run_dir / LIVE_KEYS_NAME)
+
+
+def snapshot_base(base):
+    """
+    Отметка полной выгрузки, от которой идет цепочка снимков: по ней
+    incremental_export.py и prepare_data_iw_hs.py узнают, что дельты
+    относятся к текущей полной выгрузке.
+    """
+    return {
+        "export_id": base.get("export_id"),
+        "total_rows": base["total_rows"],
+        "watermark": max((item["end"] for item in base["ranges"]), default=-1),
+    }
+
+
+def start_snapshot(base):
+    """
+    Новая цепочка снимков от завершенной полной выгрузки: ее watermark -
+    верхняя граница диапазонов, старые дельты удаляются.
+    """
+    for stale_dir in OUT_DIR.glob("delta_*"):
+        shutil.rmtree(stale_dir)
+    watermark = snapshot_base(base)["watermark"]
+    save_live_index(OUT_DIR, *build_live_index([OUT_DIR], base["format"]))
+    snapshot = {
+        "format": base["format"],
+        "base": snapshot_base(base),
+        "watermark": watermark,
+        "runs": [{"run": 0, "dir": ".", "watermark": watermark, "rows": base["total_rows"], "tombstones": 0}],
+    }
+    save_json(SNAPSHOT_PATH, snapshot)
+    print(f"Snapshot started from the full export: {base['total_rows']} rows, watermark {watermark}")
+    return snapshot
+
+
+def reconcile_range(start, end, live_rids, live_keys, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE):
+    """
+    Сверяет связи с id в (start, end] с индексом прошлого снимка.
+    Возвращает позиции в индексе строк, которые есть в базе без изменений,
+    и id, которых в индексе нет или под которыми теперь другая связь.
+    """
+    while True:
+        try:
+            positions, fresh = [], []
+            for records in stream_batches(QUERY_KEYS, start, batch_size, fetch_size, end_rid=end):
+                df = pd.DataFrame([dict(rec) for rec in records])
+                rids = df["rid"].to_numpy(np.int64)
+                pos = np.minimum(np.searchsorted(live_rids, rids), max(len(live_rids) - 1, 0))
+                same = np.zeros(len(rids), dtype=bool)
+                if len(live_rids):
+                    same = (live_rids[pos] == rids) & (live_keys[pos] == row_keys(df))
+                positions.append(pos[same])
+                fresh.append(rids[~same])
+            return (
+                np.concatenate(positions) if positions else np.empty(0, dtype=np.int64),
+                np.concatenate(fresh) if fresh else np.empty(0, dtype=np.int64),
+            )
+        except (ServiceUnavailable, SessionExpired) as e:
+            print(f"[!] Reconcile ({start}, {end}]: lost connect: {e}. Wait for {RETRY_DELAY}...")
+            time.sleep(RETRY_DELAY)
+
+
+def export_backfill(rids, delta_dir, fmt, batch_size=BATCH_SIZE):
+    """
+    Связи с id не выше watermark, которых не было в прошлом снимке
+    (id переиспользован), выбираются по id в export_part_b* дельты.
+    """
+    if fmt == "parquet":
+        writer = PartParquetWriter("export_part_b0000", out_dir=delta_dir)
+    else:
+        writer = RangeCsvWriter(0, 0, delta_dir, prefix="export_part_b")
+    rows = 0
+    try:
+        for i in range(0, len(rids), batch_size):
+            records = fetch_records(QUERY_BY_RID, rids=rids[i:i + batch_size].tolist())
+            if records:
+                writer.write(records)
+                rows += len(records)
+    finally:
+        writer.close()
+    return rows
+
+
+def reconcile(delta_dir, live_rids, live_keys, watermark, workers, ranges, batch_size, fetch_size, fmt):
+    """
+    Проход по id до watermark: удаленные с прошлого снимка связи пишутся
+    в tombstones.npy (отсортированные int64 rid), связи под
+    переиспользованными id - в export_part_b* дельты.
+    """
+    min_rid, _ = get_rid_bounds()
+    parts = split_rid_range(min_rid, watermark, ranges) if min_rid is not None and min_rid <= watermark else []
+    seen = np.zeros(len(live_rids), dtype=bool)
+    fresh = [np.empty(0, dtype=np.int64)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda bounds: reconcile_range(*bounds, live_rids, live_keys, batch_size, fetch_size), parts
+        )
+        for positions, new_rids in results:
+            seen[positions] = True
+            fresh.append(new_rids)
+
+    tombstones = live_rids[~seen]
+    np.save(delta_dir / TOMBSTONES_NAME, tombstones)
+    backfill = export_backfill(np.sort(np.concatenate(fresh)), delta_dir, fmt, batch_size)
+    state = {"watermark": watermark, "reconciled": True, "tombstones": int(len(tombstones)), "backfill": backfill}
+    save_json(delta_dir / RECONCILE_NAME, state)
+    return state
+
+
+def skip_reconcile(delta_dir, watermark):
+    """Дельта без сверки: пустой tombstones.npy, в базу запросов нет."""
+    np.save(delta_dir / TOMBSTONES_NAME, np.empty(0, dtype=np.int64))
+    state = {"watermark": watermark, "reconciled": False, "tombstones": 0, "backfill": 0}
+    save_json(delta_dir / RECONCILE_NAME, state)
+    return state
+
+
+def main(workers=1, ranges=1, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE, full_reconcile=False):
+    """
+    Инкрементальная выгрузка поверх завершенной полной выгрузки в OUT_DIR.
+    Каждый запуск пишет дельту delta_NNNN/ со связями с id выше watermark
+    прошлого запуска (обычные диапазоны с manifest.json): читаются только
+    новые id, а не весь граф.
+    Удаления и связи под переиспользованными id видны только при сверке
+    (`full_reconcile`): она читает ключи всех связей до watermark, то есть
+    весь граф, и пишет tombstones.npy и export_part_b* дельты. Без нее
+    tombstones.npy пустой; в графе нет журнала изменений или отметки
+    удаления, по которым удаления можно найти дешевле.
+    Снимок = полная выгрузка, к которой по порядку применяются дельты:
+    сначала удаляются rid из tombstones, затем добавляются строки дельты.
+    Прерванный запуск продолжается с того же шага.
+    """
+    base = load_json(OUT_DIR / MANIFEST_NAME)
+    if not base or not base.get("finished"):
+        raise SystemExit(f"No finished full export in {OUT_DIR}, run run_download_and_save.py first")
+
+    snapshot = load_json(SNAPSHOT_PATH)
+    if not snapshot or snapshot["base"] != snapshot_base(base):
+        snapshot = start_snapshot(base)
+
+    start = time.perf_counter()
+    run = len(snapshot["runs"])
+    delta_dir = OUT_DIR / f"delta_{run:04d}"
+    delta_dir.mkdir(exist_ok=True)
+    fmt, watermark = snapshot["format"], snapshot["watermark"]
+    previous_dir = OUT_DIR / snapshot["runs"][-1]["dir"]
+    live_rids, live_keys = load_live_index(previous_dir)
+    print(f"Incremental export run {run}: {len(live_rids)} live rows, watermark {watermark}")
+
+    state = load_json(delta_dir / RECONCILE_NAME)
+    if state is None and full_reconcile:
+        state = reconcile(delta_dir, live_rids, live_keys, watermark, workers, ranges, batch_size, fetch_size, fmt)
+    elif state is None:
+        state = skip_reconcile(delta_dir, watermark)
+    if state.get("reconciled", True):
+        print(f"Reconciled: {state['tombstones']} deleted, {state['backfill']} rows under reused ids")
+    else:
+        print("Reconcile skipped: deletions and reused ids are not tracked (use --reconcile)")
+
+    manifest = load_json(delta_dir / MANIFEST_NAME)
+    if not manifest or not manifest.get("finished"):
+        manifest = export_relationships(workers, ranges, batch_size, fetch_size, fmt, delta_dir, after_rid=watermark).state
+    new_watermark = max([watermark] + [item["end"] for item in manifest["ranges"]])
+
+    # Индекс нового снимка пишется в дельту до записи snapshot.json, поэтому
+    # прерванное завершение просто повторяется
+    tombstones = np.load(delta_dir / TOMBSTONES_NAME)
+    save_live_index(delta_dir, *build_live_index([delta_dir], fmt, live_rids, live_keys, tombstones))
+    snapshot["runs"].append({
+        "run": run, "dir": delta_dir.name, "watermark": new_watermark,
+        "rows": manifest["total_rows"] + state["backfill"], "tombstones": state["tombstones"],
+    })
+    snapshot["watermark"] = new_watermark
+    save_json(SNAPSHOT_PATH, snapshot)
+    for name in (LIVE_RIDS_NAME, LIVE_KEYS_NAME):
+        (previous_dir / name).unlink(missing_ok=True)
+
+    end = time.perf_counter()
+    print(
+        f"Delta {delta_dir.name}: {manifest['total_rows'] + state['backfill']} new rows, "
+        f"{state['tombstones']} tombstones, watermark {new_watermark}, time: {end - start:.3f} s."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export relationships added or deleted since the previous export")
+    parser.add_argument("--parallel", type=int, default=1, help="number of worker sessions")
+    parser.add_argument("--ranges-per-worker", type=int, default=RANGES_PER_WORKER, help="used when --parallel > 1")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE)
+    parser.add_argument(
+        "--reconcile", action="store_true",
+        help="also find deleted relationships and reused ids (reads the keys of the whole graph)",
+    )
+    args = parser.parse_args()
+
+    ranges = args.parallel * args.ranges_per_worker if args.parallel > 1 else 1
+    main(args.parallel, ranges, args.batch_size, args.fetch_size, args.reconcile)
+    close_driver()
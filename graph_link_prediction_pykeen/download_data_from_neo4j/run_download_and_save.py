@@ -1,72 +1,220 @@
 # run_download_and_save.py
+import os
+import json
 import time
+import uuid
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-from neo4j.exceptions import ServiceUnavailable
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
 
-from download_data import fetch_batch, get_total_rows, close_driver
-from save_data_to_csv import open_new_csv, write_batch_to_csv
+from download_data import FETCH_SIZE, stream_batches, get_total_rows, get_rid_bounds, split_rid_range, close_driver
+from save_data_to_csv import RangeCsvWriter
 from save_data_to_csv import OUT_DIR
+from save_data_to_parquet import PartParquetWriter
 
+# Строк в одной записи в файл; сервер отдает записи порциями по FETCH_SIZE
 BATCH_SIZE = 50000
-RETRY_DELAY = 360
+RETRY_DELAY = 30
+# Ширина окна id одного запроса диапазона: ORDER BY сортирует не больше
+# PAGE_SIZE строк, и первая запись приходит без обхода всего диапазона
+PAGE_SIZE = 50000
+# Параллельный режим: диапазонов на исполнителя. Диапазон читается поиском
+# связей по id, поэтому дополнительные диапазоны не добавляют проходов по
+# хранилищу и только выравнивают нагрузку при неравномерных id
+RANGES_PER_WORKER = 4
+MANIFEST_NAME = "manifest.json"
+# Файлы частей выгрузки, которые удаляются при создании нового манифеста
+PART_PATTERNS = ("export_part_r*",)
+# Цепочка снимков incremental_export.py строится поверх одной полной выгрузки
+# и удаляется вместе с ней, когда полная выгрузка начинается заново
+SNAPSHOT_PATTERNS = ("snapshot.json", "delta_*", "live_*.npy")
 
-QUERY = """
+# id(r) = rid планируется как поиск связи по id (DirectedRelationshipByIdSeek),
+# поэтому диапазон читает только свои связи, а не все хранилище с фильтром,
+# как условие на apoc.rel.id(r). Пропуски в id (удаленные связи) дают пустой поиск.
+# Запрос читает одно окно (last_rid, end_rid] шириной до PAGE_SIZE id;
+# ORDER BY по окну нужен для watermark
+QUERY_RANGE = """
+    UNWIND range($last_rid + 1, $end_rid) AS rid
     MATCH (e1)-[r]->(e2)
-    WHERE apoc.rel.id(r) > $last_rid
-    RETURN apoc.rel.id(r) AS rid,
+    WHERE id(r) = rid
+    RETURN rid,
            apoc.node.id(e1) AS entity_1,
            type(r) AS predicate,
            apoc.node.id(e2) AS entity_2,
            labels(e1)[0] AS label_e1,
            labels(e2)[0] AS label_e2
     ORDER BY rid
-    LIMIT $batch
 """
 
-def main():
-    total_rows = get_total_rows()
-    print("Starting to download data from Neo4j...")
-    pbar = tqdm(total=total_rows, desc="Export rows", unit=" rows")
+class Manifest:
+    """
+    Состояние выгрузки в manifest.json: для каждого диапазона (start, end] -
+    число строк, последний записанный rid (watermark), файлы на момент
+    этой отметки (для csv - файл и его размер, для parquet - закрытые файлы)
+    и признак завершения. Отметка пишется только для данных, уже сброшенных
+    на диск, поэтому прерванный диапазон продолжается ровно с нее.
 
-    last_rid = -1
-    file_index = 1
-    rows_in_file = 0
+    Незавершенный манифест того же формата продолжается со своими
+    диапазонами, даже если в базе появились новые связи; иначе
+    диапазоны строятся заново через `make_ranges`, а файлы прошлой
+    выгрузки по шаблонам `stale` в каталоге манифеста удаляются, чтобы
+    части с большими номерами не смешались с новой выгрузкой.
+    """
+    def __init__(self, path, fmt, make_ranges, stale=PART_PATTERNS):
+        self.path = path
+        self.lock = threading.Lock()
+        state = None
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        if state and not state.get("finished") and state.get("format", "csv") == fmt:
+            self.state = state
+            self.resumed = True
+        else:
+            remove_files(path.parent, stale)
+            self.state = {
+                # Отличает выгрузку от предыдущей с тем же числом строк и диапазонами
+                "export_id": uuid.uuid4().hex,
+                "format": fmt,
+                "ranges": [
+                    {"part": i, "start": start, "end": end, "file": None, "offset": 0, "files": [],
+                     "rows": 0, "last_rid": start, "done": False}
+                    for i, (start, end) in enumerate(make_ranges())
+                ],
+            }
+            self.resumed = False
+        self.state["finished"] = False
+        self.save()
 
-    f = None
-    writer = None
+    @property
+    def ranges(self):
+        return self.state["ranges"]
 
-    while True:
-        try:
-            records = fetch_batch(QUERY, last_rid, BATCH_SIZE)
-            if not records:
-                break
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.path)
 
-            if rows_in_file == 0:
-                if f:
-                    f.close()
-                f, writer = open_new_csv(file_index)
-                file_index += 1
+    def update(self, part, **fields):
+        with self.lock:
+            self.state["ranges"][part].update(fields)
+            self.save()
 
-            rows_in_file, last_rid, rotated = write_batch_to_csv(
-                records, f, writer, rows_in_file, BATCH_SIZE
-            )
+    def finish(self):
+        with self.lock:
+            self.state["finished"] = all(r["done"] for r in self.state["ranges"])
+            self.state["total_rows"] = sum(r["rows"] for r in self.state["ranges"])
+            self.save()
 
-            pbar.update(len(records))
 
-            if rotated:
-                rows_in_file = 0
+def remove_files(directory, patterns):
+    """Удаляет файлы и каталоги `directory`, подходящие под шаблоны glob."""
+    for pattern in patterns:
+        for path in directory.glob(pattern):
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
 
-        except ServiceUnavailable as e:
-            print(f"[!] Lost connect: {e}. Wait for {RETRY_DELAY}...")
-            time.sleep(RETRY_DELAY)
 
-    if f:
-        f.close()
+def open_range_writer(item, fmt, out_dir=OUT_DIR):
+    if fmt == "parquet":
+        # Незакрытый файл прерванного запуска перезаписывается под тем же номером
+        return PartParquetWriter(f"export_part_r{item['part']:04d}", item["files"], out_dir=out_dir)
+    return RangeCsvWriter(item["part"], item["offset"], out_dir)
 
-    close_driver()
+
+def export_range(
+    item, manifest, pbar, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE, fmt="csv", out_dir=OUT_DIR,
+    query=QUERY_RANGE, id_key="rid", open_writer=open_range_writer, page_size=PAGE_SIZE,
+):
+    """
+    Выгружает диапазон id в свои файлы окнами по `page_size` id: каждое
+    окно - один потоковый запрос. При потере соединения запрос
+    повторяется с последнего записанного id.
+    `query` отдает записи по возрастанию `id_key` в (last_rid, end_rid].
+    """
+    part, end = item["part"], item["end"]
+    last_rid, rows = item["last_rid"], item["rows"]
+    writer = open_writer(item, fmt, out_dir)
+    try:
+        while last_rid < end:
+            page_end = min(last_rid + page_size, end)
+            try:
+                for records in stream_batches(query, last_rid, batch_size, fetch_size, end_rid=page_end):
+                    last_rid = records[-1][id_key]
+                    rows += len(records)
+                    if writer.write(records):
+                        manifest.update(part, rows=rows, last_rid=last_rid, **writer.state())
+                    pbar.update(len(records))
+                # Окно прочитано целиком: все id до page_end записаны
+                last_rid = page_end
+            except (ServiceUnavailable, SessionExpired) as e:
+                print(f"[!] Range {part}: lost connect: {e}. Wait for {RETRY_DELAY}...")
+                time.sleep(RETRY_DELAY)
+    finally:
+        writer.close()
+    manifest.update(part, rows=rows, last_rid=last_rid, done=True, **writer.state())
+    return rows
+
+
+def main(workers=1, ranges=1, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE, fmt="csv", out_dir=OUT_DIR, after_rid=None):
+    """
+    Выгрузка связей: диапазон id связей делится на `ranges` частей, их
+    читают `workers` сессий, каждая часть пишется в свои файлы
+    export_part_rNNNN.csv (или export_part_rNNNN_MMM.parquet) в `out_dir`.
+    Прерванная выгрузка при повторном запуске продолжается по manifest.json:
+    завершенные диапазоны пропускаются, остальные идут с watermark.
+    С `after_rid` выгружаются только связи с id больше него (дельта).
+    """
+    def make_ranges():
+        min_rid, max_rid = get_rid_bounds()
+        if max_rid is None:
+            return []
+        if after_rid is not None:
+            min_rid = after_rid + 1
+        if max_rid < min_rid:
+            return []
+        return split_rid_range(min_rid, max_rid, ranges)
+
+    manifest_path = out_dir / MANIFEST_NAME
+    stale = PART_PATTERNS + (SNAPSHOT_PATTERNS if after_rid is None else ())
+    manifest = Manifest(manifest_path, fmt, make_ranges, stale)
+    pending = [item for item in manifest.ranges if not item["done"]]
+    done_rows = sum(r["rows"] for r in manifest.ranges)
+    print(
+        f"Starting to download data from Neo4j: {len(manifest.ranges)} ranges, {len(pending)} pending, "
+        f"{workers} workers{', resumed at ' + str(done_rows) + ' rows' if manifest.resumed else ''}"
+    )
+
+    start = time.perf_counter()
+    # Для дельты общее число связей не показательно, прогресс - без итога
+    pbar = tqdm(total=get_total_rows() if after_rid is None else None, initial=done_rows, desc="Export rows", unit=" rows")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda item: export_range(item, manifest, pbar, batch_size, fetch_size, fmt, out_dir), pending))
     pbar.close()
-    print("Export finished")
-    print(f"Data saved to {OUT_DIR}")
+    manifest.finish()
+
+    end = time.perf_counter()
+    print(f"Export finished: {manifest.state['total_rows']} rows, time: {end - start:.3f} s.")
+    print(f"Data saved to {out_dir}, manifest {manifest_path}")
+    return manifest
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Export relationships from Neo4j")
+    parser.add_argument("--parallel", type=int, default=1, help="number of worker sessions")
+    parser.add_argument("--ranges-per-worker", type=int, default=RANGES_PER_WORKER, help="used when --parallel > 1")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    args = parser.parse_args()
+
+    ranges = args.parallel * args.ranges_per_worker if args.parallel > 1 else 1
+    main(args.parallel, ranges, args.batch_size, args.fetch_size, args.format)
+    close_driver()
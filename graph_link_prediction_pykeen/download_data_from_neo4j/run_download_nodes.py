@@ -0,0 +1,142 @@
+# run_download_nodes.py
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from download_data import FETCH_SIZE, get_total_nodes, get_node_id_bounds, split_rid_range, close_driver
+from save_data_to_csv import OUT_DIR
+from save_data_to_parquet import NODE_SCHEMA, PartParquetWriter
+from run_download_and_save import BATCH_SIZE, RANGES_PER_WORKER, MANIFEST_NAME, Manifest, export_range
+from incremental_export import load_json, save_json, snapshot_base
+
+NODES_DIR = OUT_DIR / "nodes"
+# Плотный индекс узлов, общий для выгрузок узлов и связей:
+# отсортированные id узлов (int64), индекс узла - позиция в массиве
+NODE_INDEX_PATH = OUT_DIR / "node_index.npy"
+# Рядом с индексом (node_index.json) - отметка снимка связей, на котором он
+# построен; prepare_data_iw_hs.py берет индекс только для того же снимка
+
+# Как и QUERY_RANGE: id(n) = node_id планируется как поиск узла по id (NodeByIdSeek),
+# запрос читает одно окно id шириной до PAGE_SIZE, ORDER BY сортирует только его
+QUERY_NODES = """
+    UNWIND range($last_rid + 1, $end_rid) AS node_id
+    MATCH (n)
+    WHERE id(n) = node_id
+    RETURN node_id,
+           labels(n)[0] AS label,
+           n.name AS name,
+           n.content AS content,
+           apoc.convert.toJson(apoc.map.removeKeys(properties(n), ['name', 'content'])) AS properties
+    ORDER BY node_id
+"""
+
+
+def open_node_writer(item, fmt, out_dir):
+    return PartParquetWriter(f"nodes_part_r{item['part']:04d}", item["files"], out_dir=out_dir, schema=NODE_SCHEMA)
+
+
+def node_files(nodes_dir=NODES_DIR):
+    """Файлы узлов по порядку диапазонов - строки идут по возрастанию node_id."""
+    return sorted(nodes_dir.glob("nodes_part_*.parquet"))
+
+
+def build_node_index(nodes_dir=NODES_DIR, path=NODE_INDEX_PATH) -> np.ndarray:
+    """
+    Сохраняет id узлов из выгрузки в `path`. Строка i файлов узлов
+    (в порядке node_files) - узел с индексом i, поэтому признаки узла
+    берутся по индексу без join по id.
+    """
+    files = node_files(nodes_dir)
+    node_ids = np.empty(0, dtype=np.int64)
+    if files:
+        node_ids = pq.read_table(files, columns=["node_id"]).column("node_id").to_numpy()
+    if np.any(np.diff(node_ids) <= 0):
+        raise ValueError(f"Node ids in {nodes_dir} are not strictly increasing")
+    np.save(path, node_ids)
+    return node_ids
+
+
+def edge_snapshot(edges_dir=OUT_DIR):
+    """
+    Отметка снимка связей в `edges_dir`: export_id завершенной полной выгрузки
+    и число источников цепочки snapshot.json (полная выгрузка и дельты).
+    None, если полная выгрузка не завершена.
+    """
+    manifest = load_json(edges_dir / MANIFEST_NAME)
+    if not manifest or not manifest.get("finished"):
+        return None
+    snapshot = load_json(edges_dir / "snapshot.json")
+    runs = len(snapshot["runs"]) if snapshot and snapshot["base"] == snapshot_base(manifest) else 1
+    return {"export_id": manifest.get("export_id"), "runs": runs}
+
+
+def dense_ids(node_ids, node_index) -> np.ndarray:
+    """Индексы узлов по их id (например, entity_1/entity_2 связей); -1 для id не из индекса."""
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    if not len(node_index):
+        return np.full(len(node_ids), -1, dtype=np.int32)
+    pos = np.minimum(np.searchsorted(node_index, node_ids), len(node_index) - 1)
+    return np.where(node_index[pos] == node_ids, pos, -1).astype(np.int32)
+
+
+def main(workers=1, ranges=1, batch_size=BATCH_SIZE, fetch_size=FETCH_SIZE, out_dir=NODES_DIR):
+    """
+    Выгрузка узлов (node_id, label, name, content, properties) в Parquet
+    по диапазонам id узлов тем же механизмом, что и выгрузка связей:
+    `workers` сессий, manifest.json с watermark по диапазонам и
+    продолжение прерванной выгрузки. По завершении строится node_index.npy
+    и рядом node_index.json с отметкой снимка связей из `out_dir.parent`.
+    """
+    def make_ranges():
+        min_id, max_id = get_node_id_bounds()
+        return split_rid_range(min_id, max_id, ranges) if min_id is not None else []
+
+    out_dir.mkdir(exist_ok=True, parents=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = Manifest(manifest_path, "parquet", make_ranges, stale=("nodes_part_r*",))
+    pending = [item for item in manifest.ranges if not item["done"]]
+    done_rows = sum(r["rows"] for r in manifest.ranges)
+    print(
+        f"Starting to download nodes from Neo4j: {len(manifest.ranges)} ranges, {len(pending)} pending, "
+        f"{workers} workers{', resumed at ' + str(done_rows) + ' rows' if manifest.resumed else ''}"
+    )
+
+    start = time.perf_counter()
+    pbar = tqdm(total=get_total_nodes(), initial=done_rows, desc="Export nodes", unit=" nodes")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(
+            lambda item: export_range(
+                item, manifest, pbar, batch_size, fetch_size, "parquet", out_dir,
+                QUERY_NODES, "node_id", open_node_writer,
+            ),
+            pending,
+        ))
+    pbar.close()
+    manifest.finish()
+    node_index = build_node_index(out_dir, NODE_INDEX_PATH)
+    edges = edge_snapshot(out_dir.parent)
+    save_json(NODE_INDEX_PATH.with_suffix(".json"), {"edges": edges})
+    if edges is None:
+        print(f"[!] No finished edge export in {out_dir.parent}, prepare_data_iw_hs.py will not use the node index")
+
+    end = time.perf_counter()
+    print(f"Export finished: {manifest.state['total_rows']} nodes, time: {end - start:.3f} s.")
+    print(f"Data saved to {out_dir}, node index ({len(node_index)} ids) {NODE_INDEX_PATH}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export nodes with their attributes from Neo4j")
+    parser.add_argument("--parallel", type=int, default=1, help="number of worker sessions")
+    parser.add_argument("--ranges-per-worker", type=int, default=RANGES_PER_WORKER, help="used when --parallel > 1")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE)
+    args = parser.parse_args()
+
+    ranges = args.parallel * args.ranges_per_worker if args.parallel > 1 else 1
+    main(args.parallel, ranges, args.batch_size, args.fetch_size)
+    close_driver()
@@ -1,3 +1,4 @@
+import os
 import csv
 from pathlib import Path
 
@@ -7,30 +8,49 @@ OUT_DIR.mkdir(exist_ok=True, parents=True)
 HEADER = ["rid", "entity_1", "predicate", "entity_2",
           "label_e1", "label_e2"]
 
-def open_new_csv(file_index: int):
-    path = OUT_DIR / f"export_part_{file_index:03d}.csv"
+def open_range_csv(part: int, offset: int = 0, out_dir: Path = OUT_DIR, prefix: str = "export_part_r"):
+    """
+    Файл диапазона выгрузки. При offset > 0 файл дописывается
+    с обрезкой до offset байт - все, что было записано после последней
+    отметки в манифесте, отбрасывается.
+    """
+    path = out_dir / f"{prefix}{part:04d}.csv"
+    if offset and path.exists():
+        f = open(path, "r+", encoding="utf-8", newline="")
+        f.truncate(offset)
+        f.seek(offset)
+        return f, csv.writer(f)
     f = open(path, "w", encoding="utf-8", newline="")
     writer = csv.writer(f)
     writer.writerow(HEADER)
     return f, writer
 
-def write_batch_to_csv(records, file_handle, writer, rows_written, batch_limit):
-    last_rid = None
-
-    for rec in records:
-        writer.writerow([
-            rec["rid"],
-            rec["entity_1"],
-            rec["predicate"],
-            rec["entity_2"],
-            rec["label_e1"],
-            rec["label_e2"]
-        ])
-        rows_written += 1
-        last_rid = rec["rid"]
-
-        if rows_written == batch_limit:
-            file_handle.close()
-            return rows_written, last_rid, True
-
-    return rows_written, last_rid, False
\ No newline at end of file
+def write_records(records, writer):
+    """Пишет записи без ротации файлов, возвращает число строк и последний rid."""
+    writer.writerows(
+        [rec["rid"], rec["entity_1"], rec["predicate"], rec["entity_2"], rec["label_e1"], rec["label_e2"]]
+        for rec in records
+    )
+    return len(records), records[-1]["rid"] if records else None
+
+class RangeCsvWriter:
+    """
+    CSV-файл диапазона выгрузки. Каждая пачка сбрасывается
+    на диск, поэтому отметка в манифесте ставится после каждой пачки.
+    """
+    def __init__(self, part: int, offset: int = 0, out_dir: Path = OUT_DIR, prefix: str = "export_part_r"):
+        self.f, self.writer = open_range_csv(part, offset, out_dir, prefix)
+        self.offset = offset
+
+    def write(self, records) -> bool:
+        write_records(records, self.writer)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.offset = self.f.tell()
+        return True
+
+    def state(self) -> dict:
+        return {"file": os.path.basename(self.f.name), "offset": self.offset}
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,81 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from save_data_to_csv import OUT_DIR, HEADER
+
+# Файл части закрывается, когда в нем набралось не меньше ROWS_PER_FILE строк
+ROWS_PER_FILE = 5_000_000
+
+ID_COLUMNS = {"rid", "entity_1", "entity_2"}
+SCHEMA = pa.schema([
+    (name, pa.int64() if name in ID_COLUMNS else pa.dictionary(pa.int32(), pa.string()))
+    for name in HEADER
+])
+
+# Выгрузка узлов: content и name почти уникальны, словарь только для метки;
+# properties - остальные свойства узла одной JSON-строкой
+NODE_SCHEMA = pa.schema([
+    ("node_id", pa.int64()),
+    ("label", pa.dictionary(pa.int32(), pa.string())),
+    ("name", pa.string()),
+    ("content", pa.string()),
+    ("properties", pa.string()),
+])
+
+
+def records_to_batch(records, schema: pa.Schema = SCHEMA) -> pa.RecordBatch:
+    """
+    Пачка записей драйвера -> Arrow RecordBatch по `schema`: id как int64,
+    словарные колонки (predicate, метки) кодируются по пачке - строка
+    хранится один раз на пачку.
+    """
+    arrays = []
+    for field in schema:
+        values = [rec[field.name] for rec in records]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def open_new_parquet(name: str, out_dir=OUT_DIR, schema: pa.Schema = SCHEMA) -> pq.ParquetWriter:
+    return pq.ParquetWriter(out_dir / name, schema, compression="zstd")
+
+
+class PartParquetWriter:
+    """
+    Последовательность файлов `<prefix>_NNN.parquet` (zstd), каждая пачка
+    записей - группа строк. Новый файл начинается, когда в текущем набралось
+    `rows_per_file` строк; `files` - уже закрытые файлы в `out_dir`.
+    """
+    def __init__(self, prefix: str, files=None, rows_per_file: int = ROWS_PER_FILE, out_dir=OUT_DIR, schema: pa.Schema = SCHEMA):
+        self.prefix = prefix
+        self.out_dir = out_dir
+        self.schema = schema
+        self.files = list(files or [])
+        self.rows_per_file = rows_per_file
+        self._writer = None
+        self._rows = 0
+
+    def write(self, records) -> bool:
+        """Пишет пачку; True, если после нее файл закрыт (состояние можно фиксировать)."""
+        if self._writer is None:
+            self._name = f"{self.prefix}_{len(self.files) + 1:03d}.parquet"
+            self._writer = open_new_parquet(self._name, self.out_dir, self.schema)
+        self._writer.write_batch(records_to_batch(records, self.schema))
+        self._rows += len(records)
+        if self._rows >= self.rows_per_file:
+            self.close()
+            return True
+        return False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.files.append(self._name)
+            self._writer = None
+            self._rows = 0
+
+    def state(self) -> dict:
+        return {"files": list(self.files)}
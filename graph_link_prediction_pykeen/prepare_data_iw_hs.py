@@ -1,28 +1,217 @@
+import json
+import shutil
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from pathlib import Path
-from pykeen.triples import TriplesFactory
+from numpy.lib.format import open_memmap
 
 ROW_DIR = Path("data/raw_data/export_iw_hs")
 CLEAN_DIR = Path("data/data_for_training/iw_hs")
 CLEAN_DIR.mkdir(exist_ok=True, parents=True)
 
 USE_COLS = ["entity_1", "predicate", "entity_2"]
+# Плотный индекс узлов из run_download_nodes.py: если он построен на том же
+# снимке связей (node_index.json) и покрывает все их концы, индексы сущностей
+# совпадают с индексами признаков узлов
+NODE_INDEX_PATH = ROW_DIR / "node_index.npy"
 
-csv_files = sorted(ROW_DIR.glob("export_part_*.csv"))
+# Перемешивание вне памяти: строки раскладываются по BUCKETS файлам по хешу,
+# затем каждый файл перемешивается в памяти и дописывается в triples.npy
+BUCKETS = 64
+CHUNK_ROWS = 1_000_000
+SEED = 42
+BUCKET_DTYPE = np.dtype([("head", np.int64), ("relation", np.int32), ("tail", np.int64)])
 
-dfs = []
-for file in csv_files:
-    df = pd.read_csv(file, usecols=USE_COLS)
-    dfs.append(df)
+TRIPLES_PATH = CLEAN_DIR / "triples.npy"
+ENTITIES_PATH = CLEAN_DIR / "entities.npy"
+RELATIONS_PATH = CLEAN_DIR / "relations.json"
 
-all_data = pd.concat(dfs, ignore_index=True)
-all_data = all_data.sample(frac=1, random_state=42)
 
-all_data["entity_1"] = all_data["entity_1"].astype(str).str.strip()
-all_data["entity_2"] = all_data["entity_2"].astype(str).str.strip()
-all_data["predicate"] = all_data["predicate"].astype(str).str.strip()
+def iter_parts(directory, columns):
+    """Строки файлов export_part_* из `directory` кусками по CHUNK_ROWS."""
+    parquet_files = sorted(directory.glob("export_part_*.parquet"))
+    csv_files = sorted(directory.glob("export_part_*.csv"))
 
-all_data.to_csv(CLEAN_DIR / "iw_hs.csv", index=False)
+    if parquet_files:
+        # Выгрузка в Parquet: колонки читаются без разбора текста, метки - словарные
+        for file in parquet_files:
+            for batch in pq.ParquetFile(file).iter_batches(batch_size=CHUNK_ROWS, columns=columns):
+                yield batch.to_pandas()
+    else:
+        for file in csv_files:
+            yield from pd.read_csv(file, usecols=columns, chunksize=CHUNK_ROWS)
+
+
+def finished_base():
+    """
+    Отметка завершенной полной выгрузки из manifest.json (как в
+    incremental_export.snapshot_base), None - если выгрузка не завершена.
+    """
+    manifest_path = ROW_DIR / "manifest.json"
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not manifest.get("finished"):
+        return None
+    return {
+        "export_id": manifest.get("export_id"),
+        "total_rows": manifest["total_rows"],
+        "watermark": max((item["end"] for item in manifest["ranges"]), default=-1),
+    }
+
+
+def snapshot_dirs():
+    """
+    Каталоги полной выгрузки и дельт по snapshot.json. Цепочка дельт
+    используется, только если ее отметка `base` совпадает с завершенной
+    полной выгрузкой в manifest.json; дельты от прошлой полной выгрузки
+    игнорируются.
+    """
+    snapshot_path = ROW_DIR / "snapshot.json"
+    if not snapshot_path.exists():
+        return [ROW_DIR]
+    with open(snapshot_path, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("base") != finished_base():
+        print(f"[!] {snapshot_path} belongs to another full export, deltas are ignored")
+        return [ROW_DIR]
+    return [ROW_DIR] + [ROW_DIR / run["dir"] for run in snapshot["runs"][1:]]
+
+
+def edge_snapshot():
+    """Отметка читаемого снимка связей, как в run_download_nodes.edge_snapshot."""
+    base = finished_base()
+    if base is None:
+        return None
+    return {"export_id": base["export_id"], "runs": len(snapshot_dirs())}
+
+
+def iter_sources():
+    """
+    Полная выгрузка и дельты инкрементальной выгрузки (incremental_export.py)
+    по snapshot.json. Из строк каждого источника убираются rid из tombstones
+    всех более поздних дельт - так же, как при последовательном применении.
+    """
+    dirs = snapshot_dirs()
+    if len(dirs) == 1:
+        for chunk in iter_parts(ROW_DIR, USE_COLS):
+            yield chunk
+        return
+
+    # later[i] - rid из tombstones всех дельт после dirs[i]
+    later = [np.empty(0, dtype=np.int64)]
+    for delta_dir in reversed(dirs[1:]):
+        later.insert(0, np.union1d(later[0], np.load(delta_dir / "tombstones.npy")))
+    for directory, tombstones in zip(dirs, later):
+        for chunk in iter_parts(directory, ["rid"] + USE_COLS):
+            yield chunk[~np.isin(chunk["rid"].to_numpy(), tombstones)][USE_COLS]
+
+
+def bucket_triples(bucket_dir):
+    """
+    Первый проход: связи раскладываются по файлам-корзинам (id узлов
+    как есть, отношения - временные коды в порядке появления).
+    Возвращает число строк, уникальные id узлов и метки отношений.
+    """
+    bucket_dir.mkdir(exist_ok=True, parents=True)
+    files = [open(bucket_dir / f"bucket_{i:03d}.bin", "wb") for i in range(BUCKETS)]
+    relation_codes = {}
+    entities = [np.empty(0, dtype=np.int64)]
+    total = 0
+    try:
+        for chunk in iter_sources():
+            codes, uniques = pd.factorize(chunk["predicate"])
+            lookup = np.array([relation_codes.setdefault(str(u).strip(), len(relation_codes)) for u in uniques], dtype=np.int32)
+            rows = np.empty(len(chunk), dtype=BUCKET_DTYPE)
+            rows["head"] = chunk["entity_1"].to_numpy(np.int64)
+            rows["relation"] = lookup[codes]
+            rows["tail"] = chunk["entity_2"].to_numpy(np.int64)
+
+            bucket = pd.util.hash_pandas_object(chunk[USE_COLS].astype({"predicate": object}), index=False, hash_key=f"{SEED:016d}").to_numpy() % BUCKETS
+            order = np.argsort(bucket, kind="stable")
+            bounds = np.searchsorted(bucket[order], np.arange(BUCKETS + 1))
+            for i in range(BUCKETS):
+                rows[order[bounds[i]:bounds[i + 1]]].tofile(files[i])
+
+            entities.append(np.unique(np.concatenate([rows["head"], rows["tail"]])))
+            if len(entities) > 16:
+                entities = [np.unique(np.concatenate(entities))]
+            total += len(chunk)
+    finally:
+        for f in files:
+            f.close()
+    return total, np.unique(np.concatenate(entities)), list(relation_codes)
+
+
+def entity_vocabulary(entities):
+    """
+    Сущности - плотный индекс узлов, если он построен на текущем снимке
+    связей и покрывает все концы связей, иначе id из связей. Индекс от
+    другого снимка не берется даже при полном покрытии: после
+    переиспользования id узел индекса может оказаться другим узлом.
+    """
+    if NODE_INDEX_PATH.exists():
+        meta_path = NODE_INDEX_PATH.with_suffix(".json")
+        edges = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                edges = json.load(f).get("edges")
+        current = edge_snapshot()
+        if current is None or edges != current:
+            print(f"[!] {NODE_INDEX_PATH} was built on another edge snapshot, building entity ids from edges")
+            return entities
+        node_index = np.load(NODE_INDEX_PATH)
+        if np.isin(entities, node_index).all():
+            return node_index
+        print(f"[!] {NODE_INDEX_PATH} does not cover all edge endpoints, building entity ids from edges")
+    return entities
+
+
+def write_triples(bucket_dir, total, entities, relation_remap):
+    """
+    Второй проход: каждая корзина перемешивается в памяти, id узлов и
+    отношений переводятся в плотные int32 и дописываются в triples.npy (N x 3).
+    """
+    rng = np.random.default_rng(SEED)
+    triples = open_memmap(TRIPLES_PATH, mode="w+", dtype=np.int32, shape=(total, 3))
+    offset = 0
+    for i in range(BUCKETS):
+        rows = np.fromfile(bucket_dir / f"bucket_{i:03d}.bin", dtype=BUCKET_DTYPE)
+        rows = rows[rng.permutation(len(rows))]
+        end = offset + len(rows)
+        triples[offset:end, 0] = np.searchsorted(entities, rows["head"])
+        triples[offset:end, 1] = relation_remap[rows["relation"]]
+        triples[offset:end, 2] = np.searchsorted(entities, rows["tail"])
+        offset = end
+    triples.flush()
+    return triples
+
+
+def main():
+    """
+    Готовит связи для обучения без загрузки выгрузки целиком:
+    triples.npy - перемешанные тройки (head, relation, tail) как int32,
+    entities.npy - id узлов Neo4j (индекс сущности = позиция),
+    relations.json - метки отношений (индекс = позиция, по алфавиту).
+    """
+    bucket_dir = CLEAN_DIR / "buckets"
+    total, entities, relation_labels = bucket_triples(bucket_dir)
+    entities = entity_vocabulary(entities)
+    relations = sorted(relation_labels)
+    relation_remap = np.array([relations.index(label) for label in relation_labels], dtype=np.int32)
+
+    write_triples(bucket_dir, total, entities, relation_remap)
+    shutil.rmtree(bucket_dir)
+    np.save(ENTITIES_PATH, entities)
+    with open(RELATIONS_PATH, "w", encoding="utf-8") as f:
+        json.dump(relations, f, indent=4)
+    print(f"{total} triples, {len(entities)} entities, {len(relations)} relations saved to {CLEAN_DIR}")
+
+
+if __name__ == "__main__":
+    main()
 
 # all_data_iw = all_data[all_data["predicate"] == 'interacts_with']
 # all_data_hs = all_data[all_data["predicate"] == 'has_similarity']
@@ -1,3 +1,8 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
 from pykeen.triples import TriplesFactory
 
 def split_data(path: str, ratios: list[float] = [.8, .1, .1], random_state: int = None):
@@ -16,4 +21,24 @@ def split_data(path: str, ratios: list[float] = [.8, .1, .1], random_state: int
     print(test.num_triples)
     print(val.num_triples)
 
-    return train, test, val
\ No newline at end of file
+    return train, test, val
+
+
+def load_mapped_triples(path: str, create_inverse_triples: bool = False) -> TriplesFactory:
+    """
+    TriplesFactory из результата prepare_data_iw_hs.py без повторной разметки:
+    triples.npy - тройки индексов, entities.npy - id узлов по индексу,
+    relations.json - метки отношений по индексу.
+    """
+    directory = Path(path)
+    mapped_triples = torch.from_numpy(np.load(directory / "triples.npy")).long()
+    entities = np.load(directory / "entities.npy")
+    with open(directory / "relations.json", "r", encoding="utf-8") as f:
+        relations = json.load(f)
+
+    return TriplesFactory(
+        mapped_triples=mapped_triples,
+        entity_to_id={str(entity): i for i, entity in enumerate(entities.tolist())},
+        relation_to_id={relation: i for i, relation in enumerate(relations)},
+        create_inverse_triples=create_inverse_triples,
+    )
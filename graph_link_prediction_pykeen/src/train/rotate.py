@@ -1,5 +1,3 @@
-import pandas as pd
-from pykeen.triples import TriplesFactory
 from pykeen.models import RotatE
 from pykeen.training import SLCWATrainingLoop
 from pykeen.losses import MarginRankingLoss
@@ -8,6 +6,14 @@ from pykeen.optimizers import Adam
 from pykeen.regularizers import LpRegularizer
 import optuna
 import json
+import sys
+from pathlib import Path
+
+# sbatch_tasks/rotate.sh запускает `uv run src/train/rotate_best.py`: в sys.path
+# попадает каталог скрипта, а splitting лежит в корне проекта
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from splitting.split import load_mapped_triples
 
 
 LR = 1e-3
@@ -16,12 +22,7 @@ WEIGHT = 1e-3
 device = 'cuda'
 batch_size = 4096
 
-df_sparse = pd.read_csv("/mnt/tank/scratch/pbogdanov/link_pykeen/data/data_for_training/iw_hs/iw_hs.csv")
-
-main_data = df_sparse.astype(str)
-
-triples = main_data[["entity_1", "predicate", "entity_2"]].values
-triplet_data = TriplesFactory.from_labeled_triples(triples, create_inverse_triples=False)
+triplet_data = load_mapped_triples("/mnt/tank/scratch/pbogdanov/link_pykeen/data/data_for_training/iw_hs")
 training_set, testing_set, validation_set = triplet_data.split([0.8, 0.1, 0.1], random_state=100)
 
 def objective(trial):
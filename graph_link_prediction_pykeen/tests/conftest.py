@@ -0,0 +1,112 @@
+import importlib
+from unittest import mock
+
+import pytest
+
+# download_data подключается к Neo4j при импорте: в тестах драйвер подменяется,
+# а функции, которые ходят в базу, тесты заменяют через monkeypatch
+with mock.patch("neo4j.GraphDatabase.driver"):
+    import download_data  # noqa: F401
+
+
+class FakeGraph:
+    """
+    Связи rid -> (entity_1, predicate, entity_2) и узлы node_id -> (label, name, content)
+    вместо базы для stream_batches.
+    """
+    def __init__(self, rels=None, nodes=None):
+        self.rels = dict(rels or {})
+        self.nodes = dict(nodes or {})
+
+    def record(self, rid):
+        entity_1, predicate, entity_2 = self.rels[rid]
+        return {
+            "rid": rid, "entity_1": entity_1, "predicate": predicate, "entity_2": entity_2,
+            "label_e1": "protein", "label_e2": "rna",
+        }
+
+    def rid_bounds(self):
+        return (min(self.rels), max(self.rels)) if self.rels else (None, None)
+
+    def stream_batches(self, query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        rids = sorted(rid for rid in self.rels if last_rid < rid <= end_rid)
+        for i in range(0, len(rids), batch_size):
+            yield [self.record(rid) for rid in rids[i:i + batch_size]]
+
+    def fetch_records(self, query, rids=(), **params):
+        return [self.record(rid) for rid in sorted(rids) if rid in self.rels]
+
+    def node_record(self, node_id):
+        label, name, content = self.nodes[node_id]
+        return {"node_id": node_id, "label": label, "name": name, "content": content, "properties": "{}"}
+
+    def node_id_bounds(self):
+        return (min(self.nodes), max(self.nodes)) if self.nodes else (None, None)
+
+    def stream_nodes(self, query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        node_ids = sorted(node_id for node_id in self.nodes if last_rid < node_id <= end_rid)
+        for i in range(0, len(node_ids), batch_size):
+            yield [self.node_record(node_id) for node_id in node_ids[i:i + batch_size]]
+
+
+@pytest.fixture
+def graph():
+    rels = {rid: (rid % 7, ["interacts_with", "has_similarity"][rid % 2], rid % 5 + 100) for rid in range(1, 41)}
+    nodes = {node_id: ("protein" if node_id < 100 else "rna", f"n{node_id}", "MK" * node_id) for node_id in [*range(7), *range(100, 105), 130]}
+    return FakeGraph(rels, nodes)
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch, graph):
+    """run_download_and_save поверх FakeGraph; каталоги модулей создаются в tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("run_download_and_save")
+    monkeypatch.setattr(module, "stream_batches", graph.stream_batches)
+    monkeypatch.setattr(module, "get_rid_bounds", graph.rid_bounds)
+    monkeypatch.setattr(module, "get_total_rows", lambda: len(graph.rels))
+    out_dir = tmp_path / "export"
+    out_dir.mkdir()
+    module.test_out_dir = out_dir
+    return module
+
+
+@pytest.fixture
+def incremental(export, monkeypatch, graph):
+    """incremental_export поверх FakeGraph; полная выгрузка - export.main в его OUT_DIR."""
+    module = importlib.import_module("incremental_export")
+    monkeypatch.setattr(module, "stream_batches", graph.stream_batches)
+    monkeypatch.setattr(module, "fetch_records", graph.fetch_records)
+    monkeypatch.setattr(module, "get_rid_bounds", graph.rid_bounds)
+    module.OUT_DIR.mkdir(parents=True, exist_ok=True)
+    return module
+
+
+@pytest.fixture
+def nodes(export, monkeypatch, graph, tmp_path):
+    """run_download_nodes поверх узлов FakeGraph; node_index.npy - в tmp_path."""
+    module = importlib.import_module("run_download_nodes")
+    monkeypatch.setattr(export, "stream_batches", graph.stream_nodes)
+    monkeypatch.setattr(module, "get_node_id_bounds", graph.node_id_bounds)
+    monkeypatch.setattr(module, "get_total_nodes", lambda: len(graph.nodes))
+    monkeypatch.setattr(module, "NODE_INDEX_PATH", tmp_path / "node_index.npy")
+    module.test_out_dir = tmp_path / "nodes"
+    return module
+
+
+@pytest.fixture
+def prepare(tmp_path, monkeypatch):
+    # Модуль создает CLEAN_DIR при импорте относительно текущего каталога
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("prepare_data_iw_hs")
+    raw, clean = tmp_path / "raw", tmp_path / "clean"
+    raw.mkdir()
+    clean.mkdir()
+    monkeypatch.setattr(module, "ROW_DIR", raw)
+    monkeypatch.setattr(module, "CLEAN_DIR", clean)
+    monkeypatch.setattr(module, "NODE_INDEX_PATH", raw / "node_index.npy")
+    monkeypatch.setattr(module, "TRIPLES_PATH", clean / "triples.npy")
+    monkeypatch.setattr(module, "ENTITIES_PATH", clean / "entities.npy")
+    monkeypatch.setattr(module, "RELATIONS_PATH", clean / "relations.json")
+    monkeypatch.setattr(module, "BUCKETS", 4)
+    monkeypatch.setattr(module, "CHUNK_ROWS", 7)
+    return module
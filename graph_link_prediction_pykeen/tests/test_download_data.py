@@ -0,0 +1,13 @@
+import pytest
+
+from download_data import split_rid_range
+
+
+@pytest.mark.parametrize("min_rid, max_rid, parts", [(0, 99, 4), (5, 5, 3), (10, 1000, 7), (0, 2, 8)])
+def test_split_rid_range_covers_ids_once(min_rid, max_rid, parts):
+    ranges = split_rid_range(min_rid, max_rid, parts)
+    assert ranges[0][0] == min_rid - 1
+    assert ranges[-1][1] == max_rid
+    assert all(start < end for start, end in ranges)
+    assert all(prev[1] == cur[0] for prev, cur in zip(ranges, ranges[1:]))
+    assert len(ranges) == min(parts, max_rid - min_rid + 1)
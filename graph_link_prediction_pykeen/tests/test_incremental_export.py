@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _snapshot_rows(prepare):
+    df = pd.concat(list(prepare.iter_sources()), ignore_index=True)
+    return sorted(map(tuple, df[["entity_1", "predicate", "entity_2"]].itertuples(index=False)))
+
+
+def _graph_rows(graph):
+    return sorted(graph.rels.values())
+
+
+@pytest.fixture
+def chain(tmp_path, incremental, prepare, monkeypatch):
+    monkeypatch.setattr(prepare, "ROW_DIR", tmp_path / incremental.OUT_DIR)
+    return incremental
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_deltas_reproduce_the_graph(export, chain, prepare, graph, fmt):
+    out_dir = chain.OUT_DIR
+    export.main(workers=2, ranges=2, batch_size=4, fmt=fmt, out_dir=out_dir)
+    chain.main(workers=1, ranges=2, batch_size=4)
+    assert _snapshot_rows(prepare) == _graph_rows(graph)
+
+    # Удаления, новые связи выше watermark и новая связь под переиспользованным id
+    for rid in (3, 10, 25):
+        del graph.rels[rid]
+    graph.rels[10] = (6, "interacts_with", 999)
+    graph.rels[17] = (1, "binds", 100)
+    for rid in range(41, 46):
+        graph.rels[rid] = (rid, "binds", 200)
+    chain.main(workers=2, ranges=2, batch_size=4, full_reconcile=True)
+
+    snapshot = json.loads(chain.SNAPSHOT_PATH.read_text())
+    last = out_dir / snapshot["runs"][-1]["dir"]
+    # Старые строки под переиспользованными id 10 и 17 тоже удаляются, новые идут в backfill
+    np.testing.assert_array_equal(np.load(last / chain.TOMBSTONES_NAME), [3, 10, 17, 25])
+    assert json.loads((last / chain.RECONCILE_NAME).read_text())["backfill"] == 2
+    live_rids, _ = chain.load_live_index(last)
+    np.testing.assert_array_equal(live_rids, sorted(graph.rels))
+    assert _snapshot_rows(prepare) == _graph_rows(graph)
+
+    for rid in (41, 2):
+        del graph.rels[rid]
+    graph.rels[50] = (5, "binds", 300)
+    chain.main(workers=1, ranges=1, batch_size=4, full_reconcile=True)
+    assert len(snapshot["runs"]) + 1 == len(json.loads(chain.SNAPSHOT_PATH.read_text())["runs"])
+    assert _snapshot_rows(prepare) == _graph_rows(graph)
+
+
+def test_delta_without_reconcile_reads_only_new_ids(export, chain, prepare, graph, monkeypatch):
+    export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=chain.OUT_DIR)
+    chain.main(workers=1, ranges=1, batch_size=4)
+
+    windows = []
+    stream = graph.stream_batches
+
+    def recording(query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        windows.append((last_rid, end_rid))
+        yield from stream(query, last_rid, batch_size, fetch_size, end_rid)
+
+    monkeypatch.setattr(export, "stream_batches", recording)
+    monkeypatch.setattr(chain, "stream_batches", recording)
+    for rid in range(41, 46):
+        graph.rels[rid] = (rid, "binds", 200)
+    chain.main(workers=1, ranges=1, batch_size=4)
+
+    assert windows and all(start >= 40 for start, _ in windows)
+    snapshot = json.loads(chain.SNAPSHOT_PATH.read_text())
+    last = chain.OUT_DIR / snapshot["runs"][-1]["dir"]
+    assert json.loads((last / chain.RECONCILE_NAME).read_text())["reconciled"] is False
+    assert len(np.load(last / chain.TOMBSTONES_NAME)) == 0
+    assert _snapshot_rows(prepare) == _graph_rows(graph)
+
+
+def test_build_live_index_streams_parts(export, chain, graph):
+    export.main(workers=1, ranges=3, batch_size=4, fmt="parquet", out_dir=chain.OUT_DIR)
+    rids, keys = chain.build_live_index([chain.OUT_DIR], "parquet")
+    np.testing.assert_array_equal(rids, sorted(graph.rels))
+    df = pd.DataFrame([graph.record(rid) for rid in sorted(graph.rels)])
+    np.testing.assert_array_equal(keys, chain.row_keys(df))
+
+    tombstones = np.array([rids[0], rids[5]])
+    live_rids, _ = chain.build_live_index([], "parquet", rids, keys, tombstones)
+    np.testing.assert_array_equal(live_rids, np.setdiff1d(rids, tombstones))
+
+
+def test_new_full_export_drops_the_old_chain(export, chain, prepare, graph):
+    out_dir = chain.OUT_DIR
+    export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=out_dir)
+    chain.main(workers=1, ranges=1, batch_size=4)
+    del graph.rels[5]
+    chain.main(workers=1, ranges=1, batch_size=4, full_reconcile=True)
+    old_snapshot = chain.SNAPSHOT_PATH.read_text()
+    assert list(out_dir.glob("delta_*"))
+
+    export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=out_dir)
+    assert not chain.SNAPSHOT_PATH.exists()
+    assert not list(out_dir.glob("delta_*")) and not list(out_dir.glob("live_*.npy"))
+
+    # Цепочка от прошлой полной выгрузки не применяется к новой
+    chain.SNAPSHOT_PATH.write_text(old_snapshot)
+    assert prepare.snapshot_dirs() == [prepare.ROW_DIR]
+    assert _snapshot_rows(prepare) == _graph_rows(graph)
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _edges(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "rid": np.arange(n),
+        "entity_1": rng.integers(100, 140, n),
+        "predicate": rng.choice(["interacts_with", "has_similarity", "binds"], n),
+        "entity_2": rng.integers(100, 140, n),
+    })
+
+
+def _read_triples(module):
+    triples = np.load(module.TRIPLES_PATH)
+    entities = np.load(module.ENTITIES_PATH)
+    with open(module.RELATIONS_PATH, "r", encoding="utf-8") as f:
+        relations = json.load(f)
+    return pd.DataFrame({
+        "entity_1": entities[triples[:, 0]],
+        "predicate": np.array(relations)[triples[:, 1]],
+        "entity_2": entities[triples[:, 2]],
+    })
+
+
+def _sorted(df):
+    return df[["entity_1", "predicate", "entity_2"]].sort_values(["entity_1", "predicate", "entity_2"]).reset_index(drop=True)
+
+
+def test_main_writes_every_edge_once(prepare):
+    edges = _edges(50)
+    edges.iloc[:25].to_csv(prepare.ROW_DIR / "export_part_r0000_000.csv", index=False)
+    edges.iloc[25:].to_csv(prepare.ROW_DIR / "export_part_r0001_000.csv", index=False)
+
+    prepare.main()
+
+    result = _read_triples(prepare)
+    pd.testing.assert_frame_equal(_sorted(result), _sorted(edges))
+    with open(prepare.RELATIONS_PATH, "r", encoding="utf-8") as f:
+        assert json.load(f) == sorted(edges["predicate"].unique())
+    assert not (prepare.CLEAN_DIR / "buckets").exists()
+
+
+def _write_export(prepare, edges, export_id="a"):
+    edges.to_csv(prepare.ROW_DIR / "export_part_r0000_000.csv", index=False)
+    manifest = {"export_id": export_id, "finished": True, "total_rows": len(edges), "ranges": [{"end": len(edges) - 1}]}
+    (prepare.ROW_DIR / "manifest.json").write_text(json.dumps(manifest))
+
+
+def _write_node_index(prepare, node_index, edges):
+    np.save(prepare.NODE_INDEX_PATH, node_index)
+    prepare.NODE_INDEX_PATH.with_suffix(".json").write_text(json.dumps({"edges": edges}))
+
+
+def test_main_uses_node_index_when_it_covers_edges(prepare):
+    edges = _edges(20)
+    _write_export(prepare, edges)
+    node_index = np.arange(90, 150, dtype=np.int64)
+    _write_node_index(prepare, node_index, {"export_id": "a", "runs": 1})
+
+    prepare.main()
+
+    np.testing.assert_array_equal(np.load(prepare.ENTITIES_PATH), node_index)
+    pd.testing.assert_frame_equal(_sorted(_read_triples(prepare)), _sorted(edges))
+
+
+def test_main_ignores_node_index_of_another_snapshot(prepare):
+    edges = _edges(20)
+    _write_export(prepare, edges, export_id="b")
+    # Индекс покрывает все концы, но построен на прошлой полной выгрузке
+    _write_node_index(prepare, np.arange(90, 150, dtype=np.int64), {"export_id": "a", "runs": 1})
+
+    prepare.main()
+
+    np.testing.assert_array_equal(np.load(prepare.ENTITIES_PATH), np.unique(edges[["entity_1", "entity_2"]]))
+    pd.testing.assert_frame_equal(_sorted(_read_triples(prepare)), _sorted(edges))
+
+    # Без отметки снимка индекс тоже не используется
+    prepare.NODE_INDEX_PATH.with_suffix(".json").unlink()
+    assert prepare.entity_vocabulary(np.array([100])).tolist() == [100]
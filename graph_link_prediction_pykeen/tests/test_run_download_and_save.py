@@ -0,0 +1,82 @@
+from unittest import mock
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+
+def _read_export(out_dir, fmt):
+    if fmt == "parquet":
+        return pq.read_table(sorted(out_dir.glob("export_part_*.parquet"))).to_pandas()
+    return pd.concat([pd.read_csv(f) for f in sorted(out_dir.glob("export_part_*.csv"))], ignore_index=True)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_export_writes_every_relationship_once(export, graph, fmt):
+    manifest = export.main(workers=2, ranges=3, batch_size=4, fmt=fmt, out_dir=export.test_out_dir)
+    assert manifest.state["finished"] and manifest.state["total_rows"] == len(graph.rels)
+    df = _read_export(export.test_out_dir, fmt)
+    assert df["rid"].tolist() == sorted(graph.rels)
+
+
+def test_fresh_manifest_removes_parts_of_previous_export(export, graph):
+    out_dir = export.test_out_dir
+    export.main(workers=4, ranges=4, batch_size=4, fmt="csv", out_dir=out_dir)
+    assert len(list(out_dir.glob("export_part_*.csv"))) == 4
+
+    # Законченная выгрузка не продолжается: новая с меньшим числом диапазонов
+    # не должна оставить export_part_r0002/r0003 от прошлой
+    export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=out_dir)
+    assert sorted(f.name for f in out_dir.glob("export_part_*")) == ["export_part_r0000.csv", "export_part_r0001.csv"]
+    assert _read_export(out_dir, "csv")["rid"].tolist() == sorted(graph.rels)
+
+
+def test_interrupted_export_resumes_from_watermark(export, graph, monkeypatch):
+    out_dir = export.test_out_dir
+    stream = graph.stream_batches
+
+    def failing(query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        for i, records in enumerate(stream(query, last_rid, batch_size, fetch_size, end_rid)):
+            if i == 2:
+                raise KeyboardInterrupt
+            yield records
+
+    monkeypatch.setattr(export, "stream_batches", failing)
+    with pytest.raises(KeyboardInterrupt):
+        export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=out_dir)
+
+    monkeypatch.setattr(export, "stream_batches", stream)
+    manifest = export.main(workers=1, ranges=2, batch_size=4, fmt="csv", out_dir=out_dir)
+    assert manifest.resumed
+    assert _read_export(out_dir, "csv")["rid"].tolist() == sorted(graph.rels)
+
+
+def test_manifest_keeps_parts_when_resumed(export, tmp_path):
+    out_dir = export.test_out_dir
+    (out_dir / "nodes_part_r0000_000.parquet").write_bytes(b"")
+    manifest = export.Manifest(out_dir / export.MANIFEST_NAME, "parquet", lambda: [(0, 10)], stale=("nodes_part_*",))
+    assert not manifest.resumed and not list(out_dir.glob("nodes_part_*"))
+
+    (out_dir / "nodes_part_r0000_000.parquet").write_bytes(b"")
+    manifest = export.Manifest(out_dir / export.MANIFEST_NAME, "parquet", lambda: [(0, 10)], stale=("nodes_part_*",))
+    assert manifest.resumed and list(out_dir.glob("nodes_part_*"))
+
+
+def test_ranges_are_read_in_bounded_windows(export, graph, monkeypatch):
+    windows = []
+    stream = graph.stream_batches
+
+    def recording(query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        windows.append((last_rid, end_rid))
+        yield from stream(query, last_rid, batch_size, fetch_size, end_rid)
+
+    monkeypatch.setattr(export, "stream_batches", recording)
+    out_dir = export.test_out_dir
+    manifest = export.Manifest(out_dir / export.MANIFEST_NAME, "csv", lambda: [(0, 40)])
+
+    rows = export.export_range(manifest.ranges[0], manifest, mock.MagicMock(), batch_size=4, out_dir=out_dir, page_size=6)
+    assert rows == len(graph.rels)
+    assert all(0 < end - start <= 6 for start, end in windows)
+    assert all(prev[1] == cur[0] for prev, cur in zip(windows, windows[1:]))
+    assert windows[0][0] == 0 and windows[-1][1] == 40
+    assert _read_export(out_dir, "csv")["rid"].tolist() == sorted(graph.rels)
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+
+def test_node_export_rows_follow_the_node_index(nodes, graph):
+    manifest = nodes.main(workers=2, ranges=3, batch_size=2, out_dir=nodes.test_out_dir)
+    assert manifest.state["finished"] and manifest.state["total_rows"] == len(graph.nodes)
+
+    node_index = np.load(nodes.NODE_INDEX_PATH)
+    np.testing.assert_array_equal(node_index, sorted(graph.nodes))
+    # Строка i файлов узлов - узел с индексом i
+    table = pq.read_table(nodes.node_files(nodes.test_out_dir))
+    np.testing.assert_array_equal(table.column("node_id").to_numpy(), node_index)
+    assert table.column("name").to_pylist() == [graph.nodes[node_id][1] for node_id in node_index]
+
+
+def test_build_node_index_rejects_unordered_parts(nodes, graph):
+    nodes.main(workers=1, ranges=2, batch_size=4, out_dir=nodes.test_out_dir)
+    first, second = nodes.node_files(nodes.test_out_dir)
+    # Части в обратном порядке: id узлов идут не по возрастанию
+    tmp = first.with_suffix(".tmp")
+    first.rename(tmp)
+    second.rename(first)
+    tmp.rename(second)
+    with pytest.raises(ValueError):
+        nodes.build_node_index(nodes.test_out_dir, nodes.NODE_INDEX_PATH)
+
+
+def test_dense_ids_maps_edge_endpoints(nodes):
+    node_index = np.array([0, 3, 7, 100, 130], dtype=np.int64)
+    np.testing.assert_array_equal(nodes.dense_ids([100, 0, 5, 130, 200, -1], node_index), [3, 0, -1, 4, -1, -1])
+    assert nodes.dense_ids([1, 2], node_index).dtype == np.int32
+    np.testing.assert_array_equal(nodes.dense_ids([1, 2], np.empty(0, dtype=np.int64)), [-1, -1])
+
+
+def test_interrupted_node_export_resumes(nodes, graph, export, monkeypatch):
+    stream = graph.stream_nodes
+
+    def failing(query, last_rid, batch_size, fetch_size=None, end_rid=None, **params):
+        for records in stream(query, last_rid, batch_size, fetch_size, end_rid):
+            # Второй диапазон обрывается: первый уже завершен в манифесте
+            if last_rid > 50:
+                raise KeyboardInterrupt
+            yield records
+
+    monkeypatch.setattr(export, "stream_batches", failing)
+    with pytest.raises(KeyboardInterrupt):
+        nodes.main(workers=1, ranges=2, batch_size=2, out_dir=nodes.test_out_dir)
+    assert not nodes.NODE_INDEX_PATH.exists()
+
+    monkeypatch.setattr(export, "stream_batches", stream)
+    manifest = nodes.main(workers=1, ranges=2, batch_size=2, out_dir=nodes.test_out_dir)
+    assert manifest.resumed and manifest.state["total_rows"] == len(graph.nodes)
+    np.testing.assert_array_equal(np.load(nodes.NODE_INDEX_PATH), sorted(graph.nodes))
+
+
+def test_node_index_records_the_edge_snapshot(nodes, export, graph, tmp_path, monkeypatch):
+    nodes.main(workers=1, ranges=1, batch_size=4, out_dir=nodes.test_out_dir)
+    meta_path = nodes.NODE_INDEX_PATH.with_suffix(".json")
+    assert json.loads(meta_path.read_text()) == {"edges": None}
+
+    # Полная выгрузка связей в родительском каталоге выгрузки узлов
+    monkeypatch.setattr(export, "stream_batches", graph.stream_batches)
+    manifest = export.main(workers=1, ranges=1, batch_size=4, fmt="csv", out_dir=tmp_path)
+    monkeypatch.setattr(export, "stream_batches", graph.stream_nodes)
+    nodes.main(workers=1, ranges=1, batch_size=4, out_dir=nodes.test_out_dir)
+    assert json.loads(meta_path.read_text()) == {"edges": {"export_id": manifest.state["export_id"], "runs": 1}}
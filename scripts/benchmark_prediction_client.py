@@ -0,0 +1,165 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from scripts.mock_prediction_server import PROFILES, LatencyModel, MockPredictionServer
+from scripts.prediction_client import PredictionBatch, PredictionClient, encode_pairs
+
+
+REPORT_DIR = "results/prediction_benchmark"
+BATCH_SIZES = [100, 250, 500, 1000, 2000]
+CONCURRENCY = [1, 2, 4, 8, 16]
+TOTAL_PAIRS = 20_000
+SEQUENCE_LENGTH = 40
+# Рекомендация - максимум пропускной способности при p99 пачки не выше бюджета (с, в масштабе сервиса)
+P99_BUDGET = 30.0
+# Задержки mock-сервера сжимаются, чтобы сетка прогонялась за минуты;
+# при слишком малом масштабе в замер заметно входят накладные расходы клиента и HTTP
+TIME_SCALE = 0.05
+
+
+class TimedClient(PredictionClient):
+    """PredictionClient, который запоминает задержку каждой пачки с учетом повторов."""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.latencies: list[float] = []
+
+    async def _post(self, client, payload: str) -> list:
+        start = time.perf_counter()
+        try:
+            return await super()._post(client, payload)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+class CountingSink:
+    """Sink для PredictionClient.run без записи на диск."""
+    def __init__(self) -> None:
+        self.pairs = 0
+
+    def append(self, batch: PredictionBatch, results: list) -> None:
+        self.pairs += len(results)
+
+
+def synthetic_batches(total_pairs: int, batch_size: int, length: int = SEQUENCE_LENGTH, seed: int = 0) -> list[PredictionBatch]:
+    """
+    Пачки случайных пар строк фиксированной длины, как у реальных payload.
+    Собираются заранее, чтобы их подготовка не попадала в замер.
+    """
+    rng = random.Random(seed)
+    sequences = ["".join(rng.choices("ACGU", k=length)) for _ in range(1_000)]
+    batches = []
+    for index, start in enumerate(range(0, total_pairs, batch_size)):
+        n = min(batch_size, total_pairs - start)
+        ids = np.arange(start, start + n, dtype=np.int64)
+        payload = encode_pairs(rng.choices(sequences, k=n), rng.choices(sequences, k=n))
+        batches.append(PredictionBatch(index, ids, ids, payload))
+    return batches
+
+
+def run_cell(
+    model: LatencyModel,
+    batch_size: int,
+    concurrency: int,
+    total_pairs: int,
+    time_scale: float,
+) -> dict:
+    """Один прогон клиента против свежего mock-сервера."""
+    batches = synthetic_batches(total_pairs, batch_size)
+    with MockPredictionServer(model, time_scale=time_scale, seed=0) as server:
+        client = TimedClient(server.url, "pairs", concurrency=concurrency, max_retries=3, backoff=0.05 * time_scale)
+        sink = CountingSink()
+        start = time.perf_counter()
+        stats = asyncio.run(client.run(batches, sink))
+        elapsed = time.perf_counter() - start
+        server_stats = dict(server.stats)
+
+    # Задержки переводятся обратно в масштаб реального сервиса
+    latencies = np.array(client.latencies) / time_scale
+    elapsed /= time_scale
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "pairs": sink.pairs,
+        "failed_batches": stats["failed"],
+        "rejected": server_stats["rejected"],
+        "too_large": server_stats["too_large"],
+        "elapsed_s": round(elapsed, 3),
+        "pairs_per_s": round(sink.pairs / elapsed, 2) if elapsed > 0 else None,
+        "latency_p50_s": round(float(np.percentile(latencies, 50)), 4) if latencies.size else None,
+        "latency_p95_s": round(float(np.percentile(latencies, 95)), 4) if latencies.size else None,
+        "latency_p99_s": round(float(np.percentile(latencies, 99)), 4) if latencies.size else None,
+    }
+
+
+def recommend(results_df: pd.DataFrame, total_pairs: int, p99_budget: float = P99_BUDGET) -> Optional[dict]:
+    """
+    Настройка с максимальной пропускной способностью среди прогонов без потерь
+    и с p99 в пределах бюджета; из почти равных (5%) берется меньшее число
+    одновременных запросов, затем меньшая пачка.
+    """
+    ok = results_df[(results_df["pairs"] == total_pairs) & (results_df["latency_p99_s"] <= p99_budget)]
+    if ok.empty:
+        return None
+    best = ok["pairs_per_s"].max()
+    near = ok[ok["pairs_per_s"] >= 0.95 * best].sort_values(["concurrency", "batch_size"])
+    row = near.iloc[0]
+    return {
+        "batch_size": int(row["batch_size"]),
+        "concurrency": int(row["concurrency"]),
+        "pairs_per_s": float(row["pairs_per_s"]),
+        "latency_p99_s": float(row["latency_p99_s"]),
+    }
+
+
+def benchmark(
+    profiles: dict[str, LatencyModel],
+    batch_sizes: list[int] = BATCH_SIZES,
+    concurrency: list[int] = CONCURRENCY,
+    total_pairs: int = TOTAL_PAIRS,
+    time_scale: float = TIME_SCALE,
+    p99_budget: float = P99_BUDGET,
+    report_dir: str = REPORT_DIR,
+) -> dict:
+    """
+    Перебирает размер пачки x число одновременных запросов для каждого
+    профиля эндпоинта, пишет таблицу прогонов в `<report_dir>/<profile>.csv`
+    и рекомендации в `<report_dir>/recommended.json`.
+    """
+    Path(report_dir).mkdir(parents=True, exist_ok=True)
+    recommended = {}
+    for name, model in profiles.items():
+        rows = []
+        for batch_size in batch_sizes:
+            for in_flight in concurrency:
+                row = run_cell(model, batch_size, in_flight, total_pairs, time_scale)
+                rows.append(row)
+                print(f"{name}: {json.dumps(row)}")
+        results_df = pd.DataFrame(rows)
+        results_df.to_csv(Path(report_dir) / f"{name}.csv", index=False)
+        recommended[name] = recommend(results_df, total_pairs, p99_budget)
+        print(f"{name}: recommended {recommended[name]}")
+
+    with open(Path(report_dir) / "recommended.json", "w", encoding="utf-8") as f:
+        json.dump({"profiles": {name: model._asdict() for name, model in profiles.items()}, "recommended": recommended}, f, indent=4)
+    return recommended
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch size x concurrency sweep of the prediction client against mock endpoints")
+    parser.add_argument("profiles", nargs="*", default=list(PROFILES))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY)
+    parser.add_argument("--pairs", type=int, default=TOTAL_PAIRS)
+    parser.add_argument("--time-scale", type=float, default=TIME_SCALE, help="mock latencies are multiplied by this factor")
+    parser.add_argument("--p99-budget", type=float, default=P99_BUDGET)
+    args = parser.parse_args()
+
+    benchmark({name: PROFILES[name] for name in args.profiles}, args.batch_sizes, args.concurrency, args.pairs, args.time_scale, args.p99_budget)
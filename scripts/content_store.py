@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+class ContentStore:
+    """
+    content сущностей со словарным кодированием: nodeid -> плотный индекс
+    (searchsorted по отсортированным nodeid) -> код уникального content ->
+    смещение в общем байтовом буфере. Память O(узлов + суммарной длины
+    уникальных content), строки собираются только для запрошенных nodeid.
+    Узлы без content (NaN/None) в хранилище не попадают.
+    """
+    def __init__(self, nodeids: np.ndarray, contents: pd.Series) -> None:
+        contents = pd.Series(contents).reset_index(drop=True)
+        present = contents.notna().to_numpy()
+        nodeids = np.asarray(nodeids, dtype=np.int64)[present]
+        nodeids, first = np.unique(nodeids, return_index=True)
+        codes, uniques = pd.factorize(contents[present].astype(str).to_numpy()[first])
+        encoded = [value.encode("utf-8") for value in uniques]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+
+        self.nodeids = nodeids
+        self.codes = codes.astype(np.int32 if len(encoded) < 1 << 31 else np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.buffer = b"".join(encoded)
+        # Хеши как в prediction_cache: от строки content, поэтому ключи кеша не меняются
+        self.content_hashes = pd.util.hash_pandas_object(pd.Series(uniques, dtype=object), index=False).to_numpy()
+
+    @classmethod
+    def from_series(cls, contents: pd.Series) -> "ContentStore":
+        """Из Series content, индексированного nodeid (повторы nodeid - первый)."""
+        return cls(contents.index.to_numpy(), contents.reset_index(drop=True))
+
+    def __len__(self) -> int:
+        return self.nodeids.shape[0]
+
+    def _positions(self, nodeids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        positions = np.minimum(np.searchsorted(self.nodeids, nodeids), max(self.nodeids.shape[0] - 1, 0))
+        missing = self.nodeids[positions] != nodeids if self.nodeids.size else np.ones(np.shape(nodeids), dtype=bool)
+        return positions, missing
+
+    def contains(self, nodeids: np.ndarray) -> np.ndarray:
+        """Признак наличия content для каждого nodeid."""
+        return ~self._positions(nodeids)[1]
+
+    def index(self, nodeids: np.ndarray) -> np.ndarray:
+        """Плотные индексы nodeid; KeyError, если каких-то nodeid нет."""
+        positions, missing = self._positions(nodeids)
+        if missing.any():
+            raise KeyError(f"{int(missing.sum())} nodeids are not in the content store, e.g. {np.asarray(nodeids)[missing][:5].tolist()}")
+        return positions
+
+    def hashes(self, nodeids: np.ndarray) -> np.ndarray:
+        """64-битный хеш content для каждого nodeid."""
+        return np.take(self.content_hashes, np.take(self.codes, self.index(nodeids)))
+
+    def take(self, nodeids: np.ndarray) -> list[str]:
+        """Строки content для nodeid в том же порядке."""
+        codes = np.take(self.codes, self.index(nodeids))
+        starts, ends = np.take(self.offsets, codes), np.take(self.offsets, codes + 1)
+        buffer = self.buffer
+        return [buffer[s:e].decode("utf-8") for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+__all__ = ["ContentStore"]
@@ -0,0 +1,235 @@
+import os
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+
+
+LAKE_PATH = "data/lake"
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 3
+ROW_GROUP_SIZE = 256 * 1024
+CSV_BLOCK_SIZE = 64 << 20
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# Типы колонок промежуточных файлов. Колонки с небольшим числом значений
+# хранятся как dictionary уже в Arrow, длинные строки (content) кодируются
+# словарем на уровне страниц Parquet, поэтому повторы последовательностей
+# в таблицах пар не раздувают файл.
+SCHEMAS = {
+    "entities": {
+        "nodeid": pa.int64(),
+        "id": pa.int64(),
+        "name": pa.string(),
+        "content": pa.string(),
+        "source": CATEGORY,
+        "alias": pa.string(),
+    },
+    "similarity": {
+        "name_1": pa.string(),
+        "content_1": pa.string(),
+        "name_2": pa.string(),
+        "content_2": pa.string(),
+        "nodeid_1": pa.int64(),
+        "nodeid_2": pa.int64(),
+        "score": pa.float64(),
+        "identity": pa.float64(),
+    },
+    "biomarkers": {
+        "nodeid": pa.int64(),
+        "name": pa.string(),
+        "content": pa.string(),
+        "conditions": CATEGORY,
+        "indication_types": CATEGORY,
+        "sex": CATEGORY,
+        "biofluid": CATEGORY,
+        "uniprot_id": pa.string(),
+        "hmdb_id": pa.string(),
+        "class": CATEGORY,
+    },
+    "links": {
+        "nodeid_rna": pa.int64(),
+        "nodeid_sm": pa.int64(),
+        "nodeid_protein_1": pa.int64(),
+        "nodeid_protein_2": pa.int64(),
+    },
+    "interactions": {
+        "name": pa.string(),
+        "content": pa.string(),
+        "apt_name": pa.string(),
+        "apt_seq": pa.string(),
+        "target_name": pa.string(),
+        "target_seq": pa.string(),
+        "antibody_name": pa.string(),
+        "antibody_sequence": pa.string(),
+        "RNA_name": pa.string(),
+        "rna_content": pa.string(),
+        "small_molecule_name": pa.string(),
+        "small_molecule_content": pa.string(),
+        "type": CATEGORY,
+        "source": CATEGORY,
+    },
+}
+
+# Соответствие путей CSV и схем. Колонки, которых нет в схеме, выводятся pyarrow.
+DATASETS = [
+    ("data/entities/*.csv", "entities"),
+    ("data/link_prediction/entities/*.csv", "entities"),
+    ("data/*_ids.csv", "entities"),
+    ("data/*_nodeids.csv", "entities"),
+    ("data/db_similarity/*.csv", "similarity"),
+    ("data/db_similarity/*/*.csv", "similarity"),
+    ("data/aligned_pairs.csv", "similarity"),
+    ("data/aligned_pairs_nodeids.csv", "similarity"),
+    ("data/biomarkers/*.csv", "biomarkers"),
+    ("data/link_prediction/existing_links/*.csv", "links"),
+    ("data/reparsing/**/*.csv", "interactions"),
+]
+
+
+def schema_for(csv_path: str) -> dict[str, pa.DataType]:
+    path = Path(csv_path).as_posix()
+    for pattern, name in DATASETS:
+        if fnmatch(path, pattern):
+            return SCHEMAS[name]
+    return {}
+
+
+def lake_path(csv_path: str, lake: str = LAKE_PATH) -> Path:
+    """data/entities/db_rna.csv -> data/lake/entities/db_rna"""
+    relative = Path(csv_path).with_suffix("")
+    if relative.parts and relative.parts[0] == "data":
+        relative = Path(*relative.parts[1:])
+    return Path(lake) / relative
+
+
+def _is_index_column(name: str) -> bool:
+    return name == "" or name.startswith("Unnamed:")
+
+
+def convert_csv(
+    csv_path: str,
+    partition_cols: Optional[list[str]] = None,
+    lake: str = LAKE_PATH,
+) -> Path:
+    """
+    Потоково переводит CSV в Parquet-датасет (zstd, словарное кодирование,
+    группы строк по ROW_GROUP_SIZE). Индексная колонка pandas отбрасывается.
+    """
+    start = time.perf_counter()
+
+    schema = schema_for(csv_path)
+    reader = pv.open_csv(
+        csv_path,
+        read_options=pv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=pv.ConvertOptions(
+            column_types={name: pa.string() if isinstance(t, pa.DictionaryType) else t for name, t in schema.items()},
+            strings_can_be_null=True,
+        ),
+    )
+    columns = [f for f in reader.schema if not _is_index_column(f.name)]
+    target_schema = pa.schema([
+        pa.field(f.name, schema.get(f.name, f.type)) for f in columns
+    ])
+
+    def batches():
+        for batch in reader:
+            batch = batch.select([f.name for f in columns])
+            yield pa.RecordBatch.from_arrays(
+                [batch.column(i).cast(target_schema.field(i).type) for i in range(batch.num_columns)],
+                schema=target_schema,
+            )
+
+    output_path = lake_path(csv_path, lake)
+    ds.write_dataset(
+        batches(),
+        output_path,
+        schema=target_schema,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive" if partition_cols else None,
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression=COMPRESSION,
+            compression_level=COMPRESSION_LEVEL,
+            use_dictionary=True,
+        ),
+        max_rows_per_group=ROW_GROUP_SIZE,
+        min_rows_per_group=min(ROW_GROUP_SIZE, 64 * 1024),
+        existing_data_behavior="delete_matching",
+    )
+
+    end = time.perf_counter()
+    print(f"Converted {csv_path} -> {output_path}: {end - start:.3f} s.")
+    return output_path
+
+
+def is_fresh(csv_path: str, lake: str = LAKE_PATH) -> bool:
+    output_path = lake_path(csv_path, lake)
+    if not output_path.exists():
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return output_path.stat().st_mtime >= os.path.getmtime(csv_path)
+
+
+def dataset(csv_path: str, lake: str = LAKE_PATH) -> ds.Dataset:
+    """Parquet-датасет для CSV; конвертирует CSV при первом обращении или если он новее."""
+    if not is_fresh(csv_path, lake):
+        convert_csv(csv_path, lake=lake)
+    return ds.dataset(lake_path(csv_path, lake), format="parquet", partitioning="hive")
+
+
+def read_table(
+    csv_path: str,
+    columns: Optional[list[str]] = None,
+    filter: Optional[ds.Expression] = None,
+    lake: str = LAKE_PATH,
+) -> pa.Table:
+    """
+    Читает только нужные колонки (`columns`) и группы строк, прошедшие
+    предикат `filter` (например `pc.field("score") >= 0.8`), в несколько потоков.
+    """
+    return dataset(csv_path, lake).to_table(columns=columns, filter=filter, use_threads=True)
+
+
+def read_df(
+    csv_path: str,
+    columns: Optional[list[str]] = None,
+    filter: Optional[ds.Expression] = None,
+    lake: str = LAKE_PATH,
+) -> pd.DataFrame:
+    start = time.perf_counter()
+
+    df = read_table(csv_path, columns, filter, lake).to_pandas()
+
+    end = time.perf_counter()
+    print(f"Reading {csv_path} from lake: {df.shape[0]} rows, time: {end - start:.3f} s.")
+    return df
+
+
+def convert_all(max_workers: Optional[int] = None) -> list[Path]:
+    """Конвертирует все CSV из DATASETS, которые еще не в lake или изменились."""
+    paths = sorted({
+        path
+        for pattern, _ in DATASETS
+        for path in glob.glob(pattern, recursive=True)
+        if path.endswith(".csv") and not is_fresh(path)
+    })
+    # pyarrow отпускает GIL при разборе CSV и записи Parquet
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(convert_csv, paths))
+
+
+__all__ = ["SCHEMAS", "DATASETS", "convert_csv", "dataset", "read_table", "read_df", "convert_all"]
+
+
+if __name__ == "__main__":
+    convert_all()
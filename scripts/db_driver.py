@@ -1,8 +1,12 @@
 import sys
+import time
 import logging
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
 
 import pandas as pd
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+from scripts.telemetry import IngestionTelemetry
 
 
 logger = logging.getLogger(__name__)
@@ -12,13 +16,58 @@ logging.basicConfig(
     stream=sys.stdout
 )
 
+DEFAULT_POOL_SIZE = 100
+DEFAULT_FETCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 10_000
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def _batches(rows: Iterable[dict], batch_size: int) -> Iterator[list[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _records_to_chunk(keys: list[str], records: list, as_arrow: bool):
+    columns = {key: [record[key] for record in records] for key in keys}
+    if as_arrow:
+        import pyarrow as pa
+        return pa.RecordBatch.from_pydict(columns)
+    return pd.DataFrame(columns, columns=keys)
+
 
 class DBDriver:
-    def __init__(self, url, user, password) -> None:
+    """
+    Пул соединений с neo4j.
+
+    `fetch_size` задает количество записей, которые сервер отдает за один
+    запрос PULL, `max_connection_pool_size` - размер пула соединений,
+    разделяемого всеми сессиями драйвера.
+    Запросы `execute_many` должны разворачивать параметр `$rows`,
+    например `UNWIND $rows AS row MERGE (n:rna {name: row.name})`.
+    """
+    def __init__(
+        self,
+        url,
+        user,
+        password,
+        max_connection_pool_size: int = DEFAULT_POOL_SIZE,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        database: Optional[str] = None,
+    ) -> None:
         self.__driver = GraphDatabase.driver(
             url,
-            auth=(user, password)
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            fetch_size=fetch_size,
         )
+        self.__fetch_size = fetch_size
+        self.__database = database
         try:
             self.__driver.verify_connectivity()
             logger.info('connected to neoj4 instance')
@@ -26,28 +75,245 @@ class DBDriver:
             logger.error("cannot connect to neo4j instance")
             logger.error(e)
 
-    def select_as_df(self, query: str) -> pd.DataFrame:
-        res = pd.DataFrame()
+    def __enter__(self) -> "DBDriver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.__driver.close()
+
+    def session(self, **config):
+        config.setdefault("database", self.__database)
+        return self.__driver.session(**config)
+
+    def select_as_df(self, query: str, params: Optional[dict[str, Any]] = None) -> pd.DataFrame:
         try:
-            with self.__driver.session() as session:
-                res = session.run(query).to_df()
+            with self.session() as session:
+                res = session.run(query, params).to_df()
                 logger.info("query executed successfully")
                 logger.info(f"got {res.shape[0]} items")
+                return res
         except Exception as e:
             logger.error("Error executing the query")
             logger.error(e)
-        finally:
-            return res
+            raise
 
-    def execute(self, query: str) -> None:
+    def select_iter(
+        self,
+        query: str,
+        params: Optional[dict[str, Any]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        as_arrow: bool = False,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Потоково читает результат запроса кусками по `chunk_size` строк.
+        В памяти держится не больше одного куска, сервер отдает записи
+        порциями по `fetch_size`. При `as_arrow=True` куски отдаются как
+        `pyarrow.RecordBatch`.
+        """
+        total = 0
         try:
-            with self.__driver.session() as session:
-                res = session.run(query).to_df()
+            with self.session(fetch_size=min(chunk_size, self.__fetch_size)) as session:
+                result = session.run(query, params)
+                keys = list(result.keys())
+                while True:
+                    records = result.fetch(chunk_size)
+                    if not records:
+                        break
+                    total += len(records)
+                    yield _records_to_chunk(keys, records, as_arrow)
+        except Exception as e:
+            logger.error("Error executing the query")
+            logger.error(e)
+            raise
+        logger.info(f"streamed {total} items")
+
+    def execute(
+        self,
+        query: str,
+        params: Optional[dict[str, Any]] = None,
+        telemetry: Optional[IngestionTelemetry] = None,
+        phase: str = "execute",
+    ):
+        try:
+            with self.session() as session:
+                if telemetry is not None:
+                    summary = telemetry.run(session, query, phase, params)
+                else:
+                    summary = session.run(query, params).consume()
+                logger.info("query executed successfully")
+                return summary
+        except Exception as e:
+            logger.error("Error executing the query")
+            logger.error(e)
+            raise
+
+    def execute_many(
+        self,
+        query: str,
+        rows: Iterable[dict],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        params: Optional[dict[str, Any]] = None,
+        telemetry: Optional[IngestionTelemetry] = None,
+        phase: str = "execute_many",
+    ) -> int:
+        """
+        Отправляет строки пачками по `batch_size` в параметре `$rows`,
+        каждая пачка - отдельная управляемая транзакция с повтором
+        при временных ошибках. Возвращает количество отправленных строк.
+        Если передан `telemetry`, для каждой пачки записывается задержка
+        и счетчики из `ResultSummary`.
+        """
+        def work(tx, batch):
+            return tx.run(query, {**(params or {}), "rows": batch}).consume()
+
+        total = 0
+        try:
+            with self.session() as session:
+                for i, batch in enumerate(_batches(rows, batch_size)):
+                    start = time.perf_counter()
+                    summary = session.execute_write(work, batch)
+                    if telemetry is not None:
+                        telemetry.record(phase, summary, time.perf_counter() - start, rows=len(batch), batch=i)
+                    total += len(batch)
+        except Exception as e:
+            logger.error(f"Error executing the query after {total} rows")
+            logger.error(e)
+            raise
+        logger.info(f"written {total} rows")
+        return total
+
+
+class AsyncDBDriver:
+    """Асинхронный вариант `DBDriver` с тем же набором методов."""
+    def __init__(
+        self,
+        url,
+        user,
+        password,
+        max_connection_pool_size: int = DEFAULT_POOL_SIZE,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+        database: Optional[str] = None,
+    ) -> None:
+        self.__driver = AsyncGraphDatabase.driver(
+            url,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            fetch_size=fetch_size,
+        )
+        self.__fetch_size = fetch_size
+        self.__database = database
+
+    async def __aenter__(self) -> "AsyncDBDriver":
+        await self.verify_connectivity()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def verify_connectivity(self) -> None:
+        try:
+            await self.__driver.verify_connectivity()
+            logger.info('connected to neoj4 instance')
+        except Exception as e:
+            logger.error("cannot connect to neo4j instance")
+            logger.error(e)
+
+    async def close(self) -> None:
+        await self.__driver.close()
+
+    def session(self, **config):
+        config.setdefault("database", self.__database)
+        return self.__driver.session(**config)
+
+    async def select_as_df(self, query: str, params: Optional[dict[str, Any]] = None) -> pd.DataFrame:
+        try:
+            async with self.session() as session:
+                result = await session.run(query, params)
+                res = await result.to_df()
                 logger.info("query executed successfully")
                 logger.info(f"got {res.shape[0]} items")
+                return res
+        except Exception as e:
+            logger.error("Error executing the query")
+            logger.error(e)
+            raise
+
+    async def select_iter(
+        self,
+        query: str,
+        params: Optional[dict[str, Any]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        as_arrow: bool = False,
+    ) -> AsyncIterator[pd.DataFrame]:
+        total = 0
+        try:
+            async with self.session(fetch_size=min(chunk_size, self.__fetch_size)) as session:
+                result = await session.run(query, params)
+                keys = list(await result.keys())
+                while True:
+                    records = await result.fetch(chunk_size)
+                    if not records:
+                        break
+                    total += len(records)
+                    yield _records_to_chunk(keys, records, as_arrow)
+        except Exception as e:
+            logger.error("Error executing the query")
+            logger.error(e)
+            raise
+        logger.info(f"streamed {total} items")
+
+    async def execute(
+        self,
+        query: str,
+        params: Optional[dict[str, Any]] = None,
+        telemetry: Optional[IngestionTelemetry] = None,
+        phase: str = "execute",
+    ):
+        try:
+            async with self.session() as session:
+                start = time.perf_counter()
+                result = await session.run(query, params)
+                summary = await result.consume()
+                if telemetry is not None:
+                    telemetry.record(phase, summary, time.perf_counter() - start)
+                logger.info("query executed successfully")
+                return summary
         except Exception as e:
             logger.error("Error executing the query")
             logger.error(e)
+            raise
+
+    async def execute_many(
+        self,
+        query: str,
+        rows: Iterable[dict],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        params: Optional[dict[str, Any]] = None,
+        telemetry: Optional[IngestionTelemetry] = None,
+        phase: str = "execute_many",
+    ) -> int:
+        async def work(tx, batch):
+            result = await tx.run(query, {**(params or {}), "rows": batch})
+            return await result.consume()
+
+        total = 0
+        try:
+            async with self.session() as session:
+                for i, batch in enumerate(_batches(rows, batch_size)):
+                    start = time.perf_counter()
+                    summary = await session.execute_write(work, batch)
+                    if telemetry is not None:
+                        telemetry.record(phase, summary, time.perf_counter() - start, rows=len(batch), batch=i)
+                    total += len(batch)
+        except Exception as e:
+            logger.error(f"Error executing the query after {total} rows")
+            logger.error(e)
+            raise
+        logger.info(f"written {total} rows")
+        return total
 
 
-__all__ = ["DBDriver"]
+__all__ = ["DBDriver", "AsyncDBDriver"]
@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Iterator, Optional
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from scripts import data_lake
+from scripts.get_predicted_links import (
+    DATA_PATH,
+    PRUNED_PATH,
+    entity_ids,
+    existing_pair_keys,
+    pair_keys,
+    write_pairs,
+)
+
+dotenv.load_dotenv()
+
+
+# Чекпоинт PBG (graph_link_prediction_pbg): эмбеддинги, имена сущностей и модель с оператором
+EMBEDDINGS_PATH = DATA_PATH + "embeddings/"
+EMB_H5 = EMBEDDINGS_PATH + "embeddings_molecules_0.v240.h5"
+ENTITY_JSON = EMBEDDINGS_PATH + "entity_names_molecules_0.json"
+MODEL_H5 = EMBEDDINGS_PATH + "model.v240.h5"
+# Необязательное сопоставление имен сущностей PBG с nodeid (колонки name, nodeid);
+# без него имена считаются nodeid
+ID_MAP_PATH = EMBEDDINGS_PATH + "entity_ids.csv"
+# Отложенные связи (source, relation, target) для оценки полноты
+TEST_TSV = EMBEDDINGS_PATH + "test.tsv"
+REPORT_PATH = DATA_PATH + "pruning_report/"
+
+RELATION = "interacts_with"
+RELATION_IDX = 0
+TOP_K = 100
+K_VALUES = [1, 5, 10, 50, 100, 500, 1000, 5000]
+# Размер блока матрицы скоров (float32), ~64 МБ
+BLOCK_SCORES = 1 << 24
+
+# Связи как в get_predicted_links: (сущности слева, справа, колонки пар, существующие связи, симметричность)
+RELATIONS = {
+    "rna_sm": ("rna", "small_molecule", ['nodeid_rna', 'nodeid_sm'],
+               ("existing_links/rna_sm.csv", ['nodeid_rna', 'nodeid_sm']), False),
+    "rna_rna": ("rna", "rna", ['nodeid_1', 'nodeid_2'], None, True),
+    "prot_prot": ("protein", "protein", ['nodeid_1', 'nodeid_2'],
+                  ("existing_links/prot_prot.csv", ['nodeid_protein_1', 'nodeid_protein_2']), True),
+    "prot_dna": ("protein", "dna", ['nodeid_protein', 'nodeid_dna'], None, False),
+}
+
+
+def _name_ids(names: pd.Series, id_map_path: Optional[str]) -> np.ndarray:
+    """nodeid для имен сущностей PBG; -1, если сопоставления нет."""
+    names = names.astype(str)
+    if id_map_path and os.path.exists(id_map_path):
+        id_map = data_lake.read_df(id_map_path, ['name', 'nodeid'])
+        id_map = id_map.assign(name=id_map['name'].astype(str)).drop_duplicates('name').set_index('name')['nodeid']
+        return names.map(id_map).fillna(-1).to_numpy(dtype=np.int64)
+    return pd.to_numeric(names, errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+
+
+def load_embeddings(
+    h5_path: str = EMB_H5,
+    names_path: str = ENTITY_JSON,
+    id_map_path: Optional[str] = ID_MAP_PATH,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Эмбеддинги PBG как (отсортированные nodeid, матрица float32 в том же порядке)."""
+    import h5py
+
+    with open(names_path, "rt") as f:
+        names = pd.Series(json.load(f))
+    with h5py.File(h5_path, "r") as hf:
+        embeddings = hf["embeddings"][...].astype(np.float32, copy=False)
+    if embeddings.shape[0] != names.shape[0]:
+        raise ValueError(f"{h5_path}: {embeddings.shape[0]} rows, {names_path}: {names.shape[0]} names")
+
+    ids = _name_ids(names, id_map_path)
+    ids, rows = np.unique(ids, return_index=True)
+    known = ids >= 0
+    print(f"Embeddings: {embeddings.shape[0]} entities, {int(known.sum())} mapped to nodeid")
+    return ids[known], embeddings[rows[known]]
+
+
+def load_operator(model_path: str = MODEL_H5, relation_idx: int = RELATION_IDX) -> Optional[np.ndarray]:
+    """
+    Оператор правой части связи из модели PBG: вектор для diagonal,
+    матрица для linear; None, если у связи нет оператора.
+    """
+    import h5py
+
+    with h5py.File(model_path, "r") as hf:
+        for key in ("diagonal", "linear_transformation"):
+            path = f"model/relations/{relation_idx}/operator/rhs/{key}"
+            if path in hf:
+                return hf[path][...].astype(np.float32, copy=False)
+    return None
+
+
+def side_vectors(
+    ids: np.ndarray,
+    embeddings: np.ndarray,
+    nodeids: np.ndarray,
+    operator: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Векторы сущностей одной стороны связи для косинусного скора: к правой
+    стороне применяется оператор, строки нормируются, поэтому скор
+    блока - обычное произведение матриц. Возвращает nodeid, для которых
+    есть эмбеддинги, и их векторы.
+    """
+    positions = np.minimum(np.searchsorted(ids, nodeids), max(ids.shape[0] - 1, 0))
+    found = ids[positions] == nodeids if ids.size else np.zeros(nodeids.shape[0], dtype=bool)
+    vectors = embeddings[positions[found]]
+    if operator is not None:
+        vectors = vectors * operator if operator.ndim == 1 else vectors @ operator.T
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return nodeids[found], (vectors / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+
+def _mask_keys(existing: Optional[np.ndarray], symmetric: bool) -> Optional[np.ndarray]:
+    """Ключи связей для маскирования; у симметричных связей - в обеих ориентациях."""
+    if existing is None or not existing.size or not symmetric:
+        return existing
+    swapped = pair_keys(existing & 0xFFFFFFFF, existing >> 32)
+    return np.unique(np.concatenate([existing, swapped]))
+
+
+def score_blocks(
+    left_ids: np.ndarray,
+    left: np.ndarray,
+    right_ids: np.ndarray,
+    right: np.ndarray,
+    existing: Optional[np.ndarray] = None,
+    symmetric: bool = False,
+    block_scores: int = BLOCK_SCORES,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Скоры left x right блоками строк (не больше `block_scores` значений
+    в блоке). Петли и существующие связи (отсортированные ключи pair_keys,
+    для симметричной связи - в обеих ориентациях) получают -inf.
+    Выдает номер первой строки блока и матрицу скоров.
+    """
+    row_block = max(1, block_scores // max(right.shape[0], 1))
+    for row_start in range(0, left.shape[0], row_block):
+        rows = left_ids[row_start:row_start + row_block]
+        scores = left[row_start:row_start + row_block] @ right.T
+        if symmetric:
+            positions = np.minimum(np.searchsorted(right_ids, rows), right_ids.shape[0] - 1)
+            self_rows = np.flatnonzero(right_ids[positions] == rows)
+            scores[self_rows, positions[self_rows]] = -np.inf
+        if existing is not None and existing.size:
+            begin = np.searchsorted(existing, int(rows[0]) << 32)
+            end = np.searchsorted(existing, (int(rows[-1]) + 1) << 32)
+            block_keys = existing[begin:end]
+            first, second = block_keys >> 32, block_keys & 0xFFFFFFFF
+            row_pos = np.searchsorted(rows, first)
+            col_pos = np.minimum(np.searchsorted(right_ids, second), right_ids.shape[0] - 1)
+            hit = (rows[np.minimum(row_pos, rows.shape[0] - 1)] == first) & (right_ids[col_pos] == second)
+            scores[row_pos[hit], col_pos[hit]] = -np.inf
+        yield row_start, scores
+
+
+def top_k_pairs(
+    left_ids: np.ndarray,
+    left: np.ndarray,
+    right_ids: np.ndarray,
+    right: np.ndarray,
+    k: int,
+    existing: Optional[np.ndarray] = None,
+    symmetric: bool = False,
+    block_scores: int = BLOCK_SCORES,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Для каждого источника слева - `k` лучших по скору кандидатов справа
+    (argpartition по строкам блока). Для симметричной связи пары
+    упорядочиваются (меньший id, больший id) и выдаются без повторов одним блоком.
+    """
+    k = min(k, right.shape[0])
+    if k <= 0 or not left.shape[0]:
+        return
+    mask = _mask_keys(existing, symmetric)
+    symmetric_keys = []
+    for row_start, scores in score_blocks(left_ids, left, right_ids, right, mask, symmetric, block_scores):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        finite = np.isfinite(np.take_along_axis(scores, top, axis=1))
+        first = np.repeat(left_ids[row_start:row_start + scores.shape[0]], k)[finite.ravel()]
+        second = right_ids[top[finite]]
+        if symmetric:
+            symmetric_keys.append(pair_keys(np.minimum(first, second), np.maximum(first, second)))
+        elif first.size:
+            yield first, second
+    if symmetric_keys:
+        keys = np.unique(np.concatenate(symmetric_keys))
+        yield keys >> 32, keys & 0xFFFFFFFF
+
+
+def held_out_pairs(
+    test_path: str,
+    left_ids: np.ndarray,
+    right_ids: np.ndarray,
+    symmetric: bool = False,
+    relation: str = RELATION,
+    id_map_path: Optional[str] = ID_MAP_PATH,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Отложенные связи `relation` между сущностями двух сторон, ориентированные
+    (левая, правая). В PBG связи ненаправленные по смыслу, поэтому пара
+    принимается в любой ориентации.
+    """
+    test_df = pd.read_csv(test_path, sep="\t", header=None, names=["source", "relation", "target"], dtype=str)
+    test_df = test_df[test_df["relation"] == relation]
+    source, target = _name_ids(test_df["source"], id_map_path), _name_ids(test_df["target"], id_map_path)
+
+    def member(ids, values):
+        positions = np.minimum(np.searchsorted(ids, values), max(ids.shape[0] - 1, 0))
+        return ids[positions] == values if ids.size else np.zeros(values.shape[0], dtype=bool)
+
+    direct = member(left_ids, source) & member(right_ids, target)
+    reverse = ~direct & member(left_ids, target) & member(right_ids, source)
+    first = np.concatenate([source[direct], target[reverse]])
+    second = np.concatenate([target[direct], source[reverse]])
+    if symmetric:
+        first, second = np.minimum(first, second), np.maximum(first, second)
+    keys = np.unique(pair_keys(first, second))
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+def held_out_ranks(
+    first: np.ndarray,
+    second: np.ndarray,
+    left_ids: np.ndarray,
+    left: np.ndarray,
+    right_ids: np.ndarray,
+    right: np.ndarray,
+    existing: Optional[np.ndarray] = None,
+    symmetric: bool = False,
+    block_scores: int = BLOCK_SCORES,
+) -> np.ndarray:
+    """
+    Ранг каждой отложенной связи среди кандидатов своего источника (0 - лучший)
+    при тех же масках, что и в top_k_pairs: связь проходит отбор top-K, если
+    ранг меньше K. Для симметричной связи берется лучший ранг из двух ориентаций.
+    Связи без эмбеддингов у одной из сторон получают ранг int64 max.
+    """
+    if symmetric:
+        first, second = np.concatenate([first, second]), np.concatenate([second, first])
+    pair_count = first.shape[0] // 2 if symmetric else first.shape[0]
+    ranks = np.full(first.shape[0], np.iinfo(np.int64).max, dtype=np.int64)
+
+    source_pos = np.minimum(np.searchsorted(left_ids, first), max(left_ids.shape[0] - 1, 0))
+    target_pos = np.minimum(np.searchsorted(right_ids, second), max(right_ids.shape[0] - 1, 0))
+    scored = (left_ids[source_pos] == first) & (right_ids[target_pos] == second) if left_ids.size and right_ids.size \
+        else np.zeros(first.shape[0], dtype=bool)
+    pairs = np.flatnonzero(scored)
+    sources, inverse = np.unique(source_pos[pairs], return_inverse=True)
+
+    # Скорятся только источники отложенных связей
+    mask = _mask_keys(existing, symmetric)
+    for row_start, scores in score_blocks(left_ids[sources], left[sources], right_ids, right, mask, symmetric, block_scores):
+        in_block = (inverse >= row_start) & (inverse < row_start + scores.shape[0])
+        block_pairs, block_rows = pairs[in_block], inverse[in_block] - row_start
+        # Сама отложенная связь могла попасть в маску существующих, тогда ее скор считается заново
+        own = scores[block_rows, target_pos[block_pairs]]
+        masked = ~np.isfinite(own)
+        own[masked] = np.einsum("ij,ij->i", left[source_pos[block_pairs[masked]]], right[target_pos[block_pairs[masked]]])
+        ranks[block_pairs] = (scores[block_rows] > own[:, None]).sum(axis=1)
+
+    if symmetric:
+        ranks = np.minimum(ranks[:pair_count], ranks[pair_count:])
+    return ranks
+
+
+def recall_report(ranks: np.ndarray, n_sources: int, n_targets: int, k_values: list[int], symmetric: bool = False) -> pd.DataFrame:
+    """
+    Полнота на отложенных связях и цена отбора для каждого K: `pairs` - число
+    пар для внешних моделей (для симметричной связи - верхняя граница),
+    `share` - их доля от полного перебора.
+    """
+    full = n_sources * (n_sources - 1) // 2 if symmetric else n_sources * n_targets
+    rows = []
+    for k in k_values:
+        k = min(k, n_targets)
+        pairs = min(n_sources * k, full)
+        rows.append({
+            "k": k,
+            "pairs": pairs,
+            "share": round(pairs / max(full, 1), 6),
+            "recall": round(float((ranks < k).mean()) if ranks.size else 0.0, 4),
+        })
+    return pd.DataFrame(rows).drop_duplicates("k")
+
+
+def prune_links(
+    name: str,
+    ids: np.ndarray,
+    embeddings: np.ndarray,
+    operator: Optional[np.ndarray] = None,
+    k: int = TOP_K,
+    test_path: Optional[str] = TEST_TSV,
+    k_values: Optional[list[int]] = None,
+) -> int:
+    """
+    Отбирает для связи `name` (см. RELATIONS) пары-кандидаты по эмбеддингам
+    и пишет их в PRUNED_PATH/<name>.parquet вместо полного перебора
+    predicted_links; get_predicted_links.predict_links берет этот файл,
+    если он есть. При наличии `test_path` пишет отчет о полноте и цене
+    в REPORT_PATH/<name>.csv.
+    """
+    start = time.perf_counter()
+
+    left_name, right_name, columns, existing_spec, symmetric = RELATIONS[name]
+    left_all, right_all = entity_ids(left_name), entity_ids(right_name)
+    left_ids, left = side_vectors(ids, embeddings, left_all)
+    right_ids, right = side_vectors(ids, embeddings, right_all, operator)
+    print(f"{name}: {left_ids.shape[0]}/{left_all.shape[0]} sources, {right_ids.shape[0]}/{right_all.shape[0]} targets with embeddings")
+    existing = existing_pair_keys(DATA_PATH + existing_spec[0], existing_spec[1], symmetric) if existing_spec else None
+
+    os.makedirs(PRUNED_PATH, exist_ok=True)
+    total = write_pairs(Path(PRUNED_PATH) / f"{name}.parquet", columns,
+                        top_k_pairs(left_ids, left, right_ids, right, k, existing, symmetric))
+
+    if test_path and os.path.exists(test_path):
+        first, second = held_out_pairs(test_path, left_all, right_all, symmetric)
+        ranks = held_out_ranks(first, second, left_ids, left, right_ids, right, existing, symmetric)
+        report_df = recall_report(ranks, left_ids.shape[0], right_ids.shape[0], k_values or K_VALUES, symmetric)
+        os.makedirs(REPORT_PATH, exist_ok=True)
+        report_df.to_csv(REPORT_PATH + f"{name}.csv", index=False)
+        print(f"{name}: recall on {ranks.shape[0]} held-out links\n{report_df.to_string(index=False)}")
+
+    end = time.perf_counter()
+    print(f"{name}: kept {total} pairs (top {k} per source), time: {end - start:.3f} s.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune link-prediction candidates with PBG embeddings")
+    parser.add_argument("relations", nargs="*", default=list(RELATIONS))
+    parser.add_argument("-k", "--top-k", type=int, default=TOP_K)
+    parser.add_argument("--embeddings", default=EMB_H5)
+    parser.add_argument("--names", default=ENTITY_JSON)
+    parser.add_argument("--model", default=MODEL_H5)
+    parser.add_argument("--test", default=TEST_TSV)
+    args = parser.parse_args()
+
+    ids, embeddings = load_embeddings(args.embeddings, args.names)
+    operator = load_operator(args.model) if os.path.exists(args.model) else None
+    for relation in args.relations:
+        prune_links(relation, ids, embeddings, operator, args.top_k, args.test)
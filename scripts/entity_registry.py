@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from scripts import data_lake
+
+REGISTRY_PATH = "data/registry"
+
+# Выгрузки узлов из neo4j (nodeid, name, content), из которых строится реестр
+REGISTRY_SOURCES = {
+    "protein": ["data/entities/neo4j_proteins.csv", "data/protein_ids.csv"],
+    "small_molecule": ["data/entities/neo4j_small_molecules.csv", "data/small_molecules_nodeids.csv"],
+    "dna": ["data/entities/db_dna.csv"],
+    "rna": ["data/entities/db_rna.csv"],
+}
+
+EMPTY = np.uint64(0)
+MAX_LOAD = 0.5
+MIN_CAPACITY = 1 << 16
+
+
+def entity_keys(label, names, contents) -> np.ndarray:
+    """
+    Стабильный 64-битный ключ для (label, name, content).
+    Хеширование векторизовано (pandas hash_pandas_object с фиксированным
+    hash_key), поэтому ключи совпадают между запусками и процессами.
+    Значение 0 зарезервировано под пустую ячейку индекса.
+    """
+    names = np.asarray(names, dtype=object)
+    labels = np.broadcast_to(np.asarray(label, dtype=object), names.shape)
+    keys = pd.util.hash_pandas_object(
+        pd.DataFrame({"label": labels, "name": names, "content": np.asarray(contents, dtype=object)}),
+        index=False,
+    ).to_numpy(copy=True)
+    keys[keys == EMPTY] = np.uint64(1)
+    return keys
+
+
+class EntityRegistry:
+    """
+    Реестр ключ сущности -> nodeid на диске.
+
+    Хеш-таблица с открытой адресацией и линейным пробированием хранится
+    в двух memory-mapped файлах (`keys.npy`, `values.npy`), поэтому
+    реестр открывается без чтения в память целиком. Поиск и вставка
+    выполняются сразу для целой колонки ключей.
+    """
+    def __init__(self, path: str = REGISTRY_PATH, capacity: int = MIN_CAPACITY) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.size = meta["size"]
+            self.keys = np.load(self.path / "keys.npy", mmap_mode="r+")
+            self.values = np.load(self.path / "values.npy", mmap_mode="r+")
+        else:
+            self.size = 0
+            self.keys, self.values = self._allocate(self.path, _next_power_of_two(capacity))
+
+    @property
+    def capacity(self) -> int:
+        return self.keys.shape[0]
+
+    @staticmethod
+    def _allocate(path: Path, capacity: int, suffix: str = "") -> tuple[np.ndarray, np.ndarray]:
+        keys = np.lib.format.open_memmap(path / f"keys{suffix}.npy", mode="w+", dtype=np.uint64, shape=(capacity,))
+        values = np.lib.format.open_memmap(path / f"values{suffix}.npy", mode="w+", dtype=np.int64, shape=(capacity,))
+        keys[:] = EMPTY
+        values[:] = -1
+        return keys, values
+
+    def _find_slots(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Для каждого ключа возвращает ячейку и признак того, что ключ в ней найден."""
+        mask = np.uint64(self.capacity - 1)
+        slots = (keys & mask).astype(np.int64)
+        found = np.zeros(keys.shape[0], dtype=bool)
+        pending = np.arange(keys.shape[0])
+        while pending.size:
+            current = self.keys[slots[pending]]
+            hit = current == keys[pending]
+            found[pending[hit]] = True
+            collided = ~hit & (current != EMPTY)
+            pending = pending[collided]
+            slots[pending] = (slots[pending] + 1) & (self.capacity - 1)
+        return slots, found
+
+    def _insert_new(self, keys: np.ndarray, values: np.ndarray) -> None:
+        """Вставляет уникальные ключи, которых еще нет в таблице."""
+        slots = (keys & np.uint64(self.capacity - 1)).astype(np.int64)
+        pending = np.arange(keys.shape[0])
+        while pending.size:
+            occupied = self.keys[slots[pending]] != EMPTY
+            free = pending[~occupied]
+            # Несколько ключей могут претендовать на одну свободную ячейку: занимает первый
+            free_slots, first = np.unique(slots[free], return_index=True)
+            winners = free[first]
+            self.keys[free_slots] = keys[winners]
+            self.values[free_slots] = values[winners]
+            losers = np.setdiff1d(free, winners, assume_unique=True)
+            moved = pending[occupied]
+            slots[moved] = (slots[moved] + 1) & (self.capacity - 1)
+            pending = np.concatenate([moved, losers])
+        self.size += keys.shape[0]
+
+    def _grow(self, required: int) -> None:
+        capacity = self.capacity
+        while required > capacity * MAX_LOAD:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        occupied = self.keys != EMPTY
+        old_keys = np.array(self.keys[occupied])
+        old_values = np.array(self.values[occupied])
+        del self.keys, self.values
+        self.keys, self.values = self._allocate(self.path, capacity, suffix=".tmp")
+        self.size = 0
+        self._insert_new(old_keys, old_values)
+        self.flush()
+        del self.keys, self.values
+        for name in ("keys", "values"):
+            os.replace(self.path / f"{name}.tmp.npy", self.path / f"{name}.npy")
+        self.keys = np.load(self.path / "keys.npy", mmap_mode="r+")
+        self.values = np.load(self.path / "values.npy", mmap_mode="r+")
+
+    def register(self, label, names, contents, nodeids, strict: bool = False) -> np.ndarray:
+        """
+        Добавляет или обновляет nodeid для сущностей, возвращает их ключи.
+        Ключ с разными nodeid (внутри пачки или относительно уже записанного)
+        при `strict` - ошибка, иначе предупреждение, и остается последний nodeid.
+        """
+        keys = entity_keys(label, names, contents)
+        nodeids = np.asarray(nodeids, dtype=np.int64)
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = keys.shape[0] - 1 - last
+        unique_keys, unique_ids = keys[last], nodeids[last]
+
+        order = np.lexsort((nodeids, keys))
+        sorted_keys, sorted_ids = keys[order], nodeids[order]
+        conflicts = set(sorted_keys[1:][(sorted_keys[1:] == sorted_keys[:-1]) & (sorted_ids[1:] != sorted_ids[:-1])].tolist())
+        slots, found = self._find_slots(unique_keys)
+        changed = found & (self.values[slots] != unique_ids)
+        conflicts.update(unique_keys[changed].tolist())
+        if conflicts:
+            message = f"{len(conflicts)} {label} (name, content) keys map to different nodeids"
+            if strict:
+                raise ValueError(message)
+            print(f"[!] {message}, keeping the last nodeid")
+
+        self.values[slots[found]] = unique_ids[found]
+        new = ~found
+        if new.any():
+            self._grow(self.size + int(new.sum()))
+            self._insert_new(unique_keys[new], unique_ids[new])
+        return keys
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """nodeid для каждого ключа, -1 для отсутствующих."""
+        slots, found = self._find_slots(np.asarray(keys, dtype=np.uint64))
+        return np.where(found, self.values[slots], -1)
+
+    def resolve(self, label, names, contents) -> np.ndarray:
+        return self.lookup(entity_keys(label, names, contents))
+
+    def register_df(
+        self,
+        df: pd.DataFrame,
+        label: str,
+        nodeid_col: str = "nodeid",
+        name_col: str = "name",
+        content_col: str = "content",
+        strict: bool = False,
+    ) -> np.ndarray:
+        return self.register(label, df[name_col], df[content_col], df[nodeid_col], strict)
+
+    def resolve_df(
+        self,
+        df: pd.DataFrame,
+        label: str,
+        name_col: str,
+        content_col: str,
+        nodeid_col: str,
+    ) -> pd.DataFrame:
+        """
+        Добавляет колонку `nodeid_col` и отбрасывает строки, сущности которых
+        нет в реестре (аналог inner merge по name + content).
+        """
+        start = time.perf_counter()
+
+        nodeids = self.resolve(label, df[name_col], df[content_col])
+        resolved_df = df.assign(**{nodeid_col: nodeids})
+        resolved_df = resolved_df[nodeids >= 0]
+
+        end = time.perf_counter()
+        print(f"Resolving {nodeid_col} for {label}: {resolved_df.shape[0]}/{df.shape[0]} rows, time: {end - start:.3f} s.")
+
+        return resolved_df
+
+    def flush(self) -> None:
+        self.keys.flush()
+        self.values.flush()
+        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "capacity": self.capacity}, f)
+
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(int(value) - 1, MIN_CAPACITY - 1).bit_length()
+
+
+def build_registry(
+    sources: dict[str, list[str]] = REGISTRY_SOURCES,
+    path: str = REGISTRY_PATH,
+    strict: bool = False,
+) -> EntityRegistry:
+    """
+    Строит реестр из выгрузок узлов. Файлы читаются через data_lake.read_df
+    со схемой "entities" - той же, что у таблиц, которые затем сопоставляются
+    с реестром, поэтому name и content хешируются как строки в обоих случаях
+    (pd.read_csv превратил бы имя "123" в число).
+    """
+    registry = EntityRegistry(path)
+    for label, paths in sources.items():
+        for source in paths:
+            if not os.path.exists(source) and not data_lake.is_fresh(source):
+                print(f"skip {source}: file not found")
+                continue
+            nodes_df = data_lake.read_df(source, ["nodeid", "name", "content"]).dropna(subset=["nodeid"])
+            registry.register_df(nodes_df, label, strict=strict)
+            print(f"registered {nodes_df.shape[0]} {label} nodes from {source}")
+    registry.flush()
+    print(f"registry size: {registry.size}, capacity: {registry.capacity}")
+    return registry
+
+
+def load_registry(path: Optional[str] = None) -> EntityRegistry:
+    path = path or REGISTRY_PATH
+    if not (Path(path) / "meta.json").exists():
+        raise FileNotFoundError(
+            f"entity registry not found in {path}, build it with `python -m scripts.entity_registry`"
+        )
+    return EntityRegistry(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the (label, name, content) -> nodeid registry")
+    parser.add_argument("--strict", action="store_true", help="fail on keys that map to different nodeids")
+    args = parser.parse_args()
+
+    build_registry(strict=args.strict)
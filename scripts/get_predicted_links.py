@@ -1,12 +1,18 @@
 import os
-import gc
-import json
+import time
 from pathlib import Path
+from typing import Iterator, Optional
 
 import asyncio
-import httpx
 import dotenv
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts import data_lake
+from scripts.content_store import ContentStore
+from scripts.prediction_cache import CACHE_PATH, PredictionCache, expand_predictions, iter_unseen_batches
+from scripts.prediction_client import CONCURRENCY, PredictionClient
 
 dotenv.load_dotenv()
 
@@ -20,196 +26,188 @@ dotenv.load_dotenv()
 DATA_PATH = "data/link_prediction/"
 ENTITIES_PATH = DATA_PATH + "entities/"
 RESULT_PATH = DATA_PATH + "prediction_results/"
+# Кандидаты, отобранные по эмбеддингам (scripts/embedding_pruning.py)
+PRUNED_PATH = DATA_PATH + "pruned_links/"
+
+BLOCK_PAIRS = 4_000_000
+ROW_GROUP_SIZE = 1 << 20
+# Размер пачки и число одновременных запросов подбираются scripts/benchmark_prediction_client.py
+PREDICTION_BATCH_SIZE = int(os.environ.get("PREDICTION_BATCH_SIZE", 500))
+
+
+def entity_ids(name: str) -> np.ndarray:
+    """Отсортированные уникальные nodeid сущностей из ENTITIES_PATH."""
+    ids = data_lake.read_table(ENTITIES_PATH + f"{name}.csv", columns=['nodeid']).column('nodeid')
+    return np.unique(ids.to_numpy())
+
+
+def pair_keys(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Пара nodeid -> один int64: старшие 32 бита первый id, младшие - второй."""
+    if first.size and (max(first.max(), second.max()) >= 1 << 31 or min(first.min(), second.min()) < 0):
+        raise ValueError("node ids must be in [0, 2^31) to be packed into int64 pair keys")
+    return (first.astype(np.int64) << 32) | second.astype(np.int64)
+
+
+def existing_pair_keys(path: str, columns: list[str], symmetric: bool = False) -> np.ndarray:
+    """Отсортированные ключи существующих связей; для симметричных связей пара упорядочивается (min, max)."""
+    table = data_lake.read_table(path, columns=columns)
+    first = table.column(columns[0]).to_numpy()
+    second = table.column(columns[1]).to_numpy()
+    if symmetric:
+        first, second = np.minimum(first, second), np.maximum(first, second)
+    return np.unique(pair_keys(first, second))
+
+
+def iter_pairs(
+    left: np.ndarray,
+    right: np.ndarray,
+    existing: Optional[np.ndarray] = None,
+    symmetric: bool = False,
+    block_pairs: int = BLOCK_PAIRS,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Обходит декартово произведение left x right блоками не больше `block_pairs` пар.
+    Пары из `existing` (отсортированные ключи pair_keys) исключаются через
+    searchsorted. Для симметричных связей (left == right) петли отбрасываются,
+    а каждая неупорядоченная пара выдается один раз как (меньший id, больший id).
+    """
+    col_block = max(1, min(right.shape[0], block_pairs))
+    row_block = max(1, block_pairs // col_block)
+    for row_start in range(0, left.shape[0], row_block):
+        rows = left[row_start:row_start + row_block]
+        # Для симметричных связей столбцы левее диагонали блока дают только повторы
+        col_begin = row_start if symmetric else 0
+        for col_start in range(col_begin, right.shape[0], col_block):
+            cols = right[col_start:col_start + col_block]
+            first = np.repeat(rows, cols.shape[0])
+            second = np.tile(cols, rows.shape[0])
+            if symmetric:
+                keep = first < second
+                first, second = first[keep], second[keep]
+            if existing is not None and existing.size:
+                keys = pair_keys(first, second)
+                positions = np.minimum(np.searchsorted(existing, keys), existing.shape[0] - 1)
+                new = existing[positions] != keys
+                first, second = first[new], second[new]
+            if first.size:
+                yield first, second
 
 
 def get_rna_sm_links():
-    rna_df = pd.read_csv(ENTITIES_PATH + "rna.csv")
-    sm_df = pd.read_csv(ENTITIES_PATH + "small_molecule.csv")
-
-    existing_links = pd.read_csv(DATA_PATH + "existing_links/rna_sm.csv")
-
-    links = rna_df[['nodeid']].merge(sm_df[['nodeid']], how='cross')
-
-    idx1 = pd.MultiIndex.from_frame(links[['nodeid_x', 'nodeid_y']])
-    idx2 = pd.MultiIndex.from_frame(existing_links[['nodeid_rna', 'nodeid_sm']])
-    links = links[~idx1.isin(idx2)]
-
-    links.rename(
-        columns={
-            'nodeid_x': 'nodeid_rna',
-            'nodeid_y': 'nodeid_sm'
-        },
-        inplace=True,
-    )
-
-    return links
+    rna = entity_ids("rna")
+    sm = entity_ids("small_molecule")
+    existing = existing_pair_keys(DATA_PATH + "existing_links/rna_sm.csv", ['nodeid_rna', 'nodeid_sm'])
+    return ['nodeid_rna', 'nodeid_sm'], iter_pairs(rna, sm, existing)
 
 
 def get_rna_rna_links():
-    rna_df = pd.read_csv(ENTITIES_PATH + "rna.csv")
-
-    links = rna_df[['nodeid']].merge(rna_df[['nodeid']], how='cross')
-    links = links[links['nodeid_x'] != links['nodeid_y']]
-
-    links.rename(
-        columns={
-            'nodeid_x': 'nodeid_1',
-            'nodeid_y': 'nodeid_2'
-        },
-        inplace=True
-    )
-
-    return links
+    rna = entity_ids("rna")
+    return ['nodeid_1', 'nodeid_2'], iter_pairs(rna, rna, symmetric=True)
 
 
 def get_prot_prot_links():
-    prot_df = pd.read_csv(ENTITIES_PATH + "protein.csv")
-
-    existing_links = pd.read_csv(DATA_PATH + "existing_links/prot_prot.csv")
-
-    links = prot_df[['nodeid']].merge(prot_df[['nodeid']], how='cross')
-    links = links[links['nodeid_x'] != links['nodeid_y']]
-
-    idx1 = pd.MultiIndex.from_frame(links[['nodeid_x', 'nodeid_y']])
-    idx2 = pd.MultiIndex.from_frame(existing_links[['nodeid_protein_1', 'nodeid_protein_2']])
-    links = links[~idx1.isin(idx2)]
-
-    links.rename(
-        columns={
-            'nodeid_x': 'nodeid_1',
-            'nodeid_y': 'nodeid_2'
-        },
-        inplace=True
+    prot = entity_ids("protein")
+    existing = existing_pair_keys(
+        DATA_PATH + "existing_links/prot_prot.csv",
+        ['nodeid_protein_1', 'nodeid_protein_2'],
+        symmetric=True,
     )
-
-    return links
+    return ['nodeid_1', 'nodeid_2'], iter_pairs(prot, prot, existing, symmetric=True)
 
 
 def get_prot_dna_links():
-    prot_df = pd.read_csv(ENTITIES_PATH + "protein.csv")
-    dna_df = pd.read_csv(ENTITIES_PATH + "dna.csv")
-
-    links = prot_df[['nodeid']].merge(dna_df[['nodeid']], how='cross')
-    links.rename(
-        columns={
-            'nodeid_x': 'nodeid_protein',
-            'nodeid_y': 'nodeid_dna'
-        },
-        inplace=True
-    )
-
-    return links
+    prot = entity_ids("protein")
+    dna = entity_ids("dna")
+    return ['nodeid_protein', 'nodeid_dna'], iter_pairs(prot, dna)
+
+
+def write_pairs(path: Path, columns: list[str], pairs: Iterator[tuple[np.ndarray, np.ndarray]]) -> int:
+    """Пишет блоки пар в один Parquet-файл (zstd) группами строк по ROW_GROUP_SIZE."""
+    start = time.perf_counter()
+
+    schema = pa.schema([(name, pa.int64()) for name in columns])
+    total = 0
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for first, second in pairs:
+            pending.append(pa.RecordBatch.from_arrays([pa.array(first), pa.array(second)], schema=schema))
+            pending_rows += first.shape[0]
+            if pending_rows >= ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_batches(pending), row_group_size=ROW_GROUP_SIZE)
+                total += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=ROW_GROUP_SIZE)
+            total += pending_rows
+
+    end = time.perf_counter()
+    print(f"{path}: {total} pairs, time: {end - start:.3f} s.")
+    return total
 
 
 def shuffle_data():
     out_dir = Path(DATA_PATH) / "predicted_links"
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    df = get_rna_sm_links()
-    df.to_parquet(out_dir / "rna_sm.parquet.gzip", compression="gzip", index=False)
-    del df
-    gc.collect()
-
-    df = get_rna_rna_links()
-    df.to_parquet(out_dir / "rna_rna.parquet.gzip", compression="gzip", index=False)
-    del df
-    gc.collect()
-
-    df = get_prot_prot_links()
-    df.to_parquet(out_dir / "prot_prot.parquet.gzip", compression="gzip", index=False)
-    del df
-    gc.collect()
-
-    df = get_prot_dna_links()
-    df.to_parquet(out_dir / "prot_dna.parquet.gzip", compression="gzip", index=False)
-    del df
-    gc.collect()
-
-
-def pair_generator(init_pairs: list[list[str]], num_pairs: int, batch_size: int=500):
-    if not init_pairs or num_pairs <= 0:
-        return
-    
-    for pair_range in range(0, min(num_pairs, len(init_pairs)), batch_size):
-        yield ";".join([">".join(p) for p in init_pairs[pair_range:pair_range+batch_size]])
+    write_pairs(out_dir / "rna_sm.parquet", *get_rna_sm_links())
+    write_pairs(out_dir / "rna_rna.parquet", *get_rna_rna_links())
+    write_pairs(out_dir / "prot_prot.parquet", *get_prot_prot_links())
+    write_pairs(out_dir / "prot_dna.parquet", *get_prot_dna_links())
+
+
+def candidate_pairs_path(name: str) -> str:
+    """Отобранные по эмбеддингам пары, если они есть, иначе полный перебор из shuffle_data."""
+    pruned_path = PRUNED_PATH + f"{name}.parquet"
+    return pruned_path if os.path.exists(pruned_path) else DATA_PATH + f"predicted_links/{name}.parquet"
+
+
+def entity_contents(name: str) -> ContentStore:
+    """content сущностей со словарным кодированием по nodeid."""
+    entities_df = data_lake.read_df(ENTITIES_PATH + f"{name}.csv", columns=['nodeid', 'content'])
+    return ContentStore(entities_df['nodeid'].to_numpy(), entities_df['content'])
+
+
+async def predict_links(
+    name: str,
+    url: str,
+    param: str,
+    columns: list[str],
+    first_content: ContentStore,
+    second_content: ContentStore,
+    symmetric: bool = False,
+    batch_size: int = PREDICTION_BATCH_SIZE,
+) -> dict:
+    """
+    Отправляет в модель только пары content, которых нет в кеше модели,
+    затем разворачивает предсказания из кеша на все пары nodeid
+    в RESULT_PATH/<name>.parquet. Для симметричной связи (a, b) и (b, a)
+    считаются одной парой.
+    """
+    client = PredictionClient(url, param, concurrency=int(os.environ.get("PREDICTION_CONCURRENCY", CONCURRENCY)))
+    pairs_path = candidate_pairs_path(name)
+    with PredictionCache(CACHE_PATH + name, symmetric) as cache:
+        print(f"{name}: {len(cache)} cached predictions")
+        batches = iter_unseen_batches(pairs_path, columns, first_content, second_content, cache, batch_size)
+        stats = await client.run(batches, cache)
+        expand_predictions(pairs_path, columns, first_content, second_content, cache, RESULT_PATH + f"{name}.parquet")
+    return stats
 
 
 async def get_rna_sm_predictions():
-    url = os.environ['RNA_SM_API']
-    pairs = pd.read_parquet(DATA_PATH + "predicted_links/rna_sm.parquet.gzip")
-    rna = pd.read_csv(ENTITIES_PATH + "rna.csv")
-    sm = pd.read_csv(ENTITIES_PATH + "small_molecule.csv")
-    pairs['rna_content'] = pairs.merge(rna[['nodeid', 'content']], left_on='nodeid_rna', right_on='nodeid', how='left')['content']
-    pairs['sm_content'] = pairs.merge(sm[['nodeid', 'content']], left_on='nodeid_sm', right_on='nodeid', how='left')['content']
-    pair_list = pairs[['rna_content', 'sm_content']].values.tolist()
-    result = []
-    async with httpx.AsyncClient(timeout=None) as client:
-        i = 0
-        for batch in pair_generator(pair_list, num_pairs=pairs.shape[0], batch_size=500):
-            response = await client.post(url + "?rna_mol_smiles=" + batch)
-            if not response.is_success:
-                print("Error:", response.status_code, response.text)
-                continue
-            result.extend(response.json()["result"])
-            i += 1
-
-            if i % 10 == 0:
-                with open(RESULT_PATH + "rna_sm_result.json", "w", encoding="utf-8") as f:
-                    json.dump(result, f, indent=4)
-
-    return result
+    rna = entity_contents("rna")
+    sm = entity_contents("small_molecule")
+    return await predict_links("rna_sm", os.environ['RNA_SM_API'], "rna_mol_smiles", ['nodeid_rna', 'nodeid_sm'], rna, sm)
 
 
 async def get_rna_rna_predictions():
-    url = os.environ['RNA_RNA_API']
-    pairs = pd.read_parquet(DATA_PATH + "predicted_links/rna_rna.parquet.gzip")
-    rna = pd.read_csv(ENTITIES_PATH + "rna.csv")
-    pairs['rna_1_content'] = pairs.merge(rna[['nodeid', 'content']], left_on='nodeid_1', right_on='nodeid', how='left')['content']
-    pairs['rna_2_content'] = pairs.merge(rna[['nodeid', 'content']], left_on='nodeid_2', right_on='nodeid', how='left')['content']
-    pair_list = pairs[['rna_1_content', 'rna_2_content']].values.tolist()
-    result = []
-    async with httpx.AsyncClient(timeout=None) as client:
-        i = 0
-        for batch in pair_generator(pair_list, num_pairs=pairs.shape[0], batch_size=500):
-            response = await client.post(url + "?rna_mol_1_smiles=" + batch)
-            if not response.is_success:
-                print("Error:", response.status_code, response.text)
-                continue
-            result.extend(response.json()["result"])
-            i += 1
-
-            if i % 10 == 0:
-                with open(RESULT_PATH + "rna_rna_result.json", "w", encoding="utf-8") as f:
-                    json.dump(result, f, indent=4)
-
-    return result
+    rna = entity_contents("rna")
+    return await predict_links("rna_rna", os.environ['RNA_RNA_API'], "rna_mol_1_smiles", ['nodeid_1', 'nodeid_2'], rna, rna, symmetric=True)
 
 
 async def get_prot_dna_predictions():
-    url = os.environ['PROT_DNA_API']
-    pairs = pd.read_parquet(DATA_PATH + "predicted_links/prot_dna.parquet.gzip")
-    prot = pd.read_csv(ENTITIES_PATH + "protein.csv")
-    dna = pd.read_csv(ENTITIES_PATH + "dna.csv")
-    pairs['prot_content'] = pairs.merge(prot[['nodeid', 'content']], left_on='nodeid_protein', right_on='nodeid', how='left')['content']
-    pairs['dna_content'] = pairs.merge(dna[['nodeid', 'content']], left_on='nodeid_dna', right_on='nodeid', how='left')['content']
-    pair_list = pairs[['prot_content', 'dna_content']].values.tolist()
-    result = []
-    async with httpx.AsyncClient(timeout=None) as client:
-        i = 0
-        for batch in pair_generator(pair_list, num_pairs=pairs.shape[0], batch_size=500):
-            response = await client.post(url + "?prot_mol_dna=" + batch)
-            if not response.is_success:
-                print("Error:", response.status_code, response.text)
-                continue
-            result.extend(response.json()["result"])
-            i += 1
-
-            if i % 10 == 0:
-                with open(RESULT_PATH + "prot_dna_result.json", "w", encoding="utf-8") as f:
-                    json.dump(result, f, indent=4)
-
-    return result
-
+    prot = entity_contents("protein")
+    dna = entity_contents("dna")
+    return await predict_links("prot_dna", os.environ['PROT_DNA_API'], "prot_mol_dna", ['nodeid_protein', 'nodeid_dna'], prot, dna)
 
 
 async def get_predictions():
@@ -0,0 +1,141 @@
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LatencyModel(NamedTuple):
+    # Фиксированная стоимость запроса и стоимость одной пары, с
+    base: float = 0.05
+    per_item: float = 0.002
+    # sigma логнормального множителя времени обработки - хвост задержек
+    jitter: float = 0.3
+    # Сколько запросов модель обрабатывает одновременно, остальные ждут в очереди
+    workers: int = 2
+    # Запросы сверх очереди получают 503, пачки больше max_batch - 413
+    max_queue: int = 32
+    max_batch: int = 5_000
+
+
+# Профили эндпоинтов get_predicted_links; значения - оценки, уточняются по замерам реальных сервисов
+PROFILES = {
+    "rna_sm": LatencyModel(base=0.05, per_item=0.002, jitter=0.3, workers=2),
+    "rna_rna": LatencyModel(base=0.08, per_item=0.004, jitter=0.4, workers=2),
+    "prot_dna": LatencyModel(base=0.2, per_item=0.01, jitter=0.5, workers=1, max_batch=1_000),
+}
+
+
+def mock_score(pair: str) -> float:
+    """Детерминированный скор пары, чтобы повторные запросы давали тот же ответ."""
+    return int.from_bytes(hashlib.blake2b(pair.encode(), digest_size=4).digest(), "little") / 2 ** 32
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockPredictionServer"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        query = parse_qs(urlparse(self.path).query)
+        # Пачка приходит в теле ({param: "a>b;c>d"}) или в параметре URL (use_query=True)
+        payload = next(iter(body.values()), None) if body else next(iter(query.values()), [None])[0]
+        if not payload:
+            self._reply(400, {"error": "empty payload"})
+            return
+        pairs = payload.split(";")
+        status, result = self.server.predict(pairs)
+        self._reply(status, {"result": result} if status == 200 else {"error": result})
+
+
+class MockPredictionServer(ThreadingHTTPServer):
+    """
+    Локальная замена сервиса предсказания связей с моделью задержки:
+    время обработки `base + per_item * n` с логнормальным разбросом,
+    не больше `workers` запросов одновременно, ожидающие стоят в очереди
+    до `max_queue`. Статистика запросов - в `stats`.
+    `time_scale` сжимает все задержки для быстрых прогонов.
+    """
+    daemon_threads = True
+
+    def __init__(self, model: LatencyModel, host: str = "127.0.0.1", port: int = 0, time_scale: float = 1.0, seed: Optional[int] = None) -> None:
+        super().__init__((host, port), _Handler)
+        self.model = model
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.slots = threading.Semaphore(model.workers)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.stats = {"requests": 0, "pairs": 0, "rejected": 0, "too_large": 0, "max_waiting": 0}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/predict"
+
+    def predict(self, pairs: list[str]) -> tuple[int, object]:
+        model = self.model
+        with self.lock:
+            self.stats["requests"] += 1
+            if len(pairs) > model.max_batch:
+                self.stats["too_large"] += 1
+                return 413, f"batch of {len(pairs)} pairs exceeds {model.max_batch}"
+            if self.waiting >= model.max_queue:
+                self.stats["rejected"] += 1
+                return 503, "queue is full"
+            self.waiting += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.waiting)
+            service = (model.base + model.per_item * len(pairs)) * self.random.lognormvariate(0.0, model.jitter)
+        with self.slots:
+            with self.lock:
+                self.waiting -= 1
+            time.sleep(service * self.time_scale)
+        with self.lock:
+            self.stats["pairs"] += len(pairs)
+        return 200, [round(mock_score(pair), 6) for pair in pairs]
+
+    def start(self) -> "MockPredictionServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MockPredictionServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for a link-prediction endpoint")
+    parser.add_argument("profile", choices=list(PROFILES))
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = MockPredictionServer(PROFILES[args.profile], "127.0.0.1", args.port, args.time_scale)
+    print(f"{args.profile}: {PROFILES[args.profile]} at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats))
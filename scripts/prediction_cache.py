@@ -0,0 +1,257 @@
+import os
+import json
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.content_store import ContentStore
+from scripts.prediction_client import PredictionBatch, encode_pairs
+
+
+CACHE_PATH = "data/link_prediction/prediction_cache/"
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# Буфер новых ключей сливается с основным массивом, когда превышает
+# 1 / BUFFER_RATIO его размера (но не раньше MIN_BUFFER ключей)
+BUFFER_RATIO = 8
+MIN_BUFFER = 1 << 16
+
+
+def pair_hash(first: np.ndarray, second: np.ndarray, symmetric: bool = False) -> np.ndarray:
+    """
+    Ключ пары content как int64. Для симметричной связи хеши упорядочиваются,
+    поэтому (a, b) и (b, a) дают один ключ.
+    """
+    first, second = first.astype(np.uint64), second.astype(np.uint64)
+    if symmetric:
+        first, second = np.minimum(first, second), np.maximum(first, second)
+    x = first * GOLDEN ^ second
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x.view(np.int64)
+
+
+def _last_unique(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Отсортированные уникальные ключи; при повторах ключа остается последнее значение."""
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = keys.shape[0] - 1 - last
+    return keys[last], values[last]
+
+
+def _find(sorted_keys: np.ndarray, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Признак наличия каждого ключа в отсортированном массиве и его позиция."""
+    if not sorted_keys.size:
+        return np.zeros(keys.shape[0], dtype=bool), np.zeros(keys.shape[0], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.shape[0] - 1)
+    return sorted_keys[positions] == keys, positions
+
+
+class PredictionCache:
+    """
+    Кеш предсказаний по ключу пары content (`pair_hash`) для одной модели.
+
+    На диске - append-only `<path>.jsonl` со строками {key, result}; запись
+    после каждой пачки сбрасывается на диск, поэтому кеш одновременно служит
+    журналом для продолжения прерванного запуска. В памяти ключи хранятся
+    двумя отсортированными массивами без общих ключей: основным и буфером
+    новых ключей. Новые ключи вставляются в буфер, а буфер сливается
+    с основным массивом, только когда вырастает до 1 / BUFFER_RATIO его
+    размера, поэтому каждая пачка стоит O(буфера), а не O(всего кеша).
+    Поиск - через searchsorted по обоим массивам.
+    Реализует Sink для PredictionClient.run.
+    """
+    def __init__(self, path: str, symmetric: bool = False) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path + ".jsonl"
+        self.symmetric = symmetric
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=object)
+        self._buffer_keys = np.empty(0, dtype=np.int64)
+        self._buffer_values = np.empty(0, dtype=object)
+        self._pending_keys: list[np.ndarray] = []
+        self._pending_values: list[list] = []
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            cache_df = pd.read_json(self.path, lines=True, dtype={"key": "int64"})
+            values = np.empty(cache_df.shape[0], dtype=object)
+            values[:] = cache_df["result"].tolist()
+            self.keys, self.values = _last_unique(cache_df["key"].to_numpy(), values)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        self._sync()
+        return self.keys.shape[0] + self._buffer_keys.shape[0]
+
+    def _sync(self) -> None:
+        if not self._pending_keys:
+            return
+        values = np.empty(sum(k.shape[0] for k in self._pending_keys), dtype=object)
+        values[:] = [v for chunk in self._pending_values for v in chunk]
+        keys, values = _last_unique(np.concatenate(self._pending_keys), values)
+        self._pending_keys, self._pending_values = [], []
+
+        # Ключи, которые уже есть в кеше, обновляются на месте
+        for cached_keys, cached_values in ((self.keys, self.values), (self._buffer_keys, self._buffer_values)):
+            found, positions = _find(cached_keys, keys)
+            cached_values[positions[found]] = values[found]
+            keys, values = keys[~found], values[~found]
+
+        positions = np.searchsorted(self._buffer_keys, keys)
+        self._buffer_keys = np.insert(self._buffer_keys, positions, keys)
+        self._buffer_values = np.insert(self._buffer_values, positions, values)
+        if self._buffer_keys.shape[0] > max(MIN_BUFFER, self.keys.shape[0] // BUFFER_RATIO):
+            positions = np.searchsorted(self.keys, self._buffer_keys)
+            self.keys = np.insert(self.keys, positions, self._buffer_keys)
+            self.values = np.insert(self.values, positions, self._buffer_values)
+            self._buffer_keys = np.empty(0, dtype=np.int64)
+            self._buffer_values = np.empty(0, dtype=object)
+
+    def lookup(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Признак попадания и значения (None для промахов) для массива ключей."""
+        self._sync()
+        found = np.zeros(keys.shape[0], dtype=bool)
+        values = np.empty(keys.shape[0], dtype=object)
+        for cached_keys, cached_values in ((self.keys, self.values), (self._buffer_keys, self._buffer_values)):
+            hit, positions = _find(cached_keys, keys)
+            values[hit] = cached_values[positions[hit]]
+            found |= hit
+        return found, values
+
+    def append(self, batch: PredictionBatch, results: list) -> None:
+        self._file.write("".join(
+            json.dumps({"key": k, "result": r}) + "\n"
+            for k, r in zip(batch.keys.tolist(), results)
+        ))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending_keys.append(batch.keys)
+        self._pending_values.append(list(results))
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "PredictionCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def iter_pair_chunks(
+    pairs_path: str,
+    columns: list[str],
+    first_store: ContentStore,
+    second_store: ContentStore,
+    symmetric: bool,
+    chunk_size: int,
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Пары nodeid из Parquet кусками вместе с ключами пар content.
+    Пары, у конца которых нет content в хранилище, пропускаются.
+    """
+    parquet = pq.ParquetFile(pairs_path)
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+        first = batch.column(0).to_numpy()
+        second = batch.column(1).to_numpy()
+        known = first_store.contains(first) & second_store.contains(second)
+        if not known.all():
+            first, second = first[known], second[known]
+        keys = pair_hash(first_store.hashes(first), second_store.hashes(second), symmetric)
+        yield first, second, keys
+
+
+def iter_unseen_batches(
+    pairs_path: str,
+    columns: list[str],
+    first_store: ContentStore,
+    second_store: ContentStore,
+    cache: PredictionCache,
+    batch_size: int,
+    chunk_size: int = 1_000_000,
+) -> Iterator[PredictionBatch]:
+    """
+    Пачки запросов только из пар content, которых нет в кеше и которые еще
+    не отправлены в этом запуске; каждая пара content отправляется один раз
+    с nodeid первой встреченной пары. Строки пачки собираются из
+    ContentStore только для ее пар.
+    """
+    # Отправленные в этом запуске ключи: отсортированные уровни убывающего размера.
+    # Ключи куска добавляются новым уровнем, соседние уровни близкого размера
+    # сливаются, поэтому каждый ключ переписывается O(log n) раз, а не на каждом куске
+    queued: list[np.ndarray] = []
+    index = 0
+    buffer_first, buffer_second, buffer_keys = [], [], []
+    buffered = 0
+
+    def flush():
+        first, second, keys = np.concatenate(buffer_first), np.concatenate(buffer_second), np.concatenate(buffer_keys)
+        payload = encode_pairs(first_store.take(first), second_store.take(second))
+        return PredictionBatch(index, first, second, payload, keys)
+
+    for first, second, keys in iter_pair_chunks(pairs_path, columns, first_store, second_store, cache.symmetric, chunk_size):
+        unique_keys, representative = np.unique(keys, return_index=True)
+        found, _ = cache.lookup(unique_keys)
+        for level in queued:
+            found |= _find(level, unique_keys)[0]
+        unique_keys, representative = unique_keys[~found], representative[~found]
+        queued.append(unique_keys)
+        while len(queued) > 1 and queued[-2].shape[0] <= 2 * queued[-1].shape[0]:
+            last = queued.pop()
+            queued[-1] = np.sort(np.concatenate([queued[-1], last]))
+
+        position = 0
+        while position < unique_keys.shape[0]:
+            take = min(batch_size - buffered, unique_keys.shape[0] - position)
+            buffer_first.append(first[representative[position:position + take]])
+            buffer_second.append(second[representative[position:position + take]])
+            buffer_keys.append(unique_keys[position:position + take])
+            position += take
+            buffered += take
+            if buffered == batch_size:
+                yield flush()
+                index += 1
+                buffer_first, buffer_second, buffer_keys, buffered = [], [], [], 0
+    if buffered:
+        yield flush()
+
+
+def expand_predictions(
+    pairs_path: str,
+    columns: list[str],
+    first_store: ContentStore,
+    second_store: ContentStore,
+    cache: PredictionCache,
+    output_path: str,
+    chunk_size: int = 1_000_000,
+) -> int:
+    """
+    Разворачивает предсказания из кеша на все пары nodeid с тем же content
+    и пишет их в Parquet (zstd) с колонками пар и `result`.
+    Пары без предсказания (не удалось получить ответ) пропускаются.
+    """
+    start = time.perf_counter()
+
+    schema = pa.schema([(columns[0], pa.int64()), (columns[1], pa.int64()), ("result", pa.float64())])
+    total = 0
+    with pq.ParquetWriter(output_path, schema, compression="zstd") as writer:
+        for first, second, keys in iter_pair_chunks(pairs_path, columns, first_store, second_store, cache.symmetric, chunk_size):
+            found, values = cache.lookup(keys)
+            if not found.any():
+                continue
+            writer.write_table(pa.table(
+                [pa.array(first[found]), pa.array(second[found]), pa.array(values[found].astype(np.float64))],
+                schema=schema,
+            ))
+            total += int(found.sum())
+
+    end = time.perf_counter()
+    print(f"Expanded {len(cache)} cached predictions to {total} pairs -> {output_path}, time: {end - start:.3f} s.")
+    return total
+
+
+__all__ = ["CACHE_PATH", "PredictionCache", "pair_hash", "iter_unseen_batches", "expand_predictions"]
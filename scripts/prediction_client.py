@@ -0,0 +1,128 @@
+import json
+import time
+import random
+import asyncio
+from typing import Iterable, NamedTuple, Optional, Protocol
+
+import httpx
+import numpy as np
+
+
+CONCURRENCY = 4
+MAX_RETRIES = 5
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+TIMEOUT = 600.0
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class PredictionBatch(NamedTuple):
+    index: int
+    nodeid_1: np.ndarray
+    nodeid_2: np.ndarray
+    payload: str
+    # Ключи пар content для PredictionCache
+    keys: Optional[np.ndarray] = None
+
+
+def encode_pairs(first: Iterable[str], second: Iterable[str]) -> str:
+    """Формат, который принимают модели: `a>b;c>d`."""
+    return ";".join(f"{a}>{b}" for a, b in zip(first, second))
+
+
+class Sink(Protocol):
+    """
+    Куда PredictionClient.run пишет результаты пачек (PredictionCache,
+    CountingSink в бенчмарке). Номера пачек зависят от содержимого кеша,
+    поэтому прерванный запуск продолжается не по номерам, а по ключам пар:
+    iter_unseen_batches не собирает пачки из уже записанных ключей.
+    """
+    def append(self, batch: PredictionBatch, results: list) -> None: ...
+
+
+class PredictionClient:
+    """
+    Клиент модели предсказания связей: до `concurrency` пачек одновременно,
+    повтор с экспоненциальной задержкой и джиттером для сетевых ошибок
+    и статусов RETRY_STATUSES. Пачка передается в теле запроса
+    (`{param: "a>b;c>d"}`), `use_query=True` оставляет старый вариант
+    с параметром в URL для моделей, которые принимают только его.
+    """
+    def __init__(
+        self,
+        url: str,
+        param: str,
+        concurrency: int = CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF,
+        timeout: float = TIMEOUT,
+        use_query: bool = False,
+    ) -> None:
+        self.url = url
+        self.param = param
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.use_query = use_query
+
+    async def _post(self, client: httpx.AsyncClient, payload: str) -> list:
+        request = {"params": {self.param: payload}} if self.use_query else {"json": {self.param: payload}}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post(self.url, **request)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()["result"]
+                error = f"status {response.status_code}: {response.text[:200]}"
+            except httpx.TransportError as e:
+                error = repr(e)
+            if attempt == self.max_retries:
+                raise RuntimeError(f"{self.url}: giving up after {attempt + 1} attempts, last error {error}")
+            delay = min(MAX_BACKOFF, self.backoff * 2 ** attempt) * (0.5 + random.random())
+            print(f"{self.url}: {error}, retry in {delay:.1f} s.")
+            await asyncio.sleep(delay)
+
+    async def _process(self, client: httpx.AsyncClient, batch: PredictionBatch, sink: Sink, stats: dict) -> None:
+        try:
+            results = await self._post(client, batch.payload)
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Batch {batch.index} failed: {e}")
+            return
+        if len(results) != batch.nodeid_1.shape[0]:
+            stats["failed"] += 1
+            print(f"Batch {batch.index}: expected {batch.nodeid_1.shape[0]} results, got {len(results)}")
+            return
+        sink.append(batch, results)
+        stats["done"] += 1
+        stats["pairs"] += len(results)
+
+    async def run(self, batches: Iterable[PredictionBatch], sink: Sink) -> dict:
+        """
+        Отправляет пачки и пишет их результаты в `sink`. Пачки берутся
+        из итератора по мере освобождения слотов, поэтому в памяти держится
+        не больше `concurrency` пачек. Неудачные пачки не попадают в sink
+        и будут отправлены при следующем запуске.
+        """
+        start = time.perf_counter()
+
+        stats = {"done": 0, "failed": 0, "pairs": 0}
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            for batch in batches:
+                await slots.acquire()
+                task = asyncio.create_task(self._process(client, batch, sink, stats))
+                task.add_done_callback(lambda _: slots.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+
+        end = time.perf_counter()
+        stats["time"] = round(end - start, 3)
+        print(f"{self.url}: {json.dumps(stats)}")
+        return stats
+
+
+__all__ = ["PredictionBatch", "PredictionClient", "Sink", "encode_pairs"]
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import argparse
+from typing import Optional
+
+import dotenv
+
+from scripts import data_lake
+from src.sequences.classify import classify
+
+dotenv.load_dotenv()
+
+
+OUTPUT_PATH = "data/nodes"
+CHUNK_SIZE = 200_000
+
+# Файлы, которые загружает scripts/upload/upload_nodes.py, по меткам классификатора.
+# Строки с меткой unknown складываются отдельно для ручной проверки.
+ROUTES = {
+    "aa": "AA.csv",
+    "dna": "DNA.csv",
+    "rna": "RNA.csv",
+    "nucleic_ambiguous": "NucleicAmbigous.csv",
+    "nucleic_mixed": "NucleicMixed.csv",
+    "small_molecule": "SmallMolecule.csv",
+    "unknown": "Unknown.csv",
+}
+
+
+def route_sequences(
+    sources: list[str],
+    output_path: str = OUTPUT_PATH,
+    content_col: str = "content",
+    chunk_size: int = CHUNK_SIZE,
+    hint_col: Optional[str] = None,
+    source_hints: Optional[dict[str, str]] = None,
+) -> dict[str, int]:
+    """
+    Один проход по исходным файлам: каждый кусок классифицируется
+    src.sequences.classify и дописывается в файл своей метки.
+    Колонки источника сохраняются как есть, добавляется признак `valid`.
+    Короткие буквенные строки вроде "CCO" типизируются по подсказке:
+    колонке `hint_col` с меткой узла или метке всего файла из `source_hints`.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_path, exist_ok=True)
+    # Файлы дописываются по кускам, поэтому результаты прошлого запуска удаляются
+    for file_name in ROUTES.values():
+        if os.path.exists(os.path.join(output_path, file_name)):
+            os.remove(os.path.join(output_path, file_name))
+
+    counts = {label: 0 for label in ROUTES}
+    source_hints = source_hints or {}
+    for source in sources:
+        for batch in data_lake.dataset(source).to_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            hints = chunk[hint_col] if hint_col else source_hints.get(source)
+            classes = classify(chunk[content_col], hints)
+            chunk["valid"] = classes["valid"].to_numpy()
+            for label, label_df in chunk.groupby(classes["label"].to_numpy(), sort=False):
+                path = os.path.join(output_path, ROUTES[label])
+                label_df.to_csv(path, mode="a" if counts[label] else "w", header=not counts[label], index=False)
+                counts[label] += label_df.shape[0]
+
+    end = time.perf_counter()
+    print(f"Routed {sum(counts.values())} rows from {len(sources)} files: {json.dumps(counts)}, time: {end - start:.3f} s.")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route raw sequences into per-label node files")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--content-col", default="content")
+    parser.add_argument("--hint-col", help="column with the expected node label, e.g. small_molecule")
+    parser.add_argument(
+        "--hint", action="append", default=[], metavar="SOURCE=LABEL",
+        help="expected node label for every row of a source file",
+    )
+    args = parser.parse_args()
+
+    source_hints = dict(item.split("=", 1) for item in args.hint)
+    route_sequences(args.sources, args.output, args.content_col, hint_col=args.hint_col, source_hints=source_hints)
@@ -1,170 +1,111 @@
 import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 import dotenv
+import numpy as np
 import pandas as pd
 
+from scripts import data_lake
+
 dotenv.load_dotenv()
 
 
 PREPARED_DATA_PATH = "data/reparsing/prepared"
-
-
-def get_entity_df(df: pd.DataFrame, entity_name_col: str, entity_content_col: str) -> pd.DataFrame:
-    entity_df: pd.DataFrame = df[[entity_name_col, entity_content_col]]
-    entity_df.drop_duplicates(inplace=True)
-    entity_df.rename(
-        columns={entity_name_col: "name", entity_content_col: "content"},
-        inplace=True,
-    )
-    return entity_df
-
-
-def split_df(
-    df: pd.DataFrame,
-    entity_1_name_col: str,
-    entity_1_content_col: str,
-    entity_1_label: str,
-    entity_2_name_col: str,
-    entity_2_content_col: str,
-    entity_2_label: str,
-    prefix: str,
-):
-    df_path = os.path.join(PREPARED_DATA_PATH, prefix)
-    os.makedirs(
-        df_path,
-        exist_ok=True,
-    )
-
-    entity_1_df = get_entity_df(df, entity_1_name_col, entity_1_content_col)
-    entity_1_fp = os.path.join(df_path, f"{entity_1_label}.csv")
-    entity_1_df.to_csv(entity_1_fp, index=False)
-
-    entity_2_df = get_entity_df(df, entity_2_name_col, entity_2_content_col)
-    entity_2_fp = os.path.join(df_path, f"{entity_2_label}.csv")
-    entity_2_df.to_csv(entity_2_fp, index=False)
+SPECS_PATH = "scripts/processing/split_specs.json"
+CHUNK_SIZE = 200_000
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def take_unseen(df: pd.DataFrame, seen: set[int]) -> pd.DataFrame:
+    """
+    Оставляет строки, которых еще не было ни в этом, ни в предыдущих кусках.
+    Уникальность определяется по 64-битному хешу строки.
+    """
+    hashes = row_hashes(df)
+    _, first = np.unique(hashes, return_index=True)
+    first_in_chunk = np.zeros(hashes.shape[0], dtype=bool)
+    first_in_chunk[first] = True
+    already_seen = np.fromiter(map(seen.__contains__, hashes.tolist()), dtype=bool, count=hashes.shape[0])
+    mask = first_in_chunk & ~already_seen
+    seen.update(hashes[mask].tolist())
+    return df[mask]
+
+
+def append_csv(df: pd.DataFrame, path: str, header: bool) -> None:
+    df.to_csv(path, mode="w" if header else "a", header=header, index=False)
+
+
+def iter_chunks(sources: list[str], columns: list[str], chunk_size: int = CHUNK_SIZE):
+    """Потоково читает источники через data_lake, выравнивая колонки между файлами."""
+    for source in sources:
+        for batch in data_lake.dataset(source).to_batches(batch_size=chunk_size):
+            yield batch.to_pandas().reindex(columns=columns)
+
+
+def split_dataset(spec: dict, chunk_size: int = CHUNK_SIZE) -> dict[str, int]:
+    """
+    Делит один датасет взаимодействий по спецификации из SPECS_PATH:
+    пишет уникальные сущности каждой метки в `<prefix>/<label>.csv` (name, content)
+    и очищенные взаимодействия в `<prefix>/<interactions>` - файлы, которые
+    читают скрипты загрузки через LOAD CSV.
+    """
+    start = time.perf_counter()
+
+    df_path = os.path.join(PREPARED_DATA_PATH, spec["prefix"])
+    os.makedirs(df_path, exist_ok=True)
+
+    columns = []
+    for source in spec["sources"]:
+        for name in data_lake.dataset(source).schema.names:
+            if name not in columns:
+                columns.append(name)
+
+    entity_seen = {entity["label"]: set() for entity in spec["entities"]}
+    interactions_seen: set[int] = set()
+    counts = {entity["label"]: 0 for entity in spec["entities"]}
+    counts["interactions"] = 0
+    interactions_fp = os.path.join(df_path, spec["interactions"])
+
+    for i, chunk in enumerate(iter_chunks(spec["sources"], columns, chunk_size)):
+        if spec["dropna"]:
+            chunk = chunk.dropna(subset=spec["dropna"])
+        if spec["drop_duplicates"]:
+            chunk = take_unseen(chunk, interactions_seen)
+        append_csv(chunk, interactions_fp, header=i == 0)
+        counts["interactions"] += chunk.shape[0]
+
+        for entity in spec["entities"]:
+            entity_df = chunk[[entity["name_col"], entity["content_col"]]].set_axis(["name", "content"], axis=1)
+            entity_df = take_unseen(entity_df, entity_seen[entity["label"]])
+            append_csv(entity_df, os.path.join(df_path, f"{entity['label']}.csv"), header=i == 0)
+            counts[entity["label"]] += entity_df.shape[0]
+
+    end = time.perf_counter()
+    print(f"{spec['prefix']}: {counts}, time: {end - start:.3f} s.")
+    return counts
+
+
+def load_specs(path: str = SPECS_PATH) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(specs_path: str = SPECS_PATH, max_workers: Optional[int] = None):
+    specs = load_specs(specs_path)
+    # Датасеты независимы, поэтому каждый обрабатывается в своем процессе
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(
+            [spec["prefix"] for spec in specs],
+            executor.map(split_dataset, specs),
+        ))
+    print(json.dumps(results, indent=4))
 
 
 if __name__ == "__main__":
-    antibody_target = pd.read_csv(
-        "data/reparsing/аня_парсинг/new_antibody_interactions.csv",
-        index_col="Unnamed: 0",
-    )
-    antibody_target.drop_duplicates(inplace=True)
-    split_df(
-        antibody_target,
-        entity_1_name_col="antibody_name",
-        entity_1_content_col="antibody_sequence",
-        entity_1_label="antibody",
-        entity_2_name_col="target_name",
-        entity_2_content_col="target_seq",
-        entity_2_label="protein",
-        prefix="new_antibody"
-    )
-    antibody_target.to_csv(os.path.join(PREPARED_DATA_PATH, "new_antibody", "new_antibody_interactions.csv"), index=False)
-
-    dna_aptamers_mol_target = pd.read_csv(
-        "data/reparsing/aptamers_interactions/new_aptamers_dna_mol_interactions.csv",
-        index_col="Unnamed: 0",
-    )
-    aptamers_mandatory_columns = [
-        "apt_name",
-        "apt_seq",
-        "target_name",
-        "target_seq",
-    ]
-    dna_aptamers_mol_target.dropna(subset=aptamers_mandatory_columns, inplace=True)
-    split_df(
-        dna_aptamers_mol_target,
-        entity_1_name_col="apt_name",
-        entity_1_content_col="apt_seq",
-        entity_1_label="dna",
-        entity_2_name_col="target_name",
-        entity_2_content_col="target_seq",
-        entity_2_label="small_molecule",
-        prefix="new_aptamers_dna_mol"
-    )
-    dna_aptamers_mol_target.to_csv(os.path.join(PREPARED_DATA_PATH, "new_aptamers_dna_mol", "new_aptamers_interactions.csv"), index=False)
-
-    rna_aptamers_mol_target = pd.read_csv(
-        "data/reparsing/aptamers_interactions/new_aptamers_rna_mol_interactions.csv",
-        index_col="Unnamed: 0",
-    )
-    rna_aptamers_mol_target.dropna(subset=aptamers_mandatory_columns, inplace=True)
-    split_df(
-        rna_aptamers_mol_target,
-        entity_1_name_col="apt_name",
-        entity_1_content_col="apt_seq",
-        entity_1_label="rna",
-        entity_2_name_col="target_name",
-        entity_2_content_col="target_seq",
-        entity_2_label="small_molecule",
-        prefix="new_aptamers_rna_mol"
-    )
-    rna_aptamers_mol_target.to_csv(os.path.join(PREPARED_DATA_PATH, "new_aptamers_rna_mol", "new_aptamers_interactions.csv"), index=False)
-
-    dna_aptamers_protein_target = pd.read_csv(
-        "data/reparsing/aptamers_interactions/new_aptamers_dna_protein_interactions.csv",
-        index_col="Unnamed: 0",
-    )
-    dna_aptamers_protein_target.dropna(subset=aptamers_mandatory_columns, inplace=True)
-    split_df(
-        dna_aptamers_protein_target,
-        entity_1_name_col="apt_name",
-        entity_1_content_col="apt_seq",
-        entity_1_label="dna",
-        entity_2_name_col="target_name",
-        entity_2_content_col="target_seq",
-        entity_2_label="protein",
-        prefix="new_aptamers_dna_protein"
-    )
-    dna_aptamers_protein_target.to_csv(os.path.join(PREPARED_DATA_PATH, "new_aptamers_dna_protein", "new_aptamers_interactions.csv"), index=False)
-
-    rna_aptamers_protein_target = pd.read_csv(
-        "data/reparsing/aptamers_interactions/new_aptamers_rna_protein_interactions.csv",
-        index_col="Unnamed: 0",
-    )
-    rna_aptamers_protein_target.dropna(subset=aptamers_mandatory_columns, inplace=True)
-    split_df(
-        rna_aptamers_protein_target,
-        entity_1_name_col="apt_name",
-        entity_1_content_col="apt_seq",
-        entity_1_label="rna",
-        entity_2_name_col="target_name",
-        entity_2_content_col="target_seq",
-        entity_2_label="protein",
-        prefix="new_aptamers_rna_protein"
-    )
-    rna_aptamers_protein_target.to_csv(os.path.join(PREPARED_DATA_PATH, "new_aptamers_rna_protein", "new_aptamers_interactions.csv"), index=False)
-
-    repeats_df = pd.read_csv(
-        "data/reparsing/иван_парсинг/Repeats_annotation.csv",
-        index_col="Unnamed: 0",
-    )
-    ribosomal_df = pd.read_csv(
-        "data/reparsing/иван_парсинг/Ribosomal_annotation.csv",
-        index_col="Unnamed: 0",
-    )
-    riboswitrch_df = pd.read_csv(
-        "data/reparsing/иван_парсинг/Riboswitch_annotation.csv",
-        index_col="Unnamed: 0",
-    )
-    viral_df = pd.read_csv(
-        "data/reparsing/иван_парсинг/Viral_annotation.csv",
-        index_col="Unnamed: 0",
-    )
-    miRNA_df = pd.read_csv(
-        "data/reparsing/иван_парсинг/miRNA_annotation.csv",
-        index_col="Unnamed: 0",
-    )
-    aptamer_df = pd.concat([repeats_df, ribosomal_df, riboswitrch_df, viral_df, miRNA_df], axis=0)
-    aptamer_df.drop_duplicates(inplace=True)
-    split_df(
-        aptamer_df,
-        entity_1_name_col="RNA_name",
-        entity_1_content_col="rna_content",
-        entity_1_label="aptamer",
-        entity_2_name_col="small_molecule_name",
-        entity_2_content_col="small_molecule_content",
-        entity_2_label="small_molecule",
-        prefix="aptamer_datasets"
-    )
-    aptamer_df.to_csv(os.path.join(PREPARED_DATA_PATH, "aptamer_datasets", "aptamers_annotation.csv"), index=False)
+    main()
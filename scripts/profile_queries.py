@@ -0,0 +1,318 @@
+import os
+import re
+import ast
+import argparse
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import dotenv
+import pandas as pd
+
+from scripts.db_driver import DBDriver
+
+dotenv.load_dotenv()
+
+
+QUERY_SOURCES = [
+    "scripts/upload",
+    "graph_link_prediction_pykeen/download_data_from_neo4j",
+]
+REPORT_DIR = Path("results/query_profiles")
+
+CYPHER_RE = re.compile(r"\b(MATCH|MERGE|CREATE|LOAD CSV|UNWIND)\b")
+PARAM_RE = re.compile(r"\$(\w+)")
+IN_TRANSACTIONS_RE = re.compile(r"\}\s*IN\s+TRANSACTIONS(\s+OF\s+\d+\s+ROWS)?", re.IGNORECASE)
+LOAD_CSV_RE = re.compile(r"(LOAD CSV WITH HEADERS FROM\s+'[^']+'\s+AS\s+(\w+))", re.IGNORECASE)
+WRITE_RE = re.compile(r"\b(MERGE|CREATE|SET|DELETE|REMOVE)\b")
+
+SCAN_OPERATORS = {
+    "AllNodesScan",
+    "NodeByLabelScan",
+    "UndirectedAllRelationshipsScan",
+    "DirectedAllRelationshipsScan",
+}
+PROPERTY_PREDICATE_RE = re.compile(r"(\w+)\.(\w+)\s*(=|IN)")
+SCAN_DETAILS_RE = re.compile(r"(\w+):(\w+)")
+
+DEFAULT_PARAMS = {
+    "last_rid": -1,
+    "end_rid": 999,
+    "rids": list(range(1000)),
+    "model": "profile",
+    "run_id": "profile",
+}
+# Строк в `$rows` для запросов EdgeBatch/EntityBatch: концы берутся из БД
+SAMPLE_BATCH_ROWS = 100
+
+
+def _module_constants(tree: ast.Module) -> dict[str, Any]:
+    """Литеральные константы уровня модуля (`NAME = 10`, `NAME = "text"`)."""
+    constants = {}
+    for stmt in tree.body:
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+            try:
+                constants[stmt.targets[0].id] = ast.literal_eval(stmt.value)
+            except (ValueError, TypeError):
+                continue
+    return constants
+
+
+def _render(value: ast.expr, constants: dict[str, Any]) -> tuple[Optional[str], list[str]]:
+    """
+    Текст строкового литерала или f-строки, в которую подставлены константы
+    модуля. Для f-строки с другими выражениями - None и их исходный текст.
+    """
+    if isinstance(value, ast.Constant) and isinstance(value.value, str):
+        return value.value, []
+    if not isinstance(value, ast.JoinedStr):
+        return None, []
+    parts, unresolved = [], []
+    for part in value.values:
+        if isinstance(part, ast.Constant):
+            parts.append(part.value)
+        elif (
+            isinstance(part.value, ast.Name) and part.value.id in constants
+            and part.conversion == -1 and part.format_spec is None
+        ):
+            parts.append(str(constants[part.value.id]))
+        else:
+            unresolved.append(ast.unparse(part.value))
+    return (None if unresolved else "".join(parts)), unresolved
+
+
+def collect_queries(sources: list[str] = QUERY_SOURCES) -> Iterator[dict[str, Any]]:
+    """
+    Собирает шаблоны Cypher-запросов из строковых литералов и f-строк модулей
+    загрузки и выгрузки без их импорта (модули подключаются к БД при импорте).
+    В f-строки подставляются литеральные константы модуля; f-строка с другими
+    выражениями попадает в отчет с ошибкой.
+    """
+    for source in sources:
+        for path in sorted(Path(source).glob("*.py")):
+            source_text = path.read_text(encoding="utf-8")
+            tree = ast.parse(source_text)
+            constants = _module_constants(tree)
+            for node in ast.walk(tree):
+                if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Module)):
+                    continue
+                scope = getattr(node, "name", "<module>")
+                seen: dict[str, int] = {}
+                for stmt in node.body:
+                    if not isinstance(stmt, ast.Assign):
+                        continue
+                    text = ast.get_source_segment(source_text, stmt.value) or ""
+                    if not CYPHER_RE.search(text):
+                        continue
+                    query, unresolved = _render(stmt.value, constants)
+                    if query is None and not unresolved:
+                        continue
+                    target = stmt.targets[0]
+                    name = f"{scope}.{target.id}" if isinstance(target, ast.Name) else scope
+                    seen[name] = seen.get(name, 0) + 1
+                    if seen[name] > 1:
+                        name = f"{name}#{seen[name]}"
+                    item = {"module": str(path), "name": name, "query": query}
+                    if unresolved:
+                        item["error"] = "f-string with non-constant values: " + ", ".join(unresolved)
+                    yield item
+
+
+def _sample_ids(driver: DBDriver, label: str, limit: int) -> list[int]:
+    ids = driver.select_as_df(f"MATCH (n:`{label}`) RETURN id(n) AS id LIMIT $limit", {"limit": limit})
+    return ids["id"].tolist() if not ids.empty else []
+
+
+def batch_queries(driver: DBDriver, sample_rows: int = SAMPLE_BATCH_ROWS) -> Iterator[dict[str, Any]]:
+    """
+    Запросы, которые строят EdgeBatch/EntityBatch (src/db/models.py), в том
+    же виде, что и при загрузке предсказанных связей, вместе с непустым
+    `$rows` из `sample_rows` строк: концы - существующие узлы из БД, поэтому
+    план PROFILE проходит поиск концов и запись, а не пустой UNWIND.
+    """
+    from src.db.models import EdgeBatch, EntityBatch
+    from scripts.upload import predicted_links
+
+    module = "src/db/models.py"
+    for model, (source_label, target_label, columns) in predicted_links.RELATIONS.items():
+        sources = _sample_ids(driver, source_label, sample_rows) or [-1]
+        targets = _sample_ids(driver, target_label, sample_rows) or [-1]
+        n = min(len(sources), len(targets))
+        edges_df = pd.DataFrame({columns[0]: sources[:n], columns[1]: targets[:n]})
+        edges_df["score"] = 0.5
+        edges_df["model"] = model
+        edges_df["run_id"] = DEFAULT_PARAMS["run_id"]
+        batch = EdgeBatch.from_df(
+            edges_df, predicted_links.REL_TYPE, source_label, target_label,
+            source_column=columns[0], target_column=columns[1], id_key=predicted_links.ID_KEY,
+        )
+        yield {
+            "module": module,
+            "name": f"EdgeBatch.{model}",
+            "query": batch.compose_create_query(),
+            "params": {"rows": list(batch.iter_rows())},
+        }
+
+    labels = sorted({label for source, target, _ in predicted_links.RELATIONS.values() for label in (source, target)})
+    for label in labels:
+        nodes_df = driver.select_as_df(
+            f"MATCH (n:`{label}`) RETURN n.name AS name, n.content AS content LIMIT $limit",
+            {"limit": sample_rows},
+        )
+        nodes_df = nodes_df.dropna()
+        if nodes_df.empty:
+            nodes_df = pd.DataFrame({"name": ["profile"], "content": ["profile"]})
+        batch = EntityBatch.from_df(nodes_df, label)
+        yield {
+            "module": module,
+            "name": f"EntityBatch.{label}",
+            "query": batch.compose_merge_query(),
+            "params": {"rows": list(batch.iter_rows())},
+        }
+
+
+def prepare_query(query: str, sample_rows: Optional[int]) -> str:
+    """
+    Убирает `IN TRANSACTIONS`, чтобы запрос можно было выполнить в явной
+    транзакции с откатом, и ограничивает LOAD CSV выборкой из `sample_rows` строк.
+    """
+    query = IN_TRANSACTIONS_RE.sub("}", query)
+    if sample_rows is not None:
+        query = LOAD_CSV_RE.sub(rf"\1 WITH \2 LIMIT {int(sample_rows)}", query)
+    return query
+
+
+def query_params(query: str) -> dict[str, Any]:
+    return {name: DEFAULT_PARAMS.get(name) for name in set(PARAM_RE.findall(query))}
+
+
+def _operator_name(plan: dict) -> str:
+    return plan["operatorType"].split("@")[0]
+
+
+def _walk(plan: dict, parent: Optional[dict] = None) -> Iterator[tuple[dict, Optional[dict]]]:
+    yield plan, parent
+    for child in plan.get("children", []):
+        yield from _walk(child, plan)
+
+
+def analyze_plan(plan: dict, indexes: set[tuple[str, str]]) -> dict[str, Any]:
+    """
+    Считает db hits, сканирования по метке/всем узлам и eager-операторы,
+    а также ищет фильтры по свойству поверх сканирования метки,
+    для которых нет индекса `(label, property)`.
+    """
+    db_hits = 0
+    rows = 0
+    scans = []
+    eager = []
+    missing = set()
+    operators = set()
+    for op, parent in _walk(plan):
+        name = _operator_name(op)
+        operators.add(name)
+        db_hits += op.get("dbHits", 0)
+        rows = max(rows, op.get("rows", 0))
+        details = str(op.get("args", {}).get("Details", ""))
+        if name in SCAN_OPERATORS:
+            scans.append(f"{name}({details})")
+            if parent is not None and _operator_name(parent) == "Filter":
+                filter_details = str(parent.get("args", {}).get("Details", ""))
+                labels = dict(SCAN_DETAILS_RE.findall(details))
+                for variable, prop, _ in PROPERTY_PREDICATE_RE.findall(filter_details):
+                    label = labels.get(variable)
+                    if label is not None and (label, prop) not in indexes:
+                        missing.add(f"{label}({prop})")
+        if name.startswith("Eager"):
+            eager.append(name)
+    return {
+        "db_hits": db_hits,
+        "max_rows": rows,
+        "label_scans": "; ".join(scans),
+        "eager_operators": ", ".join(eager),
+        "missing_indexes": ", ".join(sorted(missing)),
+        "operators": len(operators),
+    }
+
+
+def get_indexes(driver: DBDriver) -> set[tuple[str, str]]:
+    indexes = driver.select_as_df(
+        "SHOW INDEXES YIELD labelsOrTypes, properties WHERE labelsOrTypes IS NOT NULL"
+    )
+    result = set()
+    for labels, props in zip(indexes.get("labelsOrTypes", []), indexes.get("properties", [])):
+        for label in labels or []:
+            for prop in props or []:
+                result.add((label, prop))
+    return result
+
+
+def profile_query(
+    driver: DBDriver,
+    query: str,
+    mode: str,
+    sample_rows: Optional[int],
+    params: Optional[dict[str, Any]] = None,
+) -> dict:
+    """
+    EXPLAIN строит план без выполнения. PROFILE выполняет запрос в явной
+    транзакции, которая затем откатывается, поэтому данные не меняются.
+    `params` дополняют значения по умолчанию из DEFAULT_PARAMS.
+    """
+    query = prepare_query(query, sample_rows)
+    params = {**query_params(query), **(params or {})}
+    with driver.session() as session:
+        if mode == "explain":
+            summary = session.run(f"EXPLAIN {query}", params).consume()
+            return summary.plan
+        tx = session.begin_transaction()
+        try:
+            summary = tx.run(f"PROFILE {query}", params).consume()
+            return summary.profile
+        finally:
+            tx.rollback()
+
+
+def profile_all(driver: DBDriver, mode: str = "explain", sample_rows: Optional[int] = 1000) -> pd.DataFrame:
+    indexes = get_indexes(driver)
+    report = []
+    for item in chain(collect_queries(), batch_queries(driver)):
+        row = {"module": item["module"], "name": item["name"], "writes": bool(WRITE_RE.search(item["query"] or ""))}
+        if item.get("error"):
+            row["error"] = item["error"]
+            report.append(row)
+            continue
+        try:
+            plan = profile_query(driver, item["query"], mode, sample_rows, item.get("params"))
+            row.update(analyze_plan(plan, indexes))
+        except Exception as e:
+            row["error"] = str(e).splitlines()[0]
+        report.append(row)
+    return pd.DataFrame(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN/PROFILE all ingestion and export queries")
+    parser.add_argument("--mode", choices=["explain", "profile"], default="explain")
+    parser.add_argument("--sample-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    driver = DBDriver(
+        os.environ["NEO4J_URL"],
+        os.environ["NEO4J_USER"],
+        os.environ["NEO4J_PASSWORD"],
+    )
+    with driver:
+        report = profile_all(driver, args.mode, args.sample_rows)
+
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = REPORT_DIR / f"{args.mode}.csv"
+    report.to_csv(output_path, index=False)
+
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(report.to_string(index=False))
+    print(f"Report saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,110 +1,75 @@
-import os
 import time
-import hashlib
 import dotenv
+import numpy as np
 import pandas as pd
 
-dotenv.load_dotenv()
-
-
-def make_hash(value: str) -> str:
-    return hashlib.md5(value.encode()).hexdigest()
-
+from scripts import data_lake
+from scripts.entity_registry import EntityRegistry, load_registry
 
-def hash_df(df: pd.DataFrame, col1: str, col2: str, hash_label: str) -> pd.DataFrame:
-    start = time.perf_counter()
-
-    df = df.copy()
-    df[f"{col1}_{col2}"] = df[col1] + df[col2]
-    df[hash_label] = df[f"{col1}_{col2}"].apply(make_hash)
-    df = df.drop(f"{col1}_{col2}", axis=1)
+dotenv.load_dotenv()
 
-    end = time.perf_counter()
 
-    print(f"Hashing {col1} {col2} to {hash_label} time: {end - start:.3f} s.")
-    return df
+def filter_similarity_df(df: pd.DataFrame) -> pd.DataFrame:
+    filtered_df = df[~(
+        (df["name_1"] == df["name_2"]) & (df["content_1"] == df["content_2"])
+    )]
+    return filtered_df
 
 
-def rename_entities(
+def canonicalize_similarity_df(
     df: pd.DataFrame,
-    nodeid_col: str,
-    hash_col: str,
-    node_df: pd.DataFrame
+    col1: str = "nodeid_1",
+    col2: str = "nodeid_2",
+    score_col: str = "score",
 ) -> pd.DataFrame:
+    """
+    Приводит неориентированные пары к виду (min, max), удаляет петли
+    и повторы (a, b) / (b, a), оставляя максимальный score для пары.
+    """
     start = time.perf_counter()
 
-    merged_df = df.merge(
-        node_df[["nodeid", "hash"]],
-        left_on=hash_col,
-        right_on="hash",
-    )
-    merged_df.rename(columns={"nodeid": nodeid_col}, inplace=True)
-    merged_df.drop("hash", axis=1, inplace=True)
+    first = df[col1].to_numpy()
+    second = df[col2].to_numpy()
+    canonical_df = pd.DataFrame({
+        col1: np.minimum(first, second),
+        col2: np.maximum(first, second),
+        score_col: df[score_col].to_numpy(),
+    })
+    canonical_df = canonical_df[canonical_df[col1] != canonical_df[col2]]
+    canonical_df = canonical_df.groupby([col1, col2], as_index=False, sort=False)[score_col].max()
 
     end = time.perf_counter()
-    print(f"Merging nodeids for {nodeid_col} on {hash_col} time: {end - start:.3f} s.")
+    print(f"Canonicalizing {col1} {col2}: {df.shape[0]} -> {canonical_df.shape[0]} rows, time: {end - start:.3f} s.")
 
-    return merged_df
+    return canonical_df
 
 
-def filter_similarity_df(df: pd.DataFrame) -> pd.DataFrame:
-    filtered_df = df[~(
-        (df["name_1"] == df["name_2"]) & (df["content_1"] == df["content_2"])
-    )]
-    return filtered_df
-
-
-def hash_nodes_similarity(
+def resolve_nodes_similarity(
     similarity_df: pd.DataFrame,
-    nodes_df: pd.DataFrame,
+    label: str,
+    registry: EntityRegistry,
 ) -> pd.DataFrame:
-    nodes_hashed_df = hash_df(
-        nodes_df,
-        "name",
-        "content",
-        "hash",
-    )
+    """
+    Сопоставляет обе стороны пар сходства с nodeid через реестр сущностей
+    по (label, name, content) вместо хеширования и merge по md5-строкам.
+    """
     print("rows before:", similarity_df.shape[0])
-    similarity_hashed_df = hash_df(
-        similarity_df,
-        "name_1",
-        "content_1",
-        "hash_1",
-    )
-    similarity_hashed_df = hash_df(
-        similarity_hashed_df,
-        "name_2",
-        "content_2",
-        "hash_2",
-    )
-    merged_hash_df = rename_entities(
-        similarity_hashed_df,
-        "nodeid_1",
-        "hash_1",
-        nodes_hashed_df,
-    )
-    merged_hash_df = rename_entities(
-        merged_hash_df,
-        "nodeid_2",
-        "hash_2",
-        nodes_hashed_df,
-    )
-    print("rows after:", merged_hash_df.shape[0])
-    return merged_hash_df
+    resolved_df = registry.resolve_df(similarity_df, label, "name_1", "content_1", "nodeid_1")
+    resolved_df = registry.resolve_df(resolved_df, label, "name_2", "content_2", "nodeid_2")
+    print("rows after:", resolved_df.shape[0])
+    return resolved_df
 
 
 def rename_similarity():
     start = time.perf_counter()
 
-    protein_nodes_df = pd.read_csv("data/entities/neo4j_proteins.csv")
-    small_molecule_nodes_df = pd.read_csv("data/entities/neo4j_small_molecules.csv")
-    dna_nodes_df = pd.read_csv("data/entities/db_dna.csv")
-    rna_nodes_df = pd.read_csv("data/entities/db_rna.csv")
+    registry = load_registry()
 
-    dna_similarity = pd.read_csv("data/db_similarity/dna_similarity_80.csv")
-    rna_similarity = pd.read_csv("data/db_similarity/rna_similarity_80.csv")
-    protein_similarity = pd.read_csv("data/db_similarity/similarity_proteins.csv")
-    small_molecule_similarity = pd.read_csv("data/db_similarity/similarity_small_molecule.csv")
+    columns = ["name_1", "content_1", "name_2", "content_2", "score"]
+    dna_similarity = data_lake.read_df("data/db_similarity/dna_similarity_80.csv", columns)
+    rna_similarity = data_lake.read_df("data/db_similarity/rna_similarity_80.csv", columns)
+    protein_similarity = data_lake.read_df("data/db_similarity/similarity_proteins.csv", columns)
+    small_molecule_similarity = data_lake.read_df("data/db_similarity/similarity_small_molecule.csv", columns)
 
     print(f"df reading time: {time.perf_counter() - start:.3f} s.")
 
@@ -114,30 +79,37 @@ def rename_similarity():
     protein_similarity = filter_similarity_df(protein_similarity)
     small_molecule_similarity = filter_similarity_df(small_molecule_similarity)
  
-    print("df hash and merge")
+    print("df resolve nodeids")
 
     print("dna")
-    hashed_dna_similarity = hash_nodes_similarity(dna_similarity, dna_nodes_df)
+    resolved_dna_similarity = resolve_nodes_similarity(dna_similarity, "dna", registry)
 
     print("rna")
-    hashed_rna_similarity = hash_nodes_similarity(rna_similarity, rna_nodes_df)
+    resolved_rna_similarity = resolve_nodes_similarity(rna_similarity, "rna", registry)
 
     print("protein")
-    hashed_protein_similarity = hash_nodes_similarity(protein_similarity, protein_nodes_df)
+    resolved_protein_similarity = resolve_nodes_similarity(protein_similarity, "protein", registry)
 
     print("small molecules")
-    hashed_small_molecule_similarity = hash_nodes_similarity(
+    resolved_small_molecule_similarity = resolve_nodes_similarity(
         small_molecule_similarity,
-        small_molecule_nodes_df
+        "small_molecule",
+        registry,
     )
 
+    print("df canonicalize")
+    resolved_dna_similarity = canonicalize_similarity_df(resolved_dna_similarity)
+    resolved_rna_similarity = canonicalize_similarity_df(resolved_rna_similarity)
+    resolved_protein_similarity = canonicalize_similarity_df(resolved_protein_similarity)
+    resolved_small_molecule_similarity = canonicalize_similarity_df(resolved_small_molecule_similarity)
+
     print("df write")
     write_start = time.perf_counter()
 
-    hashed_dna_similarity.to_csv("data/db_similarity/hashed/dna_similarity.csv")
-    hashed_rna_similarity.to_csv("data/db_similarity/hashed/rna_similarity.csv")
-    hashed_protein_similarity.to_csv("data/db_similarity/hashed/protein_similarity.csv")
-    hashed_small_molecule_similarity.to_csv("data/db_similarity/hashed/small_molecule_similarity.csv")
+    resolved_dna_similarity.to_csv("data/db_similarity/hashed/dna_similarity.csv", index=False)
+    resolved_rna_similarity.to_csv("data/db_similarity/hashed/rna_similarity.csv", index=False)
+    resolved_protein_similarity.to_csv("data/db_similarity/hashed/protein_similarity.csv", index=False)
+    resolved_small_molecule_similarity.to_csv("data/db_similarity/hashed/small_molecule_similarity.csv", index=False)
 
     end = time.perf_counter()
 
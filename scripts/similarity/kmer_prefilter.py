@@ -0,0 +1,200 @@
+import os
+import time
+import argparse
+from typing import Optional
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from scripts import data_lake
+from scripts.similarity.sequence_lsh import verify_candidates
+
+dotenv.load_dotenv()
+
+
+SOURCE_PATH = "data/entities/neo4j_proteins.csv"
+# Пары с nodeid вместо (name, sequence), их читает upload/protein_similarity.prepare_data
+OUTPUT_PATH = "data/aligned_pairs_nodeids.csv"
+
+K = 5
+MIN_HITS = 2
+DIAGONAL_WIDTH = 32
+# k-меры, встречающиеся чаще, дают в основном шумовые затравки (низкая сложность, повторы)
+MAX_KMER_FREQ = 1_000
+THRESHOLD = 0.8
+SEED_PAIRS_BATCH = 20_000_000
+
+BITS_PER_RESIDUE = 5
+# Коды остатков: буквы A-Z (20 аминокислот и B, Z, X, U, O, J) - 1..26,
+# остальные символы (*, ?, -, цифры, не-ASCII) - 0, окна с ними не дают k-меров
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+RESIDUE_CODES = np.zeros(256, dtype=np.int64)
+RESIDUE_CODES[np.frombuffer(ALPHABET.encode("ascii"), dtype=np.uint8)] = np.arange(1, len(ALPHABET) + 1)
+
+
+def kmer_postings(sequences: list[str], k: int = K) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Все вхождения k-меров как три колонки (kmer, номер последовательности, позиция).
+    Последовательности склеиваются в один буфер, окна считаются сразу по всему
+    буферу, окна через границу последовательностей и окна с символами вне
+    ALPHABET отбрасываются. Код остатка занимает 5 битов, поэтому k <= 12.
+    """
+    if not 1 <= k <= 64 // BITS_PER_RESIDUE:
+        raise ValueError(f"k must be in [1, {64 // BITS_PER_RESIDUE}], got {k}")
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    buffer = np.frombuffer("".join(sequences).upper().encode("ascii", "replace"), dtype=np.uint8)
+    if buffer.shape[0] < k:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty.astype(np.int32), empty.astype(np.int32)
+
+    codes = RESIDUE_CODES[buffer]
+    shifts = np.arange(k, dtype=np.int64) * BITS_PER_RESIDUE
+    kmers = (np.lib.stride_tricks.sliding_window_view(codes, k) << shifts).sum(axis=1)
+    unknown = np.concatenate([[0], np.cumsum(codes == 0)])
+
+    starts = np.arange(kmers.shape[0])
+    seq = np.searchsorted(offsets, starts, side="right") - 1
+    valid = (starts + k <= offsets[seq + 1]) & (unknown[starts + k] == unknown[starts])
+    return kmers[valid], seq[valid].astype(np.int32), (starts - offsets[seq])[valid].astype(np.int32)
+
+
+def _group_batches(sizes: np.ndarray, batch_pairs: int) -> list[tuple[int, int]]:
+    """Делит группы k-меров на пачки примерно по `batch_pairs` пар затравок."""
+    pairs = sizes * (sizes - 1) // 2
+    batch = (np.cumsum(pairs) - pairs) // batch_pairs
+    bounds = np.flatnonzero(np.r_[True, batch[1:] != batch[:-1]]) if sizes.size else np.empty(0, dtype=np.int64)
+    return list(zip(bounds.tolist(), np.r_[bounds[1:], sizes.shape[0]].tolist()))
+
+
+def seed_candidates(
+    sequences: list[str],
+    k: int = K,
+    min_hits: int = MIN_HITS,
+    diagonal_width: int = DIAGONAL_WIDTH,
+    max_kmer_freq: int = MAX_KMER_FREQ,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Пары последовательностей (i < j), у которых не меньше `min_hits` общих
+    k-меров на одной полосе диагоналей шириной `diagonal_width`
+    (диагональ - разность позиций k-мера в двух последовательностях).
+    """
+    n = len(sequences)
+    kmers, seq, pos = kmer_postings(sequences, k)
+    order = np.argsort(kmers, kind="stable")
+    kmers, seq, pos = kmers[order], seq[order], pos[order]
+
+    starts = np.flatnonzero(np.r_[True, kmers[1:] != kmers[:-1]]) if kmers.size else np.empty(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, kmers.shape[0]])
+    keep = (sizes > 1) & (sizes <= max_kmer_freq)
+    starts, sizes = starts[keep], sizes[keep]
+
+    max_length = max((len(s) for s in sequences), default=0)
+    n_bins = 2 * max_length // diagonal_width + 2
+    if n * n * n_bins >= np.iinfo(np.int64).max:
+        raise ValueError("too many sequences for int64 (pair, diagonal) keys")
+
+    keys, counts = [], []
+    for batch_start, batch_stop in _group_batches(sizes, SEED_PAIRS_BATCH):
+        batch_starts, batch_sizes = starts[batch_start:batch_stop], sizes[batch_start:batch_stop]
+        # Группы одного размера разворачиваются в пары затравок одной операцией
+        for size in np.unique(batch_sizes):
+            members = batch_starts[batch_sizes == size][:, None] + np.arange(size)
+            first, second = np.triu_indices(size, 1)
+            left, right = members[:, first].ravel(), members[:, second].ravel()
+            seq_a, seq_b, pos_a, pos_b = seq[left], seq[right], pos[left], pos[right]
+            swap = seq_a > seq_b
+            seq_a, seq_b = np.where(swap, seq_b, seq_a), np.where(swap, seq_a, seq_b)
+            pos_a, pos_b = np.where(swap, pos_b, pos_a), np.where(swap, pos_a, pos_b)
+            other = seq_a != seq_b
+            diagonal_bin = (pos_b[other].astype(np.int64) - pos_a[other] + max_length) // diagonal_width
+            pair = seq_a[other].astype(np.int64) * n + seq_b[other]
+            batch_keys, batch_counts = np.unique(pair * n_bins + diagonal_bin, return_counts=True)
+            keys.append(batch_keys)
+            counts.append(batch_counts)
+
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    # Суммируем попадания (пара, полоса) по всем пачкам, затем берем лучшую полосу пары
+    keys, counts = np.concatenate(keys), np.concatenate(counts)
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    keys, counts = keys[bounds], np.add.reduceat(counts, bounds)
+
+    pairs = keys // n_bins
+    bounds = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]])
+    best = np.maximum.reduceat(counts, bounds)
+    pairs = pairs[bounds][best >= min_hits]
+    return pairs // n, pairs % n
+
+
+def align_candidates(
+    proteins_df: pd.DataFrame,
+    k: int = K,
+    min_hits: int = MIN_HITS,
+    threshold: float = THRESHOLD,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Пары белков (nodeid_1, nodeid_2, identity) с идентичностью не ниже `threshold`.
+    Выравниваются только пары, прошедшие фильтр затравок и длин; строки
+    последовательностей адресуются плотным индексом, nodeid берется по нему же.
+    """
+    start = time.perf_counter()
+
+    proteins_df = proteins_df.dropna(subset=["nodeid", "content"]).drop_duplicates("nodeid")
+    nodeids = proteins_df["nodeid"].to_numpy(dtype=np.int64)
+    sequences = proteins_df["content"].astype(str).str.upper().tolist()
+
+    first, second = seed_candidates(sequences, k, min_hits)
+    seeds_time = time.perf_counter()
+    print(f"Seed candidates: {first.shape[0]} of {len(sequences) * (len(sequences) - 1) // 2} pairs, time: {seeds_time - start:.3f} s.")
+
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    passed = np.minimum(lengths[first], lengths[second]) >= threshold * np.maximum(lengths[first], lengths[second])
+    first, second = first[passed], second[passed]
+
+    scores = verify_candidates(sequences, first, second, max_workers)
+    keep = scores >= threshold
+
+    pairs_df = pd.DataFrame({
+        "nodeid_1": nodeids[first[keep]],
+        "nodeid_2": nodeids[second[keep]],
+        "identity": np.round(scores[keep], 4),
+    })
+
+    end = time.perf_counter()
+    print(f"Aligned {first.shape[0]} pairs, kept {pairs_df.shape[0]}, time: {end - seeds_time:.3f} s.")
+    return pairs_df
+
+
+def main(
+    source: str = SOURCE_PATH,
+    output: str = OUTPUT_PATH,
+    k: int = K,
+    min_hits: int = MIN_HITS,
+    threshold: float = THRESHOLD,
+    max_workers: Optional[int] = None,
+):
+    proteins_df = data_lake.read_df(source, ["nodeid", "content"])
+    pairs_df = align_candidates(proteins_df, k, min_hits, threshold, max_workers)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    pairs_df.to_csv(output, index=False)
+    print(f"proteins: {pairs_df.shape[0]} pairs -> {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="k-mer seed prefilter and alignment of protein pairs")
+    parser.add_argument("--source", default=SOURCE_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("-k", type=int, default=K)
+    parser.add_argument("--min-hits", type=int, default=MIN_HITS)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    main(args.source, args.output, args.k, args.min_hits, args.threshold, args.workers)
@@ -0,0 +1,345 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from scripts import data_lake
+
+dotenv.load_dotenv()
+
+
+# Источник сущностей (name, content) и файл пар для каждой метки. Пары пишутся
+# отдельно от внешних файлов сходства, которые читает rename_entities.rename_similarity,
+# и не перезаписывают их
+TARGETS = {
+    "dna": ("data/entities/db_dna.csv", "data/db_similarity/lsh/dna_similarity.csv"),
+    "rna": ("data/entities/db_rna.csv", "data/db_similarity/lsh/rna_similarity.csv"),
+    "protein": ("data/entities/neo4j_proteins.csv", "data/db_similarity/lsh/protein_similarity.csv"),
+}
+
+# Длина k-мера подобрана так, чтобы пары с идентичностью ~80% попадали
+# в кандидаты с вероятностью ~0.95 при 128 полосах по 2 строки,
+# а случайные пары последовательностей типичной длины - в единицах процентов
+KMER_SIZES = {"dna": 6, "rna": 6, "protein": 4}
+
+THRESHOLD = 0.8
+NUM_PERM = 256
+BANDS = 128
+SEED = 42
+CHUNK_SIZE = 2_000
+PAIRS_CHUNK_SIZE = 50_000
+# Корзина полосы размера s дает s * (s - 1) / 2 пар. Последовательности
+# дедуплицируются по content до LSH, поэтому большие корзины - это почти
+# одинаковые низкосложные последовательности; корзины крупнее лимита пропускаются
+MAX_BUCKET_SIZE = 1_000
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """Финализатор splitmix64: перемешивает биты uint64 (переполнение по модулю 2^64)."""
+    x = x.astype(np.uint64, copy=True)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def kmer_hashes(sequence: str, k: int) -> np.ndarray:
+    """Уникальные 64-битные хеши k-меров последовательности (вся строка, если она короче k)."""
+    codes = np.frombuffer(sequence.upper().encode("ascii", "replace"), dtype=np.uint8)
+    if codes.shape[0] < k:
+        k = max(codes.shape[0], 1)
+        codes = np.pad(codes, (0, k - codes.shape[0]))
+    powers = np.uint64(256) ** np.arange(k, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, k).astype(np.uint64)
+    return np.unique(_mix(windows @ powers))
+
+
+def permutations(num_perm: int, seed: int = SEED) -> tuple[np.ndarray, np.ndarray]:
+    """Коэффициенты хеш-функций вида a * x + b (mod 2^64) с нечетным a."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True)
+    return a, b
+
+
+def minhash_signatures(sequences: list[str], k: int, num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """Матрица MinHash-сигнатур (len(sequences), num_perm) для множеств k-меров."""
+    a, b = permutations(num_perm, seed)
+    signatures = np.empty((len(sequences), num_perm), dtype=np.uint64)
+    for i, sequence in enumerate(sequences):
+        shingles = kmer_hashes(sequence, k)
+        signatures[i] = (shingles[:, None] * a + b).min(axis=0)
+    return signatures
+
+
+def _signatures_chunk(args: tuple[list[str], int, int, int]) -> np.ndarray:
+    return minhash_signatures(*args)
+
+
+def parallel_signatures(
+    sequences: list[str],
+    k: int,
+    num_perm: int = NUM_PERM,
+    seed: int = SEED,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    chunks = [
+        (sequences[i:i + CHUNK_SIZE], k, num_perm, seed)
+        for i in range(0, len(sequences), CHUNK_SIZE)
+    ]
+    if not chunks:
+        return np.empty((0, num_perm), dtype=np.uint64)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return np.concatenate(list(executor.map(_signatures_chunk, chunks)))
+
+
+def _bucket_pairs(keys: np.ndarray, max_size: int = MAX_BUCKET_SIZE) -> tuple[np.ndarray, int]:
+    """
+    Все пары индексов (i < j) с одинаковым ключом полосы, как int64-ключи i * n + j,
+    и число пропущенных корзин крупнее `max_size`.
+    """
+    n = keys.shape[0]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+
+    pairs = []
+    # Корзины одного размера разворачиваются в пары одной операцией
+    for size in np.unique(sizes[(sizes > 1) & (sizes <= max_size)]):
+        group_starts = starts[sizes == size]
+        members = order[group_starts[:, None] + np.arange(size)]
+        first, second = np.triu_indices(size, 1)
+        left, right = members[:, first].ravel(), members[:, second].ravel()
+        low, high = np.minimum(left, right), np.maximum(left, right)
+        pairs.append(low.astype(np.int64) * n + high)
+    skipped = int((sizes > max_size).sum())
+    return (np.concatenate(pairs) if pairs else np.empty(0, dtype=np.int64)), skipped
+
+
+def lsh_candidates(
+    signatures: np.ndarray,
+    bands: int = BANDS,
+    max_bucket_size: int = MAX_BUCKET_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    LSH по полосам: сигнатура делится на `bands` полос по num_perm / bands строк,
+    пары, совпавшие хотя бы в одной полосе, становятся кандидатами.
+    Вероятность попасть в кандидаты для сходства Жаккара s: 1 - (1 - s^r)^b.
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+    rows = num_perm // bands
+    weights = _mix(np.arange(1, rows + 1, dtype=np.uint64)) | np.uint64(1)
+
+    band_pairs, skipped = [], 0
+    for band in range(bands):
+        pairs, band_skipped = _bucket_pairs(_mix(signatures[:, band * rows:(band + 1) * rows] @ weights), max_bucket_size)
+        band_pairs.append(pairs)
+        skipped += band_skipped
+    if skipped:
+        print(f"[!] {skipped} LSH buckets larger than {max_bucket_size} skipped")
+    candidates = np.unique(np.concatenate(band_pairs)) if band_pairs else np.empty(0, dtype=np.int64)
+    return candidates // max(n, 1), candidates % max(n, 1)
+
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Редакционное расстояние битово-параллельным алгоритмом Майерса (вариант Хюрё):
+    столбец матрицы DP хранится в битах целого Python, поэтому один символ
+    текста обрабатывается за несколько операций над len(b)-битными числами.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(b)
+    if m == 0:
+        return len(a)
+
+    peq: dict[str, int] = {}
+    for i, char in enumerate(b):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for char in a:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return score
+
+
+def identity(a: str, b: str) -> float:
+    """Глобальная идентичность 1 - d(a, b) / max(len(a), len(b))."""
+    length = max(len(a), len(b))
+    if length == 0:
+        return 1.0
+    return 1.0 - levenshtein(a, b) / length
+
+
+_worker_sequences: list[str] = []
+
+
+def _init_worker(sequences: list[str]) -> None:
+    global _worker_sequences
+    _worker_sequences = sequences
+
+
+def _verify_chunk(args: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    first, second = args
+    return np.fromiter(
+        (identity(_worker_sequences[i], _worker_sequences[j]) for i, j in zip(first.tolist(), second.tolist())),
+        dtype=np.float64,
+        count=first.shape[0],
+    )
+
+
+def verify_candidates(
+    sequences: list[str],
+    first: np.ndarray,
+    second: np.ndarray,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    """Точная идентичность для пар кандидатов, параллельно по процессам."""
+    chunks = [
+        (first[i:i + PAIRS_CHUNK_SIZE], second[i:i + PAIRS_CHUNK_SIZE])
+        for i in range(0, first.shape[0], PAIRS_CHUNK_SIZE)
+    ]
+    if not chunks:
+        return np.empty(0, dtype=np.float64)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(sequences,)) as executor:
+        return np.concatenate(list(executor.map(_verify_chunk, chunks)))
+
+
+def build_similarity(
+    entities_df: pd.DataFrame,
+    k: int,
+    threshold: float = THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+    seed: int = SEED,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Пары сущностей (name_1, content_1, name_2, content_2, score) с идентичностью
+    последовательностей не ниже `threshold`: MinHash-сигнатуры k-меров,
+    кандидаты через LSH, фильтр по длинам и точная проверка только кандидатов.
+    LSH и проверка идут по уникальным content, найденные пары content затем
+    разворачиваются на все пары имен; имена с одним content дают пары со score 1.
+    """
+    start = time.perf_counter()
+
+    entities_df = (
+        entities_df[["name", "content"]]
+        .dropna()
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    sequences = entities_df["content"].astype(str).str.upper()
+    # content_index - номер уникального content для каждой сущности
+    content_index, contents = pd.factorize(sequences)
+    contents = list(contents)
+
+    signatures = parallel_signatures(contents, k, num_perm, seed, max_workers)
+    signatures_time = time.perf_counter()
+    print(f"MinHash signatures: {signatures.shape} for {entities_df.shape[0]} entities, time: {signatures_time - start:.3f} s.")
+
+    first, second = lsh_candidates(signatures, bands)
+    # Идентичность не может быть выше отношения длин, такие пары не выравниваются
+    lengths = np.array([len(content) for content in contents])
+    length_ratio = np.minimum(lengths[first], lengths[second]) / np.maximum(np.maximum(lengths[first], lengths[second]), 1)
+    passed = length_ratio >= threshold
+    print(f"LSH candidates: {first.shape[0]}, after length filter: {int(passed.sum())}")
+    first, second = first[passed], second[passed]
+
+    scores = verify_candidates(contents, first, second, max_workers)
+    keep = scores >= threshold
+    first, second, scores = first[keep], second[keep], scores[keep]
+
+    # Пары content -> пары сущностей: пары внутри одного content и декартовы
+    # произведения имен двух content
+    order = np.argsort(content_index, kind="stable")
+    bounds = np.searchsorted(content_index[order], np.arange(len(contents) + 1))
+    left, right, pair_scores = [], [], []
+    for members in (order[bounds[i]:bounds[i + 1]] for i in np.flatnonzero(np.diff(bounds) > 1)):
+        a, b = np.triu_indices(members.shape[0], 1)
+        left.append(members[a])
+        right.append(members[b])
+        pair_scores.append(np.ones(a.shape[0]))
+    counts = np.diff(bounds)
+    single = (counts[first] == 1) & (counts[second] == 1)
+    left.append(order[bounds[first[single]]])
+    right.append(order[bounds[second[single]]])
+    pair_scores.append(scores[single])
+    for i, j, score in zip(first[~single].tolist(), second[~single].tolist(), scores[~single].tolist()):
+        a, b = order[bounds[i]:bounds[i + 1]], order[bounds[j]:bounds[j + 1]]
+        left.append(np.repeat(a, b.shape[0]))
+        right.append(np.tile(b, a.shape[0]))
+        pair_scores.append(np.full(a.shape[0] * b.shape[0], score))
+    left, right, pair_scores = np.concatenate(left), np.concatenate(right), np.concatenate(pair_scores)
+
+    similarity_df = pd.DataFrame({
+        "name_1": entities_df["name"].to_numpy()[left],
+        "content_1": entities_df["content"].to_numpy()[left],
+        "name_2": entities_df["name"].to_numpy()[right],
+        "content_2": entities_df["content"].to_numpy()[right],
+        "score": np.round(pair_scores, 4),
+    })
+
+    end = time.perf_counter()
+    print(f"Verified pairs: {first.shape[0]} contents, {similarity_df.shape[0]} entities, time: {end - signatures_time:.3f} s.")
+    return similarity_df
+
+
+def main(
+    labels: list[str],
+    threshold: float = THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+    max_workers: Optional[int] = None,
+):
+    for label in labels:
+        start = time.perf_counter()
+        source, output = TARGETS[label]
+        entities_df = data_lake.read_df(source, ["name", "content"])
+        similarity_df = build_similarity(
+            entities_df,
+            KMER_SIZES[label],
+            threshold=threshold,
+            num_perm=num_perm,
+            bands=bands,
+            max_workers=max_workers,
+        )
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        similarity_df.to_csv(output, index=False)
+        print(f"{label}: {similarity_df.shape[0]} pairs -> {output}, total time: {time.perf_counter() - start:.3f} s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequence similarity pairs via MinHash LSH")
+    parser.add_argument("--labels", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    main(args.labels, args.threshold, args.num_perm, args.bands, args.workers)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from scripts import data_lake
+from scripts.rename_entities import canonicalize_similarity_df
+
+dotenv.load_dotenv()
+
+
+SOURCE_PATH = "data/entities/neo4j_small_molecules.csv"
+FINGERPRINTS_PATH = "data/fingerprints/small_molecule"
+# Файл, который similarity.upload_small_molecules_similarity загружает как has_similarity {tanimoto};
+# отдельный от small_molecule_similarity.csv, который пишет rename_entities.rename_similarity
+OUTPUT_PATH = "data/db_similarity/hashed/small_molecule_tanimoto.csv"
+
+RADIUS = 2
+N_BITS = 2048
+THRESHOLD = 0.7
+TOP_K = 20
+BLOCK_SIZE = 256
+CHUNK_SIZE = 10_000
+
+
+def _fingerprints_chunk(args: tuple[list[str], int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Morgan-отпечатки для куска SMILES, упакованные в uint64 (n, n_bits / 64)."""
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import rdFingerprintGenerator
+
+    RDLogger.DisableLog("rdApp.*")
+
+    smiles, radius, n_bits = args
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+    packed = np.zeros((len(smiles), n_bits // 64), dtype=np.uint64)
+    valid = np.zeros(len(smiles), dtype=bool)
+    for i, value in enumerate(smiles):
+        mol = Chem.MolFromSmiles(value) if isinstance(value, str) else None
+        if mol is None:
+            continue
+        bits = generator.GetFingerprintAsNumPy(mol).astype(np.uint8)
+        packed[i] = np.packbits(bits, bitorder="little").view(np.uint64)
+        valid[i] = True
+    return packed, valid
+
+
+def build_fingerprints(
+    source: str = SOURCE_PATH,
+    path: str = FINGERPRINTS_PATH,
+    radius: int = RADIUS,
+    n_bits: int = N_BITS,
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Считает отпечатки один раз и сохраняет их в memory-mapped `fingerprints.npy`
+    вместе с `nodeids.npy` и `counts.npy`. Строки отсортированы по числу
+    единичных битов, чтобы при поиске отсекать заведомо далекие блоки.
+    """
+    if n_bits % 64:
+        raise ValueError(f"n_bits must be a multiple of 64, got {n_bits}")
+    start = time.perf_counter()
+
+    molecules_df = data_lake.read_df(source, ["nodeid", "content"]).dropna()
+    smiles = molecules_df["content"].tolist()
+    chunks = [(smiles[i:i + CHUNK_SIZE], radius, n_bits) for i in range(0, len(smiles), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_fingerprints_chunk, chunks))
+    packed = np.concatenate([r[0] for r in results]) if results else np.empty((0, n_bits // 64), dtype=np.uint64)
+    valid = np.concatenate([r[1] for r in results]) if results else np.empty(0, dtype=bool)
+
+    packed = packed[valid]
+    nodeids = molecules_df["nodeid"].to_numpy(dtype=np.int64)[valid]
+    counts = np.bitwise_count(packed).sum(axis=1, dtype=np.int32)
+    order = np.argsort(counts, kind="stable")
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    fingerprints = np.lib.format.open_memmap(path / "fingerprints.npy", mode="w+", dtype=np.uint64, shape=packed.shape)
+    fingerprints[:] = packed[order]
+    fingerprints.flush()
+    np.save(path / "nodeids.npy", nodeids[order])
+    np.save(path / "counts.npy", counts[order])
+    with open(path / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"source": source, "radius": radius, "n_bits": n_bits, "size": int(valid.sum())}, f)
+
+    end = time.perf_counter()
+    print(f"Fingerprints: {int(valid.sum())}/{valid.shape[0]} valid molecules -> {path}, time: {end - start:.3f} s.")
+
+
+def load_fingerprints(path: str = FINGERPRINTS_PATH) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    path = Path(path)
+    if not (path / "meta.json").exists():
+        raise FileNotFoundError(
+            f"fingerprints not found in {path}, build them with `python -m scripts.similarity.tanimoto --build`"
+        )
+    return (
+        np.load(path / "fingerprints.npy", mmap_mode="r"),
+        np.load(path / "nodeids.npy"),
+        np.load(path / "counts.npy"),
+    )
+
+
+def tanimoto_block(
+    rows: np.ndarray,
+    row_counts: np.ndarray,
+    cols: np.ndarray,
+    col_counts: np.ndarray,
+) -> np.ndarray:
+    """Матрица Танимото |a & b| / (|a| + |b| - |a & b|) для двух блоков упакованных отпечатков."""
+    intersection = np.bitwise_count(rows[:, None, :] & cols[None, :, :]).sum(axis=2, dtype=np.int32)
+    union = row_counts[:, None] + col_counts[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros(union.shape, dtype=np.float32), where=union > 0)
+
+
+def _merge_top_k(
+    best_scores: np.ndarray,
+    best_cols: np.ndarray,
+    scores: np.ndarray,
+    cols: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Сливает текущие top-k каждой строки с новым блоком (argpartition вместо кучи по строкам)."""
+    all_scores = np.concatenate([best_scores, scores], axis=1)
+    all_cols = np.concatenate([best_cols, np.broadcast_to(cols, scores.shape)], axis=1)
+    top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(all_scores, top, axis=1), np.take_along_axis(all_cols, top, axis=1)
+
+
+def _search_rows(args: tuple[str, int, int, int, float, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    path, start, stop, k, threshold, block_size = args
+    fingerprints, _, counts = load_fingerprints(path)
+
+    rows = np.asarray(fingerprints[start:stop])
+    row_counts = counts[start:stop]
+    best_scores = np.full((stop - start, k), -1.0, dtype=np.float32)
+    best_cols = np.full((stop - start, k), -1, dtype=np.int64)
+
+    # Танимото не больше min(|a|, |b|) / max(|a|, |b|), поэтому по отсортированным
+    # числам битов сравниваются только столбцы из окна [t * min, max / t]
+    low = np.searchsorted(counts, np.ceil(threshold * row_counts.min()), side="left")
+    high = np.searchsorted(counts, np.floor(row_counts.max() / threshold) if threshold > 0 else counts[-1], side="right")
+    for col_start in range(low, high, block_size):
+        col_stop = min(col_start + block_size, high)
+        scores = tanimoto_block(rows, row_counts, np.asarray(fingerprints[col_start:col_stop]), counts[col_start:col_stop])
+        cols = np.arange(col_start, col_stop)
+        scores[(np.arange(start, stop)[:, None] == cols[None, :])] = -1.0
+        scores[scores < threshold] = -1.0
+        best_scores, best_cols = _merge_top_k(best_scores, best_cols, scores, cols, k)
+
+    found = best_scores >= threshold
+    sources = np.broadcast_to(np.arange(start, stop)[:, None], found.shape)
+    return sources[found], best_cols[found], best_scores[found]
+
+
+def top_k_similarity(
+    path: str = FINGERPRINTS_PATH,
+    k: int = TOP_K,
+    threshold: float = THRESHOLD,
+    block_size: int = BLOCK_SIZE,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Для каждой молекулы до `k` ближайших соседей с Танимото >= `threshold`.
+    Строки делятся на блоки между процессами, каждый процесс открывает
+    отпечатки через memmap и считает popcount блоками.
+    Возвращает неориентированные пары (nodeid_1 < nodeid_2, score).
+    """
+    start = time.perf_counter()
+
+    _, nodeids, _ = load_fingerprints(path)
+    n = nodeids.shape[0]
+    tasks = [
+        (path, row_start, min(row_start + block_size, n), k, threshold, block_size)
+        for row_start in range(0, n, block_size)
+    ]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_search_rows, tasks))
+
+    sources = np.concatenate([r[0] for r in results]) if results else np.empty(0, dtype=np.int64)
+    targets = np.concatenate([r[1] for r in results]) if results else np.empty(0, dtype=np.int64)
+    scores = np.concatenate([r[2] for r in results]) if results else np.empty(0, dtype=np.float32)
+
+    similarity_df = canonicalize_similarity_df(pd.DataFrame({
+        "nodeid_1": nodeids[sources],
+        "nodeid_2": nodeids[targets],
+        "score": np.round(scores.astype(np.float64), 4),
+    }))
+
+    end = time.perf_counter()
+    print(f"Tanimoto top-{k} (>= {threshold}): {similarity_df.shape[0]} pairs for {n} molecules, time: {end - start:.3f} s.")
+    return similarity_df
+
+
+def main(
+    build: bool = False,
+    k: int = TOP_K,
+    threshold: float = THRESHOLD,
+    output: str = OUTPUT_PATH,
+    max_workers: Optional[int] = None,
+):
+    if build or not (Path(FINGERPRINTS_PATH) / "meta.json").exists():
+        build_fingerprints(max_workers=max_workers)
+    similarity_df = top_k_similarity(k=k, threshold=threshold, max_workers=max_workers)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    similarity_df.to_csv(output, index=False)
+    print(f"small molecules: {similarity_df.shape[0]} pairs -> {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Small molecule Tanimoto similarity on packed Morgan fingerprints")
+    parser.add_argument("--build", action="store_true", help="recompute fingerprints")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    main(args.build, args.top_k, args.threshold, args.output, args.workers)
@@ -0,0 +1,158 @@
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from neo4j import ResultSummary
+
+
+REPORT_DIR = "results/ingestion"
+
+COUNTER_FIELDS = [
+    "nodes_created",
+    "nodes_deleted",
+    "relationships_created",
+    "relationships_deleted",
+    "properties_set",
+    "labels_added",
+    "indexes_added",
+    "constraints_added",
+]
+
+REPORT_FIELDS = [
+    "phase",
+    "batch",
+    "rows",
+    "elapsed_s",
+    "server_available_ms",
+    "server_consumed_ms",
+    "rows_per_s",
+    "updates_per_s",
+    *COUNTER_FIELDS,
+]
+
+
+class IngestionTelemetry:
+    """
+    Собирает статистику загрузки в neo4j по `ResultSummary`:
+    счетчики созданных узлов/связей, серверное время выполнения,
+    клиентскую задержку и пропускную способность каждого запроса или пачки.
+    Отчет за запуск пишется в `REPORT_DIR` в формате JSON и CSV.
+
+    Загрузка через LOAD CSV с CALL {} IN TRANSACTIONS - один запрос и одна
+    запись в отчете: задержки отдельных пачек внутри него не видны.
+    Их дает только загрузка пачками через `DBDriver.execute_many`.
+    """
+    def __init__(self, run_name: str, report_dir: str = REPORT_DIR) -> None:
+        self.run_name = run_name
+        self.run_id = time.strftime("%Y%m%d_%H%M%S")
+        self.report_dir = Path(report_dir)
+        self.records: list[dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    def record(
+        self,
+        phase: str,
+        summary: ResultSummary,
+        elapsed: float,
+        rows: Optional[int] = None,
+        batch: Optional[int] = None,
+    ) -> dict[str, Any]:
+        counters = summary.counters
+        item = {
+            "phase": phase,
+            "batch": batch,
+            "rows": rows,
+            "elapsed_s": round(elapsed, 6),
+            "server_available_ms": summary.result_available_after,
+            "server_consumed_ms": summary.result_consumed_after,
+            **{field: getattr(counters, field) for field in COUNTER_FIELDS},
+        }
+        updates = item["nodes_created"] + item["relationships_created"]
+        item["rows_per_s"] = round(rows / elapsed, 2) if rows and elapsed > 0 else None
+        item["updates_per_s"] = round(updates / elapsed, 2) if elapsed > 0 else None
+        self.records.append(item)
+        return item
+
+    def run(
+        self,
+        session,
+        query: str,
+        phase: str,
+        params: Optional[dict[str, Any]] = None,
+        rows: Optional[int] = None,
+    ) -> ResultSummary:
+        """
+        Выполняет запрос в сессии до конца и записывает его статистику.
+        Если `rows` не передан, а запрос возвращает одну колонку `rows`
+        (загрузки через LOAD CSV заканчиваются `RETURN count(*) AS rows`
+        после CALL {} IN TRANSACTIONS), число строк берется из нее.
+        """
+        start = time.perf_counter()
+        result = session.run(query, params)
+        if rows is None and result.keys() == ["rows"]:
+            rows = result.single()["rows"]
+        summary = result.consume()
+        self.record(phase, summary, time.perf_counter() - start, rows=rows)
+        return summary
+
+    def phases(self) -> list[dict[str, Any]]:
+        """Агрегирует записи по фазам: суммы счетчиков и перцентили задержки пачек."""
+        grouped: dict[str, list[dict[str, Any]]] = {}
+        for item in self.records:
+            grouped.setdefault(item["phase"], []).append(item)
+
+        result = []
+        for phase, items in grouped.items():
+            latencies = sorted(item["elapsed_s"] for item in items)
+            elapsed = sum(latencies)
+            rows = sum(item["rows"] or 0 for item in items)
+            totals = {field: sum(item[field] for item in items) for field in COUNTER_FIELDS}
+            updates = totals["nodes_created"] + totals["relationships_created"]
+            result.append({
+                "phase": phase,
+                "batches": len(items),
+                "rows": rows,
+                "elapsed_s": round(elapsed, 6),
+                "latency_p50_s": latencies[len(latencies) // 2],
+                "latency_max_s": latencies[-1],
+                "rows_per_s": round(rows / elapsed, 2) if rows and elapsed > 0 else None,
+                "updates_per_s": round(updates / elapsed, 2) if elapsed > 0 else None,
+                **totals,
+            })
+        return result
+
+    def write_report(self) -> Path:
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.report_dir / f"{self.run_name}_{self.run_id}"
+
+        report = {
+            "run_name": self.run_name,
+            "run_id": self.run_id,
+            "total_s": round(time.perf_counter() - self._started, 3),
+            "phases": self.phases(),
+            "batches": self.records,
+        }
+        json_path = stem.with_suffix(".json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+        with open(stem.with_suffix(".csv"), "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        for phase in report["phases"]:
+            print(
+                f"  [{phase['phase']}] {phase['elapsed_s']:.3f} s, "
+                f"rows {phase['rows']}, "
+                f"nodes +{phase['nodes_created']}, "
+                f"relationships +{phase['relationships_created']}, "
+                f"properties {phase['properties_set']}"
+            )
+        print(f"Ingestion report saved to {json_path}")
+        return json_path
+
+
+__all__ = ["IngestionTelemetry"]
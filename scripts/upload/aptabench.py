@@ -3,6 +3,8 @@ import dotenv
 import asyncio
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+
 dotenv.load_dotenv()
 
 
@@ -13,6 +15,8 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("aptabench")
+
 
 async def upload_dna_aptamers():
     """Загрузка DNA аптамеров из aptabench_dna_final.csv"""
@@ -24,9 +28,10 @@ async def upload_dna_aptamers():
                 content: row.content
                 })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "dna_aptamers")
     print("✓ DNA аптамеры загружены")
 
 
@@ -40,9 +45,10 @@ async def upload_rna_aptamers():
                 content: row.content
                 })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "rna_aptamers")
     print("✓ RNA аптамеры загружены")
 
 
@@ -56,9 +62,10 @@ async def upload_small_molecules():
                 content: row.content
                 })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "small_molecules")
     print("✓ Малые молекулы загружены")
 
 
@@ -78,9 +85,10 @@ def upload_interactions():
                   source: row.source
               }]-(s)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "dna_interactions")
     print("✓ DNA-молекула взаимодействия загружены")
 
     query = """
@@ -97,9 +105,10 @@ def upload_interactions():
                   source: row.source
               }]-(s)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "rna_interactions")
     print("✓ RNA-молекула взаимодействия загружены")
 
 
@@ -124,6 +133,7 @@ async def main():
     print("\n" + "=" * 60)
     print("Загрузка завершена успешно!")
     print("=" * 60)
+    telemetry.write_report()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,8 @@ import dotenv
 import asyncio
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+
 dotenv.load_dotenv()
 
 
@@ -13,6 +15,8 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("aptamer_dna_mol")
+
 
 async def upload_rna():
     query = """
@@ -23,9 +27,10 @@ async def upload_rna():
                 content: row.content
                 })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "rna")
 
 
 async def upload_molecules():
@@ -37,9 +42,10 @@ async def upload_molecules():
                 content: row.content
                 })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "molecules")
 
 
 def upload_interactions():
@@ -50,9 +56,10 @@ def upload_interactions():
               (s:small_molecule {name: row.target_name, content: row.target_seq})
               MERGE (d)-[:interacts_with]-(s)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "interactions")
 
 
 async def main():
@@ -65,6 +72,8 @@ async def main():
 
     upload_interactions()
 
+    telemetry.write_report()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
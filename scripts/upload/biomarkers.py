@@ -1,9 +1,12 @@
 import os
 import dotenv
 import asyncio
-import pandas as pd
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+from scripts import data_lake
+from scripts.entity_registry import load_registry
+
 dotenv.load_dotenv()
 
 
@@ -14,6 +17,8 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("biomarkers")
+
 
 def prepare_protein_condition_with_nodeids():
     """
@@ -22,15 +27,14 @@ def prepare_protein_condition_with_nodeids():
     print("Подготовка protein_condition с nodeid...")
     
     # Загружаем данные
-    protein_condition = pd.read_csv("data/biomarkers/protein_condition.csv")
-    protein_ids = pd.read_csv("data/protein_ids.csv")
-    
-    # Объединяем по name и content
-    merged = protein_condition.merge(
-        protein_ids[['nodeid', 'name', 'content']],
-        on=['name', 'content'],
-        how='inner'
+    protein_condition = data_lake.read_df(
+        "data/biomarkers/protein_condition.csv",
+        columns=['name', 'content', 'conditions', 'indication_types', 'sex', 'biofluid'],
     )
+    registry = load_registry()
+    
+    # Сопоставляем с nodeid по name и content через реестр сущностей
+    merged = registry.resolve_df(protein_condition, "protein", "name", "content", "nodeid")
     
     # Фильтруем только строки с валидным content
     merged = merged[merged['content'].notna()]
@@ -53,15 +57,14 @@ def prepare_chemical_condition_with_nodeids():
     print("Подготовка chemical_condition с nodeid...")
     
     # Загружаем данные
-    chemical_condition = pd.read_csv("data/biomarkers/chemical_condition.csv")
-    small_molecules_ids = pd.read_csv("data/small_molecules_nodeids.csv")
-    
-    # Объединяем по name и content
-    merged = chemical_condition.merge(
-        small_molecules_ids[['nodeid', 'name', 'content']],
-        on=['name', 'content'],
-        how='inner'
+    chemical_condition = data_lake.read_df(
+        "data/biomarkers/chemical_condition.csv",
+        columns=['name', 'content', 'conditions', 'indication_types', 'sex', 'biofluid'],
     )
+    registry = load_registry()
+    
+    # Сопоставляем с nodeid по name и content через реестр сущностей
+    merged = registry.resolve_df(chemical_condition, "small_molecule", "name", "content", "nodeid")
     
     # Фильтруем только строки с валидным content
     merged = merged[merged['content'].notna()]
@@ -84,15 +87,14 @@ def prepare_protein_condition_nci_with_nodeids():
     print("Подготовка protein_condition_nci_db с nodeid...")
     
     # Загружаем данные
-    protein_condition_nci = pd.read_csv("data/biomarkers/protein_condition_nci_db.csv")
-    protein_ids = pd.read_csv("data/protein_ids.csv")
-    
-    # Объединяем по name и content
-    merged = protein_condition_nci.merge(
-        protein_ids[['nodeid', 'name', 'content']],
-        on=['name', 'content'],
-        how='inner'
+    protein_condition_nci = data_lake.read_df(
+        "data/biomarkers/protein_condition_nci_db.csv",
+        columns=['name', 'content', 'conditions'],
     )
+    registry = load_registry()
+    
+    # Сопоставляем с nodeid по name и content через реестр сущностей
+    merged = registry.resolve_df(protein_condition_nci, "protein", "name", "content", "nodeid")
     
     # Фильтруем только строки с валидным content
     merged = merged[merged['content'].notna()]
@@ -123,9 +125,10 @@ async def upload_protein_biomarkers():
               })
               SET p.uniprot_id = row.uniprot_id
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "protein_biomarkers")
     
     print("Загружены белки-биомаркеры")
 
@@ -145,9 +148,10 @@ async def upload_chemical_biomarkers():
               })
               SET m.hmdb_id = row.hmdb_id
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "chemical_biomarkers")
     
     print("Загружены химические биомаркеры")
 
@@ -164,9 +168,10 @@ async def upload_conditions():
                 name: row.conditions
               })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "conditions")
     
     print("Загружены условия (conditions)")
 
@@ -189,9 +194,10 @@ def upload_protein_condition_relations():
                 biofluid: coalesce(row.biofluid, 'NaN')
               }]->(c)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "protein_condition_relations")
     
     print("Загружены связи белок-условие")
 
@@ -214,9 +220,10 @@ def upload_chemical_condition_relations():
                 biofluid: coalesce(row.biofluid, 'NaN')
               }]->(c)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "chemical_condition_relations")
     
     print("Загружены связи химикат-условие")
 
@@ -235,9 +242,10 @@ async def upload_proteins_nci_db():
                 content: row.content
               })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "proteins_nci_db")
     
     print("Загружены белки из NCI DB")
 
@@ -254,9 +262,10 @@ async def upload_conditions_nci_db():
                 name: row.conditions
               })
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "conditions_nci_db")
     
     print("Загружены условия из NCI DB")
 
@@ -273,9 +282,10 @@ def upload_protein_condition_nci_db_relations():
               MATCH (c:condition {name: row.conditions})
               MERGE (p)-[:biomarker_for]->(c)
           } IN TRANSACTIONS OF 1000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "protein_condition_nci_db_relations")
     
     print("Загружены связи белок-условие из NCI DB")
 
@@ -311,6 +321,7 @@ async def main():
     upload_protein_condition_nci_db_relations()
     
     print("\n=== Загрузка завершена успешно! ===")
+    telemetry.write_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+import os
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import dotenv
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scripts.db_driver import DBDriver
+from scripts.telemetry import IngestionTelemetry
+from scripts.get_predicted_links import RESULT_PATH
+from src.db.models import EdgeBatch
+
+dotenv.load_dotenv()
+
+
+REL_TYPE = "predicted_interacts_with"
+# nodeid в data/link_prediction - внутренний id узла, как и в остальных загрузках:
+# поиск по id(a) - это seek без скана метки и без передачи content в `$rows`.
+# Для поиска концов по свойству нужно указать его имя (и индекс на нем)
+ID_KEY = None
+PARTITIONS = 4
+BATCH_SIZE = 10_000
+DELETE_CHUNK = 10_000
+CHUNK_SIZE = 1_000_000
+
+# Результаты get_predicted_links по моделям: (метка источника, метка цели, колонки пары)
+RELATIONS = {
+    "rna_sm": ("rna", "small_molecule", ["nodeid_rna", "nodeid_sm"]),
+    "rna_rna": ("rna", "rna", ["nodeid_1", "nodeid_2"]),
+    "prot_prot": ("protein", "protein", ["nodeid_1", "nodeid_2"]),
+    "prot_dna": ("protein", "dna", ["nodeid_protein", "nodeid_dna"]),
+}
+
+INDEX_QUERY = f"""
+CREATE INDEX predicted_links_run IF NOT EXISTS
+FOR ()-[r:{REL_TYPE}]-() ON (r.model, r.run_id)
+"""
+
+DELETE_QUERY = f"""
+MATCH ()-[r:{REL_TYPE}]->()
+WHERE r.model = $model AND r.run_id = $run_id
+CALL(r) {{
+    DELETE r
+}} IN TRANSACTIONS OF {DELETE_CHUNK} ROWS
+RETURN count(*) AS rows
+"""
+
+telemetry = IngestionTelemetry("predicted_links")
+
+
+def select_predictions(
+    path: str,
+    columns: list[str],
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Читает предсказания (колонки пары и `result`) кусками и отдает пары
+    со скором не ниже `threshold` и/или `top_k` лучших на узел-источник.
+    Без `top_k` куски отдаются по мере чтения. Для top-K между кусками
+    держится только текущий лучший набор, поэтому память O(узлов * K),
+    а не O(пар); он отдается одним куском в конце.
+    """
+    source, target = columns
+    selected = None
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=[source, target, "result"]):
+        chunk = batch.to_pandas()
+        if threshold is not None:
+            chunk = chunk[chunk["result"] >= threshold]
+        if top_k is None:
+            if not chunk.empty:
+                yield chunk.reset_index(drop=True)
+            continue
+        chunk = pd.concat([selected, chunk], ignore_index=True) if selected is not None else chunk
+        chunk = chunk.sort_values([source, "result"], ascending=[True, False], kind="stable")
+        selected = chunk[chunk.groupby(source, sort=False).cumcount().to_numpy() < top_k]
+    if selected is not None and not selected.empty:
+        yield selected.reset_index(drop=True)
+
+
+def default_run_id(model: str, path: str) -> str:
+    """
+    Идентификатор запуска по модели и содержимому файла предсказаний:
+    повторная загрузка того же файла получает тот же run_id и заменяет свои связи.
+    """
+    digest = hashlib.sha256(model.encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"{model}_{digest.hexdigest()[:16]}"
+
+
+def partition_edges(edges_df: pd.DataFrame, source: str, partitions: int) -> list[pd.DataFrame]:
+    """
+    Делит связи на части по узлу-источнику: связи одного источника пишутся
+    одной транзакцией, так параллельные части реже ждут блокировок узлов.
+    """
+    part = edges_df[source].to_numpy() % partitions
+    return [edges_df[part == i] for i in range(partitions) if (part == i).any()]
+
+
+def delete_run(db: DBDriver, model: str, run_id: str) -> None:
+    """Удаляет связи одного запуска модели пачками по DELETE_CHUNK во вложенных транзакциях."""
+    db.execute(INDEX_QUERY, telemetry=telemetry, phase="index")
+    db.execute(DELETE_QUERY, {"model": model, "run_id": run_id}, telemetry=telemetry, phase=f"{model}_delete")
+
+
+def upload_predictions(
+    db: DBDriver,
+    model: str,
+    run_id: Optional[str] = None,
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    partitions: int = PARTITIONS,
+    batch_size: int = BATCH_SIZE,
+    replace: bool = True,
+) -> int:
+    """
+    Загружает предсказания модели `model` из RESULT_PATH/<model>.parquet
+    как связи predicted_interacts_with {score, model, run_id}.
+    Без `run_id` берется default_run_id. При `replace` связи того же
+    запуска сначала удаляются, поэтому повторная загрузка запуска
+    не дает дубликатов. Отобранные куски делятся на части по источнику,
+    части пишутся параллельно через UNWIND пачками по `batch_size`.
+    """
+    start = time.perf_counter()
+
+    source_label, target_label, columns = RELATIONS[model]
+    path = RESULT_PATH + f"{model}.parquet"
+    run_id = run_id or default_run_id(model, path)
+
+    if replace:
+        delete_run(db, model, run_id)
+
+    def write(part_df: pd.DataFrame) -> int:
+        batch = EdgeBatch.from_df(
+            part_df, REL_TYPE, source_label, target_label,
+            source_column=columns[0], target_column=columns[1], id_key=ID_KEY,
+        )
+        return db.execute_many(
+            batch.compose_create_query(), batch.iter_rows(batch_size),
+            batch_size=batch_size, telemetry=telemetry, phase=f"{model}_create",
+        )
+
+    selected = total = 0
+    with ThreadPoolExecutor(max_workers=partitions) as executor:
+        for edges_df in select_predictions(path, columns, threshold, top_k):
+            edges_df = edges_df.rename(columns={"result": "score"})
+            edges_df["model"] = model
+            edges_df["run_id"] = run_id
+            selected += edges_df.shape[0]
+            total += sum(executor.map(write, partition_edges(edges_df, columns[0], partitions)))
+
+    end = time.perf_counter()
+    print(f"{model}: {selected} predicted links selected (threshold={threshold}, top_k={top_k})")
+    print(f"{model}: uploaded {total} predicted links, run {run_id}, time: {end - start:.3f} s.")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload link predictions into Neo4j as scored predicted edges")
+    parser.add_argument("models", nargs="*", default=[m for m in RELATIONS if os.path.exists(RESULT_PATH + f"{m}.parquet")])
+    parser.add_argument("--run-id", default=None, help="default: model name + hash of its prediction file")
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--delete", action="store_true", help="only delete the run's predicted links")
+    args = parser.parse_args()
+
+    with DBDriver(os.environ["NEO4J_URL"], os.environ["NEO4J_USER"], os.environ["NEO4J_PASSWORD"]) as db:
+        for model in args.models:
+            if args.delete:
+                delete_run(db, model, args.run_id or default_run_id(model, RESULT_PATH + f"{model}.parquet"))
+            else:
+                upload_predictions(db, model, args.run_id, args.threshold, args.top_k, args.partitions, args.batch_size)
+    telemetry.write_report()
+
+
+if __name__ == "__main__":
+    main()
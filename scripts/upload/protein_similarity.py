@@ -3,6 +3,11 @@ import dotenv
 import pandas as pd
 from neo4j import GraphDatabase
 
+from scripts import data_lake
+from scripts.telemetry import IngestionTelemetry
+from scripts.entity_registry import load_registry
+from scripts.rename_entities import canonicalize_similarity_df
+
 dotenv.load_dotenv()
 
 
@@ -13,48 +18,48 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("protein_similarity")
+
+ALIGNED_NODEIDS_PATH = "data/aligned_pairs_nodeids.csv"
+# Пары с высоким скором готовятся вне репозитория из protein_similarity_nodeids.csv,
+# порядок и уникальность пар в них не гарантированы: загружается канонизированная копия
+HIGH_SCORE_PATH = "protein_similarity_nodeids_high_score.csv"
+UPLOAD_PATH = "protein_similarity_nodeids_high_score_canonical.csv"
+
 
 def prepare_data():
     """
-    Объединяет aligned_pairs.csv с protein_ids.csv для получения node IDs.
+    Готовит пары белков со сходством с node IDs.
     
     Структура файлов:
-    - aligned_pairs.csv: name_1, sequence_1, name_2, sequence_2, identity
-    - protein_ids.csv: nodeid, content, name
+    - aligned_pairs_nodeids.csv: nodeid_1, nodeid_2, identity - результат
+      similarity/kmer_prefilter.py, выравнивались только пары с общими затравками
+    - aligned_pairs.csv: name_1, sequence_1, name_2, sequence_2, identity - внешняя
+      таблица всех пар, используется, если первого файла нет
+    - реестр строится из protein_ids.csv (nodeid, content, name)
     
-    Мержим по двум колонкам (name И sequence) для точного совпадения.
+    Пары из префильтра уже содержат nodeid, поэтому соединение по строкам
+    последовательностей не нужно. Для внешней таблицы ключ реестра считается
+    по паре (name, sequence), совпадение точное, а соединение идет
+    по целочисленным ключам.
     """
-    # Загружаем данные о парах выровненных белков
-    aligned_pairs = pd.read_csv("data/aligned_pairs.csv")
-    print(f"Загружено {len(aligned_pairs)} пар выровненных белков")
-    
-    # Загружаем соответствие protein_name + sequence -> nodeid
-    protein_ids = pd.read_csv("data/protein_ids.csv")
-    print(f"Загружено {len(protein_ids)} белков с nodeid")
+    if os.path.exists(ALIGNED_NODEIDS_PATH):
+        merged = data_lake.read_df(ALIGNED_NODEIDS_PATH, ["nodeid_1", "nodeid_2", "identity"])
+        print(f"Загружено {len(merged)} пар белков после k-mer префильтра")
+    else:
+        # Загружаем данные о парах выровненных белков
+        aligned_pairs = pd.read_csv("data/aligned_pairs.csv")
+        print(f"Загружено {len(aligned_pairs)} пар выровненных белков")
+        
+        registry = load_registry()
+        print(f"Реестр сущностей: {registry.size} записей")
+        
+        # Сопоставляем первый (name_1 + sequence_1) и второй (name_2 + sequence_2) белок
+        merged = registry.resolve_df(aligned_pairs, "protein", "name_1", "sequence_1", "nodeid_1")
+        merged = registry.resolve_df(merged, "protein", "name_2", "sequence_2", "nodeid_2")
     
-    # Объединяем для первого белка (name_1 + sequence_1)
-    merged = aligned_pairs.merge(
-        protein_ids,
-        left_on=['name_1', 'sequence_1'],
-        right_on=['name', 'content'],
-        how='inner'
-    )
-    merged = merged.rename(columns={'nodeid': 'nodeid_1'})
-    merged = merged.drop(columns=['name', 'content'])
-    
-    # Объединяем для второго белка (name_2 + sequence_2)
-    merged = merged.merge(
-        protein_ids,
-        left_on=['name_2', 'sequence_2'],
-        right_on=['name', 'content'],
-        how='inner',
-        suffixes=('', '_2')
-    )
-    merged = merged.rename(columns={'nodeid': 'nodeid_2'})
-    merged = merged.drop(columns=['name', 'content'])
-    
-    # Выбираем только необходимые колонки: nodeid_1, nodeid_2, identity
-    result = merged[['nodeid_1', 'nodeid_2', 'identity']].copy()
+    # Оставляем одну пару (min, max) без петель с максимальным identity
+    result = canonicalize_similarity_df(merged, score_col='identity')
     
     # Сохраняем результат для загрузки в Neo4j
     output_path = "protein_similarity_nodeids.csv"
@@ -66,21 +71,38 @@ def prepare_data():
     return output_path
 
 
+def prepare_upload(path=HIGH_SCORE_PATH, output_path=UPLOAD_PATH):
+    """
+    Канонизирует файл, который загружается в Neo4j: пары (min, max)
+    без петель и повторов с максимальным identity.
+    """
+    pairs = pd.read_csv(path, usecols=["nodeid_1", "nodeid_2", "identity"])
+    result = canonicalize_similarity_df(pairs, score_col='identity')
+    result.to_csv(output_path, index=False)
+    print(f"{path}: {len(pairs)} пар, после канонизации {len(result)}, сохранено в {output_path}")
+    return output_path
+
+
 def upload_protein_similarity():
     """
-    Загружает данные о сходстве белков в Neo4j.
-    Создает ненаправленные отношения has_similarity между белками.
+    Загружает данные о сходстве белков в Neo4j из канонизированного файла
+    (prepare_upload): одна пара (nodeid_1 < nodeid_2) - одна связь has_similarity
+    в одном направлении. Связь ставится через MERGE без свойств в шаблоне:
+    оба конца уже найдены по id, поэтому проверяются только связи p1,
+    а повторный или частично упавший запуск не дает дубликатов.
     """
-    query = """
-    LOAD CSV WITH HEADERS FROM 'file:///protein_similarity_nodeids_high_score.csv' AS row
-          CALL(row) {
+    query = f"""
+    LOAD CSV WITH HEADERS FROM 'file:///{UPLOAD_PATH}' AS row
+          CALL(row) {{
               MATCH (p1:protein) WHERE id(p1) = toInteger(row.nodeid_1)
               MATCH (p2:protein) WHERE id(p2) = toInteger(row.nodeid_2)
-              MERGE (p1)-[:has_similarity {score: toFloat(row.identity)}]-(p2)
-          } IN TRANSACTIONS OF 1000 ROWS
+              MERGE (p1)-[r:has_similarity]->(p2)
+              SET r.score = toFloat(row.identity)
+          }} IN TRANSACTIONS OF 10000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "protein_similarity")
     
     print("Сходство белков успешно загружено в базу данных")
 
@@ -89,10 +111,14 @@ def main():
     # print("Подготовка данных...")
     # prepare_data()
     
+    print("\nКанонизация пар для загрузки...")
+    prepare_upload()
+    
     print("\nЗагрузка в Neo4j...")
     upload_protein_similarity()
     
     print("\nГотово!")
+    telemetry.write_report()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,8 @@ import dotenv
 import asyncio
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+
 dotenv.load_dotenv()
 
 
@@ -13,6 +15,8 @@ db_password = os.environ["NEO4J_URL"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("rna_aptamers")
+
 
 async def upload_proteins():
     query = """
@@ -25,8 +29,10 @@ async def upload_proteins():
                 annotation: coalesce(row.annotation, '')
                 })
           } IN TRANSACTIONS OF 500 ROWS
+          RETURN count(*) AS rows
     """
-    driver.execute_query(query)
+    with driver.session() as session:
+        telemetry.run(session, query, "proteins")
 
 
 async def upload_molecules():
@@ -39,8 +45,10 @@ async def upload_molecules():
                 representation_type: row.representation_type
                 })
           } IN TRANSACTIONS OF 500 ROWS
+          RETURN count(*) AS rows
     """
-    driver.execute_query(query)
+    with driver.session() as session:
+        telemetry.run(session, query, "molecules")
 
 
 def upload_interactions():
@@ -51,8 +59,10 @@ def upload_interactions():
               (s:small_molecule {name: row.small_molecule_name, row.small_molecule_content})
               MERGE (p)-[:interacts_with {kd: coalesce(row.kd, 'NaN')}]-(s)
           } IN TRANSACTIONS OF 500 ROWS
+          RETURN count(*) AS rows
     """
-    driver.execute_query(query)
+    with driver.session() as session:
+        telemetry.run(session, query, "interactions")
 
 
 async def main():
@@ -65,6 +75,8 @@ async def main():
 
     upload_interactions()
 
+    telemetry.write_report()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
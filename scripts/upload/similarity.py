@@ -4,6 +4,8 @@ import dotenv
 import asyncio
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+
 dotenv.load_dotenv()
 
 warnings.filterwarnings("ignore")
@@ -16,6 +18,15 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("similarity")
+
+# Файлы db_similarity/*.csv готовит rename_entities.rename_similarity:
+# пары канонизированы (nodeid_1 < nodeid_2) и без повторов, поэтому связь
+# ставится в одном направлении. small_molecule_tanimoto.csv пишет
+# similarity.tanimoto, пары в том же виде. MERGE без свойств в шаблоне
+# проверяет только связи уже найденного по id r1, а повторный или частично
+# упавший запуск не создает дубликатов.
+
 
 async def upload_rna_similarity():
     query = """
@@ -23,11 +34,13 @@ async def upload_rna_similarity():
           CALL(row) {
               MATCH (r1:rna) WHERE id(r1) = toInteger(row.nodeid_1)
               MATCH (r2:rna) WHERE id(r2) = toInteger(row.nodeid_2)
-              MERGE (r1)-[:has_similarity {score: row.score}]-(r2)
-          } IN TRANSACTIONS OF 1000 ROWS
+              MERGE (r1)-[s:has_similarity]->(r2)
+              SET s.score = row.score
+          } IN TRANSACTIONS OF 10000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "rna_similarity")
 
     print("loaded rna similarity")
 
@@ -38,26 +51,30 @@ async def upload_dna_similarity():
           CALL(row) {
               MATCH (r1:dna) WHERE id(r1) = toInteger(row.nodeid_1)
               MATCH (r2:dna) WHERE id(r2) = toInteger(row.nodeid_2)
-              MERGE (r1)-[:has_similarity {score: row.score}]-(r2)
-          } IN TRANSACTIONS OF 1000 ROWS
+              MERGE (r1)-[s:has_similarity]->(r2)
+              SET s.score = row.score
+          } IN TRANSACTIONS OF 10000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "dna_similarity")
 
     print("loaded dna similarity")
 
 
 async def upload_small_molecules_similarity():
     query = """
-    LOAD CSV WITH HEADERS FROM 'file:///db_similarity/small_molecule_similarity.csv' AS row
+    LOAD CSV WITH HEADERS FROM 'file:///db_similarity/small_molecule_tanimoto.csv' AS row
           CALL(row) {
               MATCH (r1:small_molecule) WHERE id(r1) = toInteger(row.nodeid_1)
               MATCH (r2:small_molecule) WHERE id(r2) = toInteger(row.nodeid_2)
-              MERGE (r1)-[:has_similarity {tanimoto: row.score}]-(r2)
-          } IN TRANSACTIONS OF 1000 ROWS
+              MERGE (r1)-[s:has_similarity]->(r2)
+              SET s.tanimoto = row.score
+          } IN TRANSACTIONS OF 10000 ROWS
+          RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "small_molecules_similarity")
 
     print("loaded small molecules similarity")
 
@@ -71,6 +88,8 @@ async def main():
 
     await asyncio.gather(*tasks)
 
+    telemetry.write_report()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
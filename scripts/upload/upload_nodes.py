@@ -3,6 +3,8 @@ import dotenv
 import asyncio
 from neo4j import GraphDatabase
 
+from scripts.telemetry import IngestionTelemetry
+
 dotenv.load_dotenv()
 
 db_api = os.environ["NEO4J_URL"]
@@ -12,6 +14,8 @@ db_password = os.environ["NEO4J_PASSWORD"]
 driver = GraphDatabase.driver(db_api, auth=(db_login, db_password))
 driver.verify_connectivity()
 
+telemetry = IngestionTelemetry("upload_nodes")
+
 
 async def upload_aa():
     """Загрузка аминокислотных последовательностей из AA.csv"""
@@ -24,9 +28,10 @@ async def upload_aa():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "aa")
     print("✓ AA загружены")
 
 
@@ -41,9 +46,10 @@ async def upload_dna():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "dna")
     print("✓ DNA загружены")
 
 
@@ -58,9 +64,10 @@ async def upload_rna():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "rna")
     print("✓ RNA загружены")
 
 
@@ -75,9 +82,10 @@ async def upload_small_molecules():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "small_molecules")
     print("✓ SmallMolecule загружены")
 
 
@@ -92,9 +100,10 @@ async def upload_nucleic_ambiguous():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "nucleic_ambiguous")
     print("✓ NucleicAmbigous загружены")
 
 
@@ -109,9 +118,10 @@ async def upload_nucleic_mixed():
             n.alias = coalesce(row.alias, ''),
             n.source = row.source
     } IN TRANSACTIONS OF 1000 ROWS
+    RETURN count(*) AS rows
     """
     with driver.session() as session:
-        session.run(query)
+        telemetry.run(session, query, "nucleic_mixed")
     print("✓ NucleicMixed загружены")
 
 
@@ -134,6 +144,7 @@ async def main():
     print("\n" + "=" * 60)
     print("Загрузка завершена!")
     print("=" * 60)
+    telemetry.write_report()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,76 @@
+import re
 from abc import ABC, abstractmethod
-from typing import Optional
-from pydantic import BaseModel
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+
+
+IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+ALLOWED_KINDS = "biufUO"
+ROWS_CHUNK_SIZE = 10_000
+
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _check_identifier(name: str) -> str:
+    if not IDENTIFIER_RE.match(name):
+        raise ValueError(f"invalid label, type or property name: {name!r}")
+    return name
+
+
+def _projection(variable: str, props: tuple[str, ...]) -> str:
+    return variable + " {" + ", ".join(f".{_quote(p)}" for p in props) + "}"
+
+
+@lru_cache(maxsize=None)
+def _merge_nodes_query(label: str, keys: tuple[str, ...], props: tuple[str, ...]) -> str:
+    pattern = ", ".join(f"{_quote(k)}: row.{_quote(k)}" for k in keys)
+    query = f"UNWIND $rows AS row\nMERGE (n:{_quote(label)} {{{pattern}}})"
+    if props:
+        query += f"\nSET n += {_projection('row', props)}"
+    return query
+
+
+@lru_cache(maxsize=None)
+def _create_nodes_query(label: str, keys: tuple[str, ...], props: tuple[str, ...]) -> str:
+    return (
+        f"UNWIND $rows AS row\n"
+        f"CREATE (n:{_quote(label)})\n"
+        f"SET n = {_projection('row', keys + props)}"
+    )
+
+
+def _match_endpoint(variable: str, label: str, column: str, id_key: Optional[str]) -> str:
+    if id_key is None:
+        return f"MATCH ({variable}:{_quote(label)}) WHERE id({variable}) = row.{_quote(column)}"
+    return f"MATCH ({variable}:{_quote(label)} {{{_quote(id_key)}: row.{_quote(column)}}})"
+
+
+@lru_cache(maxsize=None)
+def _edges_query(
+    verb: str,
+    rel_type: str,
+    source_label: str,
+    target_label: str,
+    source_column: str,
+    target_column: str,
+    id_key: Optional[str],
+    props: tuple[str, ...],
+) -> str:
+    query = (
+        f"UNWIND $rows AS row\n"
+        f"{_match_endpoint('a', source_label, source_column, id_key)}\n"
+        f"{_match_endpoint('b', target_label, target_column, id_key)}\n"
+        f"{verb} (a)-[r:{_quote(rel_type)}]->(b)"
+    )
+    if props:
+        query += f"\nSET r {'+=' if verb == 'MERGE' else '='} {_projection('row', props)}"
+    return query
 
 
 class Entity(BaseModel, ABC):
@@ -13,27 +83,219 @@ class Entity(BaseModel, ABC):
         pass
 
 
+class ColumnBatch(Entity):
+    """
+    Пачка строк, хранящаяся по колонкам в массивах NumPy.
+    Проверка типов и пропусков выполняется над колонкой целиком,
+    строки для параметра `$rows` собираются только при отправке.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    columns: dict[str, np.ndarray]
+
+    @field_validator("columns", mode="before")
+    @classmethod
+    def _as_arrays(cls, columns: dict[str, Any]) -> dict[str, np.ndarray]:
+        arrays = {}
+        for name, values in columns.items():
+            _check_identifier(name)
+            if isinstance(values, pd.Series):
+                values = values.to_numpy(dtype=object if values.dtype.kind not in "biuf" else None)
+            array = np.asarray(values)
+            if array.ndim != 1:
+                raise ValueError(f"column {name!r} must be one-dimensional")
+            if array.dtype.kind not in ALLOWED_KINDS:
+                raise ValueError(f"column {name!r} has unsupported dtype {array.dtype}")
+            arrays[name] = array
+        return arrays
+
+    @model_validator(mode="after")
+    def _check_lengths(self) -> "ColumnBatch":
+        lengths = {name: len(values) for name, values in self.columns.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"columns have different lengths: {lengths}")
+        for name in self.required_columns():
+            if name not in self.columns:
+                raise ValueError(f"missing required column {name!r}")
+            if pd.isna(self.columns[name]).any():
+                raise ValueError(f"required column {name!r} contains nulls")
+        return self
+
+    def required_columns(self) -> tuple[str, ...]:
+        return ()
+
+    def property_columns(self) -> tuple[str, ...]:
+        required = self.required_columns()
+        return tuple(name for name in self.columns if name not in required)
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def iter_rows(self, chunk_size: int = ROWS_CHUNK_SIZE) -> Iterator[dict[str, Any]]:
+        """
+        Отдает строки как словари Python-значений для параметра `$rows`.
+        Колонки переводятся в списки кусками по `chunk_size`, пропуски - в None.
+        """
+        names = list(self.columns)
+        for start in range(0, len(self), chunk_size):
+            chunk = []
+            for name in names:
+                values = self.columns[name][start:start + chunk_size]
+                items = values.tolist()
+                if values.dtype.kind in "fO":
+                    for i in np.flatnonzero(pd.isna(values)):
+                        items[i] = None
+                chunk.append(items)
+            for row in zip(*chunk):
+                yield dict(zip(names, row))
+
+
+class EntityBatch(ColumnBatch):
+    """
+    Пачка узлов одной метки. `keys` - свойства, по которым выполняется MERGE,
+    остальные колонки записываются как свойства узла.
+    """
+    label: str
+    keys: tuple[str, ...] = ("name", "content")
+
+    @field_validator("label")
+    @classmethod
+    def _check_label(cls, label: str) -> str:
+        return _check_identifier(label)
+
+    @classmethod
+    def from_df(
+        cls,
+        df: pd.DataFrame,
+        label: str,
+        keys: tuple[str, ...] = ("name", "content"),
+        columns: Optional[list[str]] = None,
+    ) -> "EntityBatch":
+        columns = columns or list(df.columns)
+        return cls(label=label, keys=keys, columns={c: df[c] for c in columns})
+
+    def required_columns(self) -> tuple[str, ...]:
+        return self.keys
+
+    def compose_merge_query(self) -> str:
+        return _merge_nodes_query(self.label, self.keys, self.property_columns())
+
+    def compose_create_query(self) -> str:
+        return _create_nodes_query(self.label, self.keys, self.property_columns())
+
+
+class EdgeBatch(ColumnBatch):
+    """
+    Пачка связей одного типа между узлами `source_label` и `target_label`.
+    Концы ищутся по внутреннему id узла или, если задан `id_key`,
+    по свойству `id_key`.
+    """
+    rel_type: str
+    source_label: str
+    target_label: str
+    source_column: str = "source"
+    target_column: str = "target"
+    id_key: Optional[str] = None
+
+    @field_validator("rel_type", "source_label", "target_label", "source_column", "target_column", "id_key")
+    @classmethod
+    def _check_names(cls, name: Optional[str]) -> Optional[str]:
+        return name if name is None else _check_identifier(name)
+
+    @model_validator(mode="after")
+    def _check_endpoints(self) -> "EdgeBatch":
+        if self.id_key is None:
+            for name in (self.source_column, self.target_column):
+                if self.columns[name].dtype.kind not in "iu":
+                    raise ValueError(f"column {name!r} must hold integer node ids")
+        return self
+
+    @classmethod
+    def from_df(
+        cls,
+        df: pd.DataFrame,
+        rel_type: str,
+        source_label: str,
+        target_label: str,
+        source_column: str = "source",
+        target_column: str = "target",
+        id_key: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ) -> "EdgeBatch":
+        columns = columns or list(df.columns)
+        return cls(
+            rel_type=rel_type,
+            source_label=source_label,
+            target_label=target_label,
+            source_column=source_column,
+            target_column=target_column,
+            id_key=id_key,
+            columns={c: df[c] for c in columns},
+        )
+
+    def required_columns(self) -> tuple[str, ...]:
+        return (self.source_column, self.target_column)
+
+    def _compose(self, verb: str) -> str:
+        return _edges_query(
+            verb,
+            self.rel_type,
+            self.source_label,
+            self.target_label,
+            self.source_column,
+            self.target_column,
+            self.id_key,
+            self.property_columns(),
+        )
+
+    def compose_merge_query(self) -> str:
+        return self._compose("MERGE")
+
+    def compose_create_query(self) -> str:
+        return self._compose("CREATE")
+
+
 class Node(Entity):
     name: str
     node_type: str
     node_subtype: Optional[str]
     properties: dict[str, str | float | int]
 
+    def to_batch(self) -> EntityBatch:
+        columns = {"name": [self.name], **{k: [v] for k, v in self.properties.items()}}
+        if self.node_subtype is not None:
+            columns["node_subtype"] = [self.node_subtype]
+        return EntityBatch(label=self.node_type, keys=("name",), columns=columns)
+
     def compose_merge_query(self):
-        pass
+        return self.to_batch().compose_merge_query()
 
     def compose_create_query(self):
-        pass
+        return self.to_batch().compose_create_query()
 
 
 class Edge(Entity):
     first_node: Node
     second_node: Node
     properties: dict[str, str | float | int]
+    edge_type: str = "interacts_with"
+
+    def to_batch(self) -> EdgeBatch:
+        columns = {
+            "source": [self.first_node.name],
+            "target": [self.second_node.name],
+            **{k: [v] for k, v in self.properties.items()},
+        }
+        return EdgeBatch(
+            rel_type=self.edge_type,
+            source_label=self.first_node.node_type,
+            target_label=self.second_node.node_type,
+            id_key="name",
+            columns=columns,
+        )
 
     def compose_merge_query(self):
-        pass
+        return self.to_batch().compose_merge_query()
 
     def compose_create_query(self):
-        pass
-
+        return self.to_batch().compose_create_query()
@@ -6,6 +6,8 @@ from typing import Dict, List, Optional
 import requests
 import pandas as pd
 
+from src.sequences.classify import is_valid_protein
+
 
 class UniProtSequenceSearcher:
     def __init__(self):
@@ -75,8 +77,7 @@ class UniProtSequenceSearcher:
     
     def _is_valid_sequence(self, sequence: str) -> bool:
         """Проверяет, является ли последовательность валидной аминокислотной последовательностью"""
-        valid_aa = set('ACDEFGHIKLMNPQRSTVWY')  # Стандартные аминокислоты
-        return all(aa in valid_aa for aa in sequence)
+        return is_valid_protein(sequence)
     
     def _search_with_multiple_strategies(self, sequence: str, max_results: int) -> List[Dict]:
         """
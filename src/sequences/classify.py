@@ -0,0 +1,242 @@
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+# Метки узлов, в которые раскладываются последовательности (см. scripts/upload/upload_nodes.py)
+LABELS = ("aa", "dna", "rna", "nucleic_ambiguous", "nucleic_mixed", "small_molecule", "unknown")
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+AMINO_ACIDS_EXTENDED = "BJOUXZ"
+NUCLEOTIDES = "ACG"
+AMBIGUOUS_NUCLEOTIDES = "RYSWKMBDHVN"
+# Символы, которые встречаются только в SMILES, и допустимые в SMILES,
+# но не определяющие тип (дефис и точка бывают в выравниваниях и списках)
+SMILES_SYMBOLS = "0123456789()[]=#@+/\\%"
+SMILES_EXTRA = "-.:*"
+# Атомы органического подмножества SMILES, которые пишутся без скобок;
+# Cl и Br учитываются парами букв (см. alphabet_counts)
+SMILES_ATOMS = "BCNOPSFIbcnops"
+
+# Доля A, C, G, T, U, N, начиная с которой буквенная строка считается нуклеиновой,
+# а не белком с нуклеотидоподобным составом
+NUCLEIC_MIN_FRACTION = 0.9
+# Буквенные строки не длиннее этого, записываемые атомами SMILES ("CCO", "CCCC", "N", "O"),
+# одинаково похожи на молекулу и на последовательность: без подсказки они получают unknown
+AMBIGUOUS_MAX_LENGTH = 12
+CHUNK_ROWS = 200_000
+
+# Классы байтов - биты в таблице поиска на 256 значений
+AA = 1 << 0
+AA_EXT = 1 << 1
+NUC = 1 << 2
+T = 1 << 3
+U = 1 << 4
+N = 1 << 5
+AMBIGUOUS = 1 << 6
+SMILES = 1 << 7
+SMILES_EXTRA_BIT = 1 << 8
+LOWER = 1 << 9
+GC = 1 << 10
+SMILES_ATOM = 1 << 11
+CLASSES = {
+    "aa": AA,
+    "aa_ext": AA_EXT,
+    "nuc": NUC,
+    "t": T,
+    "u": U,
+    "n": N,
+    "ambiguous": AMBIGUOUS,
+    "smiles": SMILES,
+    "smiles_extra": SMILES_EXTRA_BIT,
+    "lower": LOWER,
+    "gc": GC,
+    "smiles_atom": SMILES_ATOM,
+}
+
+
+def _build_lut() -> np.ndarray:
+    lut = np.zeros(256, dtype=np.uint16)
+
+    def mark(chars: str, bit: int) -> None:
+        for char in chars:
+            lut[ord(char)] |= bit
+            if char.isalpha():
+                lut[ord(char.lower())] |= bit | LOWER
+
+    mark(AMINO_ACIDS, AA)
+    mark(AMINO_ACIDS_EXTENDED, AA_EXT)
+    mark(NUCLEOTIDES, NUC)
+    mark("T", T)
+    mark("U", U)
+    mark("N", N)
+    mark(AMBIGUOUS_NUCLEOTIDES, AMBIGUOUS)
+    mark("GC", GC)
+    for char in SMILES_SYMBOLS:
+        lut[ord(char)] |= SMILES
+    for char in SMILES_EXTRA:
+        lut[ord(char)] |= SMILES_EXTRA_BIT
+    for char in SMILES_ATOMS:
+        lut[ord(char)] |= SMILES_ATOM
+    return lut
+
+
+LUT = _build_lut()
+VALID_AA = np.zeros(256, dtype=bool)
+VALID_AA[[ord(c) for c in AMINO_ACIDS]] = True
+
+
+def _as_buffer(values: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Склеивает строки в один байтовый буфер; не-ASCII символы становятся '?'."""
+    values = ["" if not isinstance(v, str) else v for v in values]
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    buffer = np.frombuffer("".join(values).encode("ascii", "replace"), dtype=np.uint8)
+    return buffer, offsets
+
+
+# Байты с одинаковым набором классов объединяются в категории: счетчики
+# считаются одним bincount по (строка, категория), затем раскладываются по классам
+CATEGORY_CODES, BYTE_CATEGORY = np.unique(LUT, return_inverse=True)
+BYTE_CATEGORY = BYTE_CATEGORY.astype(np.int64)
+
+
+def alphabet_counts(values: Iterable[str]) -> pd.DataFrame:
+    """
+    Длина и число символов каждого класса алфавита для каждой строки;
+    `halogen` - число вторых букв Cl и Br (l после C, r после B).
+    """
+    buffer, offsets = _as_buffer(values)
+    n_rows, n_categories = offsets.shape[0] - 1, CATEGORY_CODES.shape[0]
+    lengths = np.diff(offsets)
+    rows = np.repeat(np.arange(n_rows, dtype=np.int64), lengths)
+    per_category = np.bincount(
+        rows * n_categories + BYTE_CATEGORY[buffer],
+        minlength=n_rows * n_categories,
+    ).reshape(n_rows, n_categories)
+
+    counts = {"length": lengths}
+    for name, bit in CLASSES.items():
+        counts[name] = per_category[:, (CATEGORY_CODES & bit) != 0].sum(axis=1)
+    counts["other"] = per_category[:, CATEGORY_CODES == 0].sum(axis=1)
+
+    same_row = np.zeros(buffer.shape[0], dtype=bool)
+    same_row[1:] = rows[1:] == rows[:-1]
+    previous = np.roll(buffer, 1)
+    halogen = same_row & (
+        ((buffer == ord("l")) & (previous == ord("C")))
+        | ((buffer == ord("r")) & (previous == ord("B")))
+    )
+    counts["halogen"] = np.bincount(rows[halogen], minlength=n_rows)
+    return pd.DataFrame(counts)
+
+
+def _classify_chunk(values: list[str], hints: np.ndarray) -> pd.DataFrame:
+    counts = alphabet_counts(values)
+    length = counts["length"].to_numpy()
+    non_letters = (counts["smiles"] + counts["smiles_extra"] + counts["other"]).to_numpy()
+    nucleic_letters = counts["nuc"] + counts["t"] + counts["u"] + counts["n"]
+    nucleic_alphabet = counts["nuc"] + counts["t"] + counts["u"] + counts["ambiguous"]
+
+    is_smiles = (counts["smiles"] > 0).to_numpy()
+    is_letters = ~is_smiles & (length > 0) & (non_letters == 0)
+    is_nucleic = (
+        is_letters
+        & (nucleic_alphabet == length).to_numpy()
+        & (nucleic_letters >= NUCLEIC_MIN_FRACTION * np.maximum(length, 1)).to_numpy()
+    )
+    has_t, has_u = (counts["t"] > 0).to_numpy(), (counts["u"] > 0).to_numpy()
+    has_ambiguous = (counts["ambiguous"] > 0).to_numpy()
+    is_protein = is_letters & ~is_nucleic & ((counts["aa"] + counts["aa_ext"]) == length).to_numpy()
+
+    # Буквенная строка, которая целиком записывается атомами SMILES, типизируется
+    # по подсказке (метке узла или источнику), а без подсказки - только если она длинная
+    smiles_letters = is_letters & ((counts["smiles_atom"] + counts["halogen"]) == length).to_numpy()
+    hinted_molecule = smiles_letters & (hints == "small_molecule")
+    unhinted_short = smiles_letters & pd.isna(hints) & (length <= AMBIGUOUS_MAX_LENGTH)
+    is_smiles = is_smiles | hinted_molecule
+    is_nucleic &= ~hinted_molecule & ~unhinted_short
+    is_protein &= ~hinted_molecule & ~unhinted_short
+    no_lowercase = (counts["lower"] == 0).to_numpy()
+
+    label = np.select(
+        [
+            is_nucleic & has_t & has_u,
+            is_nucleic & has_ambiguous,
+            is_nucleic & has_u,
+            is_nucleic,
+            is_protein,
+            is_smiles,
+        ],
+        [LABELS.index(name) for name in ("nucleic_mixed", "nucleic_ambiguous", "rna", "dna", "aa", "small_molecule")],
+        default=LABELS.index("unknown"),
+    )
+    valid = np.select(
+        [is_nucleic, is_protein, is_smiles],
+        [
+            no_lowercase,
+            (counts["aa"] == length).to_numpy() & no_lowercase,
+            (counts["other"] == 0).to_numpy(),
+        ],
+        default=False,
+    )
+    return pd.DataFrame({
+        "label": pd.Categorical.from_codes(label, LABELS),
+        "valid": valid,
+        "length": length,
+        "nucleotide_fraction": nucleic_letters / np.maximum(length, 1),
+        "gc_fraction": counts["gc"] / np.maximum(nucleic_letters, 1),
+        "ambiguous": counts["ambiguous"],
+        "lowercase": counts["lower"],
+        "invalid_chars": np.where(is_smiles, counts["other"], non_letters),
+    })
+
+
+def classify(
+    values: Iterable[str],
+    hints: Union[Iterable[Optional[str]], str, None] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    Определяет тип каждой строки `content` по таблицам поиска над байтами:
+
+    - small_molecule: есть символы SMILES (цифры, скобки, связи, заряды);
+    - dna / rna / nucleic_mixed / nucleic_ambiguous: только буквы IUPAC для
+      нуклеотидов и не меньше NUCLEIC_MIN_FRACTION из A, C, G, T, U, N;
+      T и U вместе - nucleic_mixed, коды неоднозначности (в т.ч. N) - nucleic_ambiguous;
+    - aa: остальные буквенные строки из алфавита аминокислот;
+    - unknown: пустые строки и посторонние символы.
+
+    Буквенные строки, которые целиком записываются атомами SMILES ("CCO",
+    "ClCCl", "N"), по алфавиту не отличить от последовательностей. Для них
+    используется `hints` - ожидаемая метка строки (метка узла или тип
+    источника, одна на все строки или по строке): small_molecule делает
+    строку молекулой, другая метка оставляет тип по алфавиту. Без подсказки
+    такие строки не длиннее AMBIGUOUS_MAX_LENGTH получают unknown.
+
+    Метка не зависит от регистра букв, а признак валидности для
+    последовательностей, как и is_valid_protein, требует заглавных букв
+    (для aa - только 20 стандартных аминокислот). Возвращает метку,
+    признак валидности и статистику алфавита по строкам.
+    """
+    values = values.tolist() if isinstance(values, pd.Series) else list(values)
+    if hints is None or isinstance(hints, str):
+        hints = np.full(len(values), hints, dtype=object)
+    else:
+        hints = np.asarray(hints.tolist() if isinstance(hints, pd.Series) else list(hints), dtype=object)
+    if hints.shape[0] != len(values):
+        raise ValueError(f"hints has {hints.shape[0]} rows, values has {len(values)}")
+    chunks = [
+        _classify_chunk(values[i:i + chunk_rows], hints[i:i + chunk_rows])
+        for i in range(0, len(values), chunk_rows)
+    ]
+    if not chunks:
+        return _classify_chunk([], hints)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def is_valid_protein(sequence: str) -> bool:
+    """Состоит ли строка только из 20 стандартных аминокислот (заглавными)."""
+    buffer = np.frombuffer(sequence.encode("ascii", "replace"), dtype=np.uint8)
+    return bool(VALID_AA[buffer].all())
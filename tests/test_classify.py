@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sequences.classify import AMBIGUOUS_MAX_LENGTH, alphabet_counts, classify, is_valid_protein
+
+
+def _labels(values, hints=None) -> list[str]:
+    return classify(values, hints)["label"].astype(str).tolist()
+
+
+@pytest.mark.parametrize("value, label", [
+    ("ACGTACGTTGCA", "dna"),
+    ("ACGUACGUUGCA", "rna"),
+    ("ACGTUACGTUGC", "nucleic_mixed"),
+    ("ACGTNACGTRGC", "nucleic_ambiguous"),
+    ("MKVLAAGIVHEW", "aa"),
+    ("c1ccccc1O", "small_molecule"),
+    ("CC(=O)O", "small_molecule"),
+    ("", "unknown"),
+    ("ACGT$ACGT", "unknown"),
+])
+def test_labels_by_alphabet(value, label):
+    assert _labels([value]) == [label]
+
+
+@pytest.mark.parametrize("value", ["CCO", "CCCC", "ClCCl", "N", "O", "CBr"])
+def test_short_smiles_letters_without_hint_are_unknown(value):
+    assert _labels([value]) == ["unknown"]
+
+
+@pytest.mark.parametrize("value", ["CCO", "CCCC", "ClCCl", "N", "O", "CBr"])
+def test_short_smiles_letters_follow_molecule_hint(value):
+    result = classify([value], "small_molecule")
+    assert result["label"].astype(str).tolist() == ["small_molecule"]
+    assert result["valid"].tolist() == [True]
+
+
+def test_sequence_hint_keeps_alphabet_label():
+    assert _labels(["CCCC", "CCO", "N"], ["dna", "aa", None]) == ["dna", "aa", "unknown"]
+
+
+def test_long_smiles_letters_without_hint_use_alphabet():
+    assert _labels(["C" * (AMBIGUOUS_MAX_LENGTH + 1)]) == ["dna"]
+    assert _labels(["C" * (AMBIGUOUS_MAX_LENGTH + 1)], "small_molecule") == ["small_molecule"]
+
+
+def test_molecule_hint_does_not_override_sequences():
+    # Буквы вне органического подмножества SMILES (A, G, T, K, ...) не дают молекулу
+    assert _labels(["ACGTACGT", "MKVL"], "small_molecule") == ["dna", "aa"]
+
+
+def test_halogen_letters_only_after_their_atom():
+    counts = alphabet_counts(["ClCCl", "lC", "CBr", "C", "l"])
+    assert counts["halogen"].tolist() == [2, 0, 1, 0, 0]
+
+
+def test_lowercase_is_invalid():
+    result = classify(["acgtacgtacgt", "ACGTACGTACGT", "mkvlaagivhew", "MKVLAAGIVHEW", "ClCCl"], ["dna", "dna", "aa", "aa", "aa"])
+    assert result["label"].astype(str).tolist() == ["dna", "dna", "aa", "aa", "aa"]
+    assert result["valid"].tolist() == [False, True, False, True, False]
+    assert result["lowercase"].tolist() == [12, 0, 12, 0, 2]
+
+
+def test_valid_protein_matches_is_valid_protein():
+    values = ["MKVLAAGIVHEW", "mkvlaagivhew", "MKVLXAGIVHEW", "MKVLUAGIVHEW"]
+    result = classify(values, "aa")
+    assert result["valid"].tolist() == [is_valid_protein(v) for v in values]
+
+
+def test_extended_amino_acids_are_invalid_protein():
+    result = classify(["MKVLXAGIVHEW"])
+    assert result["label"].astype(str).tolist() == ["aa"]
+    assert result["valid"].tolist() == [False]
+
+
+def test_chunks_and_series_hints():
+    values = pd.Series(["CCO", "ACGTACGTACGT", "N", "MKVLAAGIVHEW"] * 5)
+    hints = pd.Series(["small_molecule", None, np.nan, "aa"] * 5)
+    result = classify(values, hints, chunk_rows=3)
+    assert result["label"].astype(str).tolist() == ["small_molecule", "dna", "unknown", "aa"] * 5
+
+
+def test_hints_length_mismatch():
+    with pytest.raises(ValueError):
+        classify(["CCO", "N"], ["small_molecule"])
+
+
+def test_empty_input():
+    assert classify([]).shape[0] == 0
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.entity_registry import EntityRegistry, build_registry, entity_keys, load_registry
+
+
+def test_entity_keys_are_stable_and_label_specific():
+    keys = entity_keys("dna", ["a", "b"], ["ACGT", "ACGT"])
+    assert keys.dtype == np.uint64
+    np.testing.assert_array_equal(keys, entity_keys("dna", ["a", "b"], ["ACGT", "ACGT"]))
+    assert keys[0] != keys[1]
+    assert entity_keys("rna", ["a"], ["ACGT"])[0] != keys[0]
+    assert (keys != 0).all()
+
+
+def test_register_and_resolve(tmp_path):
+    registry = EntityRegistry(str(tmp_path), capacity=16)
+    registry.register("protein", ["p1", "p2", "p1"], ["MK", "MV", "MK"], [10, 20, 10])
+
+    np.testing.assert_array_equal(registry.resolve("protein", ["p1", "p2", "p3"], ["MK", "MV", "MK"]), [10, 20, -1])
+    assert registry.size == 2
+
+
+def test_register_reports_conflicting_nodeids(tmp_path, capsys):
+    registry = EntityRegistry(str(tmp_path), capacity=16)
+    registry.register("protein", ["p1", "p2", "p1"], ["MK", "MV", "MK"], [10, 20, 11])
+    assert "1 protein (name, content) keys map to different nodeids" in capsys.readouterr().out
+    # Без strict остается последнее значение
+    assert registry.resolve("protein", ["p1"], ["MK"]).tolist() == [11]
+
+    with pytest.raises(ValueError):
+        registry.register("protein", ["p2"], ["MV"], [21], strict=True)
+    registry.register("protein", ["p2"], ["MV"], [20], strict=True)
+    assert registry.resolve("protein", ["p2"], ["MV"]).tolist() == [20]
+
+
+def test_registry_grows_and_reopens(tmp_path):
+    n = 50_000
+    names = [f"n{i}" for i in range(n)]
+    contents = [f"c{i % 97}" for i in range(n)]
+    registry = EntityRegistry(str(tmp_path), capacity=16)
+    registry.register("dna", names[:10], contents[:10], np.arange(10))
+    registry.register("dna", names, contents, np.arange(n))
+    registry.flush()
+    assert registry.capacity >= 2 * n
+
+    reopened = load_registry(str(tmp_path))
+    assert reopened.size == n
+    np.testing.assert_array_equal(reopened.resolve("dna", names, contents), np.arange(n))
+
+
+def test_resolve_df_drops_unknown_rows(tmp_path):
+    registry = EntityRegistry(str(tmp_path))
+    registry.register_df(pd.DataFrame({"nodeid": [1, 2], "name": ["a", "b"], "content": ["x", "y"]}), "rna")
+    df = pd.DataFrame({"name_1": ["a", "b", "c"], "content_1": ["x", "y", "z"]})
+
+    resolved = registry.resolve_df(df, "rna", "name_1", "content_1", "nodeid_1")
+    assert resolved["nodeid_1"].tolist() == [1, 2]
+
+
+def test_build_registry_uses_lake_schema(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "data" / "entities" / "db_rna.csv"
+    source.parent.mkdir(parents=True)
+    # Числовое имя остается строкой, как в таблицах, которые сопоставляются с реестром
+    pd.DataFrame({"nodeid": [1, 2], "name": ["123", "r2"], "content": ["ACGU", "GGCC"]}).to_csv(source, index=False)
+
+    registry = build_registry({"rna": ["data/entities/db_rna.csv"]}, path=str(tmp_path / "registry"))
+    assert registry.resolve("rna", ["123"], ["ACGU"]).tolist() == [1]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from scripts.get_predicted_links import existing_pair_keys, iter_pairs, pair_keys
+
+
+def _collect(*args, **kwargs) -> list[tuple[int, int]]:
+    pairs = []
+    for first, second in iter_pairs(*args, **kwargs):
+        pairs += zip(first.tolist(), second.tolist())
+    return pairs
+
+
+@pytest.mark.parametrize("block_pairs", [1, 3, 7, 100])
+def test_iter_pairs_covers_cross_product(block_pairs):
+    left, right = np.array([1, 2, 3]), np.array([10, 20, 30, 40])
+    pairs = _collect(left, right, block_pairs=block_pairs)
+    assert sorted(pairs) == [(a, b) for a in left.tolist() for b in right.tolist()]
+
+
+@pytest.mark.parametrize("block_pairs", [1, 4, 9, 100])
+def test_iter_pairs_symmetric_yields_each_unordered_pair_once(block_pairs):
+    ids = np.array([1, 3, 5, 7, 9])
+    pairs = _collect(ids, ids, symmetric=True, block_pairs=block_pairs)
+    assert sorted(pairs) == [(a, b) for a in ids.tolist() for b in ids.tolist() if a < b]
+
+
+def test_iter_pairs_skips_existing():
+    left, right = np.array([1, 2]), np.array([3, 4])
+    existing = np.sort(pair_keys(np.array([1, 2]), np.array([4, 3])))
+    assert sorted(_collect(left, right, existing=existing)) == [(1, 3), (2, 4)]
+
+
+def test_pair_keys_rejects_out_of_range_ids():
+    with pytest.raises(ValueError):
+        pair_keys(np.array([1 << 31]), np.array([0]))
+
+
+def test_existing_pair_keys_symmetric(tmp_path):
+    path = tmp_path / "links.csv"
+    path.write_text("a,b\n2,1\n1,2\n3,4\n")
+    keys = existing_pair_keys(str(path), ["a", "b"], symmetric=True)
+    np.testing.assert_array_equal(keys, pair_keys(np.array([1, 3]), np.array([2, 4])))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.upload.predicted_links import ID_KEY, default_run_id, select_predictions
+from src.db.models import EdgeBatch
+
+
+def test_edge_batch_matches_endpoints_by_id():
+    edges_df = pd.DataFrame({"nodeid_rna": [1], "nodeid_sm": [2], "score": [0.5], "model": ["rna_sm"]})
+    batch = EdgeBatch.from_df(
+        edges_df, "predicted_interacts_with", "rna", "small_molecule",
+        source_column="nodeid_rna", target_column="nodeid_sm", id_key=ID_KEY,
+    )
+    query = batch.compose_create_query()
+    assert "WHERE id(a) = row.`nodeid_rna`" in query
+    assert "WHERE id(b) = row.`nodeid_sm`" in query
+    assert "content" not in query
+    assert list(next(batch.iter_rows())) == ["nodeid_rna", "nodeid_sm", "score", "model"]
+
+
+def test_default_run_id_depends_on_model_and_file(tmp_path):
+    path = tmp_path / "rna_sm.parquet"
+    path.write_bytes(b"predictions")
+    run_id = default_run_id("rna_sm", str(path))
+    assert run_id.startswith("rna_sm_")
+    assert default_run_id("rna_sm", str(path)) == run_id
+    assert default_run_id("rna_rna", str(path)) != run_id
+    path.write_bytes(b"other predictions")
+    assert default_run_id("rna_sm", str(path)) != run_id
+
+
+def test_select_predictions_top_k_across_chunks(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.integers(0, 5, 200), "b": np.arange(200), "result": rng.random(200)})
+    path = tmp_path / "pred.parquet"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    result = pd.concat(select_predictions(str(path), ["a", "b"], threshold=0.2, top_k=3, chunk_size=17))
+    expected = df[df["result"] >= 0.2].sort_values(["a", "result"], ascending=[True, False]).groupby("a").head(3)
+    assert sorted(result["b"].tolist()) == sorted(expected["b"].tolist())
+
+
+def test_select_predictions_streams_threshold_chunks(tmp_path):
+    df = pd.DataFrame({"a": np.arange(100), "b": np.arange(100), "result": np.linspace(0, 1, 100)})
+    path = tmp_path / "pred.parquet"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    chunks = list(select_predictions(str(path), ["a", "b"], threshold=0.5, chunk_size=20))
+    assert len(chunks) == 3
+    assert all(chunk.shape[0] <= 20 for chunk in chunks)
+    assert pd.concat(chunks)["a"].tolist() == df.loc[df["result"] >= 0.5, "a"].tolist()
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from scripts import prediction_cache
+from scripts.content_store import ContentStore
+from scripts.prediction_cache import PredictionCache, expand_predictions, iter_unseen_batches, pair_hash
+from scripts.prediction_client import PredictionBatch
+
+
+def _batch(keys, index=0) -> PredictionBatch:
+    keys = np.asarray(keys, dtype=np.int64)
+    return PredictionBatch(index, keys, keys, "", keys)
+
+
+def test_pair_hash_symmetry():
+    first, second = np.array([1, 2, 3], dtype=np.uint64), np.array([3, 2, 1], dtype=np.uint64)
+    np.testing.assert_array_equal(pair_hash(first, second, symmetric=True), pair_hash(second, first, symmetric=True))
+    assert pair_hash(first[:1], second[:1])[0] != pair_hash(second[:1], first[:1])[0]
+
+
+def test_lookup_last_value_wins(tmp_path):
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        cache.append(_batch([5, 1, 3]), [0.5, 0.1, 0.3])
+        cache.append(_batch([3, 7, 3]), [0.33, 0.7, 0.333])
+        found, values = cache.lookup(np.array([1, 2, 3, 5, 7]))
+        assert found.tolist() == [True, False, True, True, True]
+        assert values.tolist() == [0.1, None, 0.333, 0.5, 0.7]
+        assert len(cache) == 4
+
+
+def test_resume_reads_journal(tmp_path):
+    path = str(tmp_path / "model")
+    with PredictionCache(path) as cache:
+        cache.append(_batch([10, 20]), [1.0, 2.0])
+        cache.append(_batch([20]), [2.5])
+    with PredictionCache(path) as cache:
+        assert len(cache) == 2
+        found, values = cache.lookup(np.array([10, 20, 30]))
+        assert found.tolist() == [True, True, False]
+        assert values.tolist()[:2] == [1.0, 2.5]
+        cache.append(_batch([30]), [3.0])
+    with PredictionCache(path) as cache:
+        assert cache.lookup(np.array([30]))[1].tolist() == [3.0]
+
+
+def test_buffer_merges_into_main(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "MIN_BUFFER", 4)
+    rng = np.random.default_rng(0)
+    expected = {}
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        for index in range(30):
+            keys = rng.integers(-1000, 1000, 7)
+            values = rng.random(7).tolist()
+            cache.append(_batch(keys, index), values)
+            expected.update(zip(keys.tolist(), values))
+            probe = np.array(sorted(expected) + [5000])
+            found, cached = cache.lookup(probe)
+            assert found.tolist() == [True] * len(expected) + [False]
+            assert cached[:-1].tolist() == [expected[k] for k in sorted(expected)]
+        # Буфер и основной массив отсортированы и не пересекаются
+        assert np.all(np.diff(cache.keys) > 0) and np.all(np.diff(cache._buffer_keys) > 0)
+        assert not np.isin(cache._buffer_keys, cache.keys).any()
+        assert cache.keys.shape[0] > 0
+        assert len(cache) == len(expected)
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    # Узлы 0..5 с тремя разными content: пары с одинаковым content отправляются один раз
+    store = ContentStore(np.arange(6), pd.Series(["AA", "CC", "GG", "AA", "CC", "GG"]))
+    first = np.array([0, 3, 1, 4, 2, 0, 5], dtype=np.int64)
+    second = np.array([1, 4, 2, 1, 0, 1, 2], dtype=np.int64)
+    path = tmp_path / "pairs.parquet"
+    pq.write_table(pa.table({"nodeid_1": first, "nodeid_2": second}), path)
+    return str(path), store, first, second
+
+
+def test_iter_unseen_batches_sends_each_content_pair_once(tmp_path, pairs):
+    path, store, first, second = pairs
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        batches = list(iter_unseen_batches(path, ["nodeid_1", "nodeid_2"], store, store, cache, batch_size=2, chunk_size=3))
+        sent = np.concatenate([b.keys for b in batches])
+        expected = np.unique(pair_hash(store.hashes(first), store.hashes(second)))
+        np.testing.assert_array_equal(np.sort(sent), expected)
+        assert [b.index for b in batches] == list(range(len(batches)))
+        assert all(len(b.keys) <= 2 for b in batches)
+        assert batches[0].payload.count(">") == len(batches[0].keys)
+
+
+def test_iter_unseen_batches_skips_cached_and_expands(tmp_path, pairs):
+    path, store, first, second = pairs
+    columns = ["nodeid_1", "nodeid_2"]
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        batches = list(iter_unseen_batches(path, columns, store, store, cache, batch_size=2))
+        cache.append(batches[0], [0.5] * len(batches[0].keys))
+        left = list(iter_unseen_batches(path, columns, store, store, cache, batch_size=2))
+        assert sum(len(b.keys) for b in left) == sum(len(b.keys) for b in batches) - len(batches[0].keys)
+        for batch in left:
+            cache.append(batch, [0.25] * len(batch.keys))
+        assert list(iter_unseen_batches(path, columns, store, store, cache, batch_size=2)) == []
+
+        output = tmp_path / "result.parquet"
+        assert expand_predictions(path, columns, store, store, cache, str(output)) == first.shape[0]
+        result = pq.read_table(output).to_pandas()
+        cached = set(batches[0].keys.tolist())
+        keys = pair_hash(store.hashes(result["nodeid_1"].to_numpy()), store.hashes(result["nodeid_2"].to_numpy()))
+        assert result["result"].tolist() == [0.5 if k in cached else 0.25 for k in keys.tolist()]
+
+
+def test_iter_unseen_batches_dedupes_across_many_chunks(tmp_path):
+    # 40 разных content, пары повторяются по всему файлу: ключи из ранних кусков не отправляются снова
+    rng = np.random.default_rng(1)
+    store = ContentStore(np.arange(40), pd.Series([f"S{i}" for i in range(40)]))
+    first, second = rng.integers(0, 40, 3000), rng.integers(0, 40, 3000)
+    path = tmp_path / "pairs.parquet"
+    pq.write_table(pa.table({"nodeid_1": first, "nodeid_2": second}), path)
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        batches = list(iter_unseen_batches(str(path), ["nodeid_1", "nodeid_2"], store, store, cache, batch_size=64, chunk_size=7))
+    sent = np.concatenate([b.keys for b in batches])
+    np.testing.assert_array_equal(np.sort(sent), np.unique(pair_hash(store.hashes(first), store.hashes(second))))
+
+
+def test_content_store_skips_missing_content(tmp_path):
+    store = ContentStore(np.arange(4), pd.Series(["AA", None, np.nan, "CC"]))
+    assert store.contains(np.arange(5)).tolist() == [True, False, False, True, False]
+    assert store.take(np.array([3, 0])) == ["CC", "AA"]
+    with pytest.raises(KeyError):
+        store.hashes(np.array([1]))
+
+    # Пары с узлом без content не отправляются в модель (раньше content был строкой "nan")
+    path = tmp_path / "pairs.parquet"
+    pq.write_table(pa.table({"nodeid_1": np.array([0, 1, 2]), "nodeid_2": np.array([3, 3, 0])}), path)
+    with PredictionCache(str(tmp_path / "model")) as cache:
+        batch, = iter_unseen_batches(str(path), ["nodeid_1", "nodeid_2"], store, store, cache, batch_size=8)
+    assert batch.payload == "AA>CC"
@@ -0,0 +1,33 @@
+from scripts.profile_queries import collect_queries, prepare_query, query_params
+
+
+def _queries(module):
+    return {item["name"]: item for item in collect_queries() if item["module"].endswith(module)}
+
+
+def test_collect_renders_f_string_constants():
+    queries = _queries("predicted_links.py")
+    assert "FOR ()-[r:predicted_interacts_with]-()" in queries["<module>.INDEX_QUERY"]["query"]
+    delete = queries["<module>.DELETE_QUERY"]["query"]
+    assert "IN TRANSACTIONS OF 10000 ROWS" in delete and "{" in delete and "{{" not in delete
+    assert "error" not in queries["<module>.DELETE_QUERY"]
+
+    upload = _queries("protein_similarity.py")["upload_protein_similarity.query"]["query"]
+    assert "'file:///protein_similarity_nodeids_high_score_canonical.csv'" in upload
+
+
+def test_collect_reports_non_constant_f_string(tmp_path):
+    (tmp_path / "loader.py").write_text(
+        'LABEL = "rna"\n'
+        'def load(path):\n'
+        '    query = f"LOAD CSV FROM \'{path}\' AS row MERGE (:{LABEL} {{name: row.name}})"\n'
+    )
+    item, = collect_queries([str(tmp_path)])
+    assert item["query"] is None
+    assert item["error"] == "f-string with non-constant values: path"
+
+
+def test_export_query_params_are_defined():
+    queries = _queries("run_download_and_save.py")
+    query = prepare_query(next(iter(queries.values()))["query"], sample_rows=10)
+    assert all(value is not None for value in query_params(query).values())
@@ -0,0 +1,193 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.rename_entities import canonicalize_similarity_df
+from scripts.similarity.kmer_prefilter import kmer_postings, seed_candidates
+from scripts.similarity.sequence_lsh import _bucket_pairs, build_similarity, identity, levenshtein, lsh_candidates, minhash_signatures
+from scripts.similarity.tanimoto import tanimoto_block, top_k_similarity
+
+
+def test_canonicalize_similarity_df_keeps_max_score_per_unordered_pair():
+    df = pd.DataFrame({
+        "nodeid_1": [1, 2, 3, 3, 5],
+        "nodeid_2": [2, 1, 3, 4, 4],
+        "score": [0.5, 0.9, 1.0, 0.7, 0.8],
+    })
+    result = canonicalize_similarity_df(df).sort_values(["nodeid_1", "nodeid_2"]).reset_index(drop=True)
+    expected = pd.DataFrame({"nodeid_1": [1, 3, 4], "nodeid_2": [2, 4, 5], "score": [0.9, 0.7, 0.8]})
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def _levenshtein_dp(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize("a, b", [
+    ("", ""),
+    ("", "ACGT"),
+    ("kitten", "sitting"),
+    ("ACGTACGT", "ACGTACGT"),
+    ("MKVLAAGIV", "MKVLGAGIVQ"),
+    ("A" * 70, "A" * 35 + "C" * 35),
+])
+def test_levenshtein_matches_dp(a, b):
+    assert levenshtein(a, b) == _levenshtein_dp(a, b)
+    assert levenshtein(b, a) == _levenshtein_dp(a, b)
+
+
+def test_levenshtein_random_sequences_match_dp():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        a = "".join(rng.choice(list("ACGT"), rng.integers(0, 80)))
+        b = "".join(rng.choice(list("ACGT"), rng.integers(0, 80)))
+        assert levenshtein(a, b) == _levenshtein_dp(a, b)
+
+
+def test_identity():
+    assert identity("", "") == 1.0
+    assert identity("ACGT", "ACGT") == 1.0
+    assert identity("ACGT", "ACGA") == 0.75
+
+
+def test_lsh_candidates_find_near_duplicates():
+    rng = np.random.default_rng(1)
+    base = "".join(rng.choice(list("ACGT"), 300))
+    mutated = base[:150] + ("A" if base[150] != "A" else "C") + base[151:]
+    unrelated = "".join(rng.choice(list("ACGT"), 300))
+    signatures = minhash_signatures([base, unrelated, mutated], k=6)
+
+    first, second = lsh_candidates(signatures)
+    pairs = set(zip(first.tolist(), second.tolist()))
+    assert (0, 2) in pairs
+    assert all(i < j for i, j in pairs)
+
+
+def test_bucket_pairs_skips_oversized_buckets():
+    keys = np.array([7, 7, 7, 7, 7, 3, 3, 1], dtype=np.uint64)
+    pairs, skipped = _bucket_pairs(keys, max_size=4)
+    assert pairs.tolist() == [5 * 8 + 6]
+    assert skipped == 1
+    pairs, skipped = _bucket_pairs(keys, max_size=5)
+    assert pairs.shape[0] == 10 + 1 and skipped == 0
+
+
+def test_build_similarity_fans_out_content_pairs_to_names():
+    rng = np.random.default_rng(2)
+    base = "".join(rng.choice(list("ACGT"), 200))
+    mutated = base[:100] + ("A" if base[100] != "A" else "C") + base[101:]
+    unrelated = "".join(rng.choice(list("ACGT"), 200))
+    entities_df = pd.DataFrame({
+        "name": ["a1", "a2", "b", "c", "a1"],
+        "content": [base, base, mutated, unrelated, base],
+    })
+
+    result = build_similarity(entities_df, k=6, max_workers=1)
+    pairs = {tuple(sorted((row.name_1, row.name_2))): row.score for row in result.itertuples()}
+    assert pairs[("a1", "a2")] == 1.0
+    assert pairs[("a1", "b")] == pairs[("a2", "b")] == round(identity(base, mutated), 4)
+    assert not any("c" in pair for pair in pairs)
+    assert len(pairs) == result.shape[0] == 3
+
+
+def test_kmer_postings_do_not_alias_symbols_with_letters():
+    # '*' и 'J' совпадают в младших 5 битах ASCII
+    kmers, seq, _ = kmer_postings(["MKJLV", "MK*LV", "MK?LV"], k=5)
+    assert seq.tolist() == [0]
+    kmers, seq, pos = kmer_postings(["AC*DEFG"], k=3)
+    assert pos.tolist() == [3, 4]
+
+
+def _mutate(rng, sequence, rate):
+    residues = list(sequence)
+    for i in np.flatnonzero(rng.random(len(residues)) < rate):
+        residues[i] = rng.choice(list("ACDEFGHIKLMNPQRSTVWY"))
+    if rng.random() < 0.5:
+        del residues[int(rng.integers(len(residues)))]
+    return "".join(residues)
+
+
+def test_seed_candidates_recall_against_brute_force():
+    rng = np.random.default_rng(3)
+    families = ["".join(rng.choice(list("ACDEFGHIKLMNPQRSTVWY"), int(rng.integers(60, 120)))) for _ in range(8)]
+    sequences = []
+    for family in families:
+        sequences.append(family)
+        sequences += [_mutate(rng, family, rate) for rate in (0.03, 0.08, 0.12, 0.3)]
+    sequences.append(sequences[0][:30] + "*" + sequences[0][31:])
+    sequences.append("X" * 80)
+
+    expected = {
+        (i, j)
+        for i in range(len(sequences)) for j in range(i + 1, len(sequences))
+        if identity(sequences[i], sequences[j]) >= 0.8
+    }
+    first, second = seed_candidates(sequences)
+    found = set(zip(first.tolist(), second.tolist()))
+    assert len(expected) > len(families)
+    assert expected <= found
+
+
+def test_lsh_candidates_rejects_uneven_bands():
+    with pytest.raises(ValueError):
+        lsh_candidates(np.zeros((2, 10), dtype=np.uint64), bands=3)
+
+
+def _write_fingerprints(path, bits: np.ndarray, nodeids: np.ndarray) -> None:
+    packed = np.packbits(bits.astype(np.uint8), axis=1, bitorder="little").view(np.uint64)
+    counts = np.bitwise_count(packed).sum(axis=1, dtype=np.int32)
+    order = np.argsort(counts, kind="stable")
+    np.save(path / "fingerprints.npy", packed[order])
+    np.save(path / "nodeids.npy", nodeids[order])
+    np.save(path / "counts.npy", counts[order])
+    with open(path / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"n_bits": bits.shape[1], "size": bits.shape[0]}, f)
+
+
+def _tanimoto_dense(bits: np.ndarray) -> np.ndarray:
+    bits = bits.astype(np.int64)
+    intersection = bits @ bits.T
+    counts = bits.sum(axis=1)
+    union = counts[:, None] + counts[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros(union.shape), where=union > 0)
+
+
+def test_tanimoto_block_matches_dense():
+    rng = np.random.default_rng(2)
+    bits = rng.random((6, 128)) < 0.3
+    packed = np.packbits(bits.astype(np.uint8), axis=1, bitorder="little").view(np.uint64)
+    counts = np.bitwise_count(packed).sum(axis=1, dtype=np.int32)
+    np.testing.assert_allclose(tanimoto_block(packed, counts, packed, counts), _tanimoto_dense(bits), rtol=1e-6)
+
+
+def test_top_k_similarity_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(3)
+    base = rng.random((4, 128)) < 0.3
+    # Каждая молекула - одна из четырех базовых с несколькими перевернутыми битами
+    bits = base[np.arange(20) % 4] ^ (rng.random((20, 128)) < 0.03)
+    nodeids = np.arange(100, 120, dtype=np.int64)
+    _write_fingerprints(tmp_path, bits, nodeids)
+    k, threshold = 3, 0.5
+
+    result = top_k_similarity(str(tmp_path), k=k, threshold=threshold, block_size=8, max_workers=1)
+
+    scores = _tanimoto_dense(bits)
+    np.fill_diagonal(scores, -1.0)
+    # Сосед строго выше (k + 1)-го по величине входит в top-k при любых равенствах
+    next_best = np.sort(scores, axis=1)[:, -k - 1]
+    rows, cols = np.nonzero((scores >= threshold) & (scores > next_best[:, None]))
+    expected = set(zip(np.minimum(nodeids[rows], nodeids[cols]).tolist(), np.maximum(nodeids[rows], nodeids[cols]).tolist()))
+    found = set(zip(result["nodeid_1"].tolist(), result["nodeid_2"].tolist()))
+    assert expected <= found
+    assert (result["nodeid_1"] < result["nodeid_2"]).all()
+    assert (result["score"] >= threshold).all()
+    for a, b, score in result.itertuples(index=False):
+        assert score == pytest.approx(scores[a - 100, b - 100], abs=1e-4)
@@ -0,0 +1,62 @@
+import json
+from types import SimpleNamespace
+
+from scripts.telemetry import COUNTER_FIELDS, IngestionTelemetry
+
+
+class FakeResult:
+    def __init__(self, keys, record=None):
+        self._keys = keys
+        self.record = record
+
+    def keys(self):
+        return self._keys
+
+    def single(self):
+        return self.record
+
+    def consume(self):
+        counters = SimpleNamespace(**{field: 0 for field in COUNTER_FIELDS})
+        counters.relationships_created = 3
+        return SimpleNamespace(counters=counters, result_available_after=1, result_consumed_after=2)
+
+
+class FakeSession:
+    def __init__(self, keys=("rows",), rows=5):
+        self.keys = list(keys)
+        self.rows = rows
+        self.queries = []
+
+    def run(self, query, params=None):
+        self.queries.append(query)
+        return FakeResult(self.keys, {"rows": self.rows})
+
+
+def test_run_takes_rows_from_query_result(tmp_path):
+    telemetry = IngestionTelemetry("test", report_dir=str(tmp_path))
+    session = FakeSession(rows=10)
+    query = "LOAD CSV FROM 'file:///a.csv' AS row CALL(row) { CREATE (:A) } IN TRANSACTIONS RETURN count(*) AS rows"
+    telemetry.run(session, query, "load")
+    # Один проход по файлу: отдельного запроса на подсчет строк нет
+    assert session.queries == [query]
+    phase, = telemetry.phases()
+    assert phase["rows"] == 10
+    assert phase["relationships_created"] == 3
+
+
+def test_run_without_rows_column(tmp_path):
+    telemetry = IngestionTelemetry("test", report_dir=str(tmp_path))
+    telemetry.run(FakeSession(keys=()), "UNWIND $rows AS row CREATE (:A)", "load")
+    telemetry.run(FakeSession(keys=()), "UNWIND $rows AS row CREATE (:A)", "load", rows=7)
+    assert [item["rows"] for item in telemetry.records] == [None, 7]
+
+
+def test_write_report_prints_phases(tmp_path, capsys):
+    telemetry = IngestionTelemetry("test", report_dir=str(tmp_path))
+    telemetry.run(FakeSession(rows=4), "RETURN 4 AS rows", "load")
+    assert capsys.readouterr().out == ""
+
+    path = telemetry.write_report()
+    assert "[load]" in capsys.readouterr().out
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f)["phases"][0]["rows"] == 4